@@ -1,7 +1,7 @@
 # © 2025 Liv Yazılım ve Danışmanlık Ltd. Şti.
 
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from tkinter import ttk, messagebox, scrolledtext, font as tkfont
 import os
 import multiprocessing
 import subprocess
@@ -14,8 +14,24 @@ import json
 import time
 import sys
 import socket
+import ssl
+import concurrent.futures
+import queue
+import signal
 import select
 import shlex
+import struct
+import ipaddress
+import hashlib
+import array
+import math
+import asyncio
+import http.server
+import collections
+import bisect
+import fnmatch
+import ctypes
+import ctypes.util
 
 if not getattr(sys, 'frozen', False):
     try:
@@ -89,6 +105,3208 @@ COLOR_WARNING = "#ff9800"
 COLOR_TEXT = "#333333"
 COLOR_NETWORK = "#673ab7" # Network Manager Purple
 
+# Teardown Timings (seconds)
+VPN_TERM_TIMEOUT = 5.0   # Grace period for openfortivpn to clean up routes/DNS after SIGTERM
+VPN_KILL_TIMEOUT = 2.0   # Wait after SIGKILL escalation
+
+# Interface name prefixes created by openfortivpn (ppp) and strongSwan (xfrm/vti/ipsec) or tun-based clients
+VPN_IFACE_PREFIXES = ("ppp", "tun", "xfrm", "vti", "ipsec", "utun")
+
+# Traffic graph (pixels)
+TRAFFIC_GRAPH_WIDTH = 180
+LATENCY_GRAPH_WIDTH = 80
+TRAFFIC_GRAPH_HEIGHT = 36
+
+# -----------------------------------------------------------------------------
+# PROCESS & ROUTING HELPERS
+# -----------------------------------------------------------------------------
+def pid_alive(pid):
+    """Returns True if a process with this pid exists (works for root-owned pids too)."""
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists but belongs to another user (e.g. root)
+    except OSError:
+        return False
+
+def wait_for_pid_exit(pid, timeout, popen=None):
+    """Blocks until pid exits or timeout expires. Returns True if the process is gone.
+
+    Prefers waitpid() on our own child, then a pidfd exit notification (Linux 5.3+),
+    and only falls back to kill(pid, 0) polling where neither is available (macOS).
+    """
+    if popen is not None and popen.pid == pid:
+        try:
+            popen.wait(timeout=timeout)
+            return True
+        except subprocess.TimeoutExpired:
+            return False
+
+    if hasattr(os, "pidfd_open"):
+        try:
+            fd = os.pidfd_open(pid)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            fd = None
+        if fd is not None:
+            try:
+                return bool(select.select([fd], [], [], timeout)[0])
+            finally:
+                os.close(fd)
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not pid_alive(pid):
+            return True
+        time.sleep(0.05)
+    return not pid_alive(pid)
+
+# -----------------------------------------------------------------------------
+# PROCESS RUNTIME (one asyncio loop owns every child process)
+# -----------------------------------------------------------------------------
+RUNTIME_MAX_CONCURRENCY = 8   # short-lived commands in flight; long-running spawns are not counted
+RUNTIME_KILL_GRACE = 5.0      # SIGTERM -> SIGKILL delay for cancel()
+RUNTIME_POLL_MS = 50          # how often the Tk thread drains the runtime's result queue
+
+class CommandResult(collections.namedtuple("CommandResult", "args returncode stdout stderr seconds timed_out")):
+    """Outcome of ProcessRuntime.run(); attribute-compatible with subprocess.CompletedProcess."""
+    __slots__ = ()
+
+    def check_returncode(self):
+        """Raises like subprocess.check_output() would; returns self for chaining."""
+        if self.timed_out:
+            raise subprocess.TimeoutExpired(self.args, self.seconds, self.stdout, self.stderr)
+        if self.returncode:
+            raise subprocess.CalledProcessError(self.returncode, self.args, self.stdout, self.stderr)
+        return self
+
+class _ExitWatchProtocol(asyncio.subprocess.SubprocessStreamProtocol):
+    """Stream protocol that also reports the exit itself; Process.wait() only returns once
+    every pipe is closed, which a forked grandchild (pppd, ssh ControlMaster) can delay forever."""
+    def __init__(self, limit, loop):
+        super().__init__(limit=limit, loop=loop)
+        self.exited = loop.create_future()
+
+    def process_exited(self):
+        returncode = self._transport.get_returncode()
+        super().process_exited()   # may drop the transport
+        if not self.exited.done():
+            self.exited.set_result(returncode)
+
+class ManagedProcess:
+    """A long-running child owned by ProcessRuntime.
+
+    The sync methods (poll/wait/terminate/kill/write) are safe from any thread and mirror
+    subprocess.Popen, so existing teardown code keeps working; the async ones run on the loop.
+    """
+    def __init__(self, runtime, name, args):
+        self.runtime = runtime
+        self.name = name
+        self.args = args
+        self.proc = None
+        self.exited = None   # future with the exit code, resolved on the loop
+        self.pid = None
+        self.returncode = None
+        self.started = time.monotonic()
+        self._exited = threading.Event()
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if not self._exited.wait(timeout):
+            raise subprocess.TimeoutExpired(self.args, timeout)
+        return self.returncode
+
+    def send_signal(self, sig):
+        if self.returncode is None:
+            self.runtime.loop.call_soon_threadsafe(self._send_signal, sig)
+
+    def terminate(self):
+        if self.returncode is None:
+            self.runtime.loop.call_soon_threadsafe(self._stop, "terminate")
+
+    def kill(self):
+        # Process.kill(): SIGKILL on POSIX, TerminateProcess on Windows (which has no SIGKILL)
+        if self.returncode is None:
+            self.runtime.loop.call_soon_threadsafe(self._stop, "kill")
+
+    def write(self, text):
+        """Sends text to the child's stdin (spawned with stdin=True) and waits until it is written."""
+        self.write_async(text).result()
+
+    def write_async(self, text):
+        """Queues text for the child's stdin without waiting (safe on the Tk thread)."""
+        return asyncio.run_coroutine_threadsafe(self._write(text), self.runtime.loop)
+
+    def _send_signal(self, sig):
+        if self.returncode is None:
+            try: self.proc.send_signal(sig)
+            except ProcessLookupError: pass
+
+    def _stop(self, how):
+        """Loop thread: proc.terminate() or proc.kill() unless the child is already gone."""
+        if self.returncode is None:
+            try: getattr(self.proc, how)()
+            except ProcessLookupError: pass
+
+    async def _write(self, text):
+        self.proc.stdin.write(text.encode())
+        await self.proc.stdin.drain()
+
+    async def wait_async(self, timeout=None):
+        """Exit code, or None if the child is still running after timeout seconds."""
+        try:
+            return await asyncio.wait_for(asyncio.shield(self.exited), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def cancel(self, grace=RUNTIME_KILL_GRACE):
+        """terminate(), then kill() if the child is still there after grace seconds."""
+        self._stop("terminate")
+        if await self.wait_async(grace) is None:
+            self._stop("kill")
+            await self.exited
+        return self.exited.result()
+
+class ProcessRuntime:
+    """Background asyncio loop that spawns, streams, times out and reaps every external command.
+
+    Async API (on the loop): run(), spawn(), ManagedProcess.wait_async()/cancel().
+    Thread API: submit() a coroutine, or the run_sync()/spawn_sync()/launch() wrappers.
+    Results meant for the UI go through a queue: deliver() puts a callback on it and the
+    consumer (the Tk thread) runs them with drain() on its own schedule. The loop thread
+    never calls into Tk, so the Tk thread may wait on the loop without deadlocking.
+    """
+    shared = None   # the first started runtime; run_probe() uses it
+
+    def __init__(self, max_concurrency=RUNTIME_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.results = queue.Queue()
+        self.loop = None
+        self.children = set()
+        self._sem = None
+        self._metrics = {}   # name -> [count, failures, total_seconds, max_seconds]
+        self._lock = threading.Lock()
+
+    def start(self):
+        ready = threading.Event()
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+            ready.set()
+            self.loop.run_forever()
+        threading.Thread(target=run, name="process-runtime", daemon=True).start()
+        ready.wait()
+        if ProcessRuntime.shared is None:
+            ProcessRuntime.shared = self
+        return self
+
+    def stop(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    # --- async API ---
+    async def run(self, args, timeout=None, input=None, name=None, env=None):
+        """Runs a command to completion and returns a CommandResult (stdout/stderr decoded).
+
+        On timeout the command is killed and the result has timed_out=True; cancelling the
+        awaiting task kills it too. Raises OSError when the binary cannot be started.
+        """
+        name = name or os.path.basename(args[0])
+        async with self._sem:
+            started = time.monotonic()
+            proc = await asyncio.create_subprocess_exec(
+                *args, stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+            timed_out = False
+            try:
+                out, err = await asyncio.wait_for(proc.communicate(input.encode() if input is not None else None), timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                proc.kill()
+                out, err = await proc.communicate()
+            except asyncio.CancelledError:
+                proc.kill()
+                await proc.wait()
+                raise
+            seconds = time.monotonic() - started
+        self._record(name, seconds, timed_out or proc.returncode != 0)
+        return CommandResult(list(args), proc.returncode, out.decode(errors="replace"),
+                             err.decode(errors="replace"), seconds, timed_out)
+
+    async def spawn(self, args, on_line=None, on_exit=None, stdin=False, merge_stderr=False, name=None, detach=False):
+        """Starts a long-running child and returns its ManagedProcess right away.
+
+        on_line(text) is called on the loop for every output line (stdout, plus stderr when
+        merge_stderr); without on_line the output is discarded. on_exit(handle) runs on the
+        loop once the child has been reaped. detach=True starts it in its own session with
+        no pipes at all (terminals, file openers).
+        """
+        handle = ManagedProcess(self, name or os.path.basename(args[0]), list(args))
+        pipe = subprocess.PIPE if on_line and not detach else subprocess.DEVNULL
+        handle.proc, handle.exited = await self._exec(
+            args, stdin=subprocess.PIPE if stdin else subprocess.DEVNULL, stdout=pipe,
+            stderr=subprocess.STDOUT if merge_stderr and pipe == subprocess.PIPE else pipe,
+            start_new_session=detach)
+        handle.pid = handle.proc.pid
+        self.children.add(handle)
+        self.loop.create_task(self._supervise(handle, on_line, on_exit))
+        return handle
+
+    @staticmethod
+    async def _exec(args, **kwargs):
+        loop = asyncio.get_running_loop()
+        transport, protocol = await loop.subprocess_exec(
+            lambda: _ExitWatchProtocol(limit=2 ** 16, loop=loop), *args, **kwargs)
+        return asyncio.subprocess.Process(transport, protocol, loop), protocol.exited
+
+    async def _supervise(self, handle, on_line, on_exit):
+        proc = handle.proc
+        pumps = [self.loop.create_task(self._pump(s, on_line)) for s in (proc.stdout, proc.stderr) if s is not None]
+        try:
+            handle.returncode = await handle.exited
+            if pumps:   # trailing output; a grandchild may hold the pipe open indefinitely
+                await asyncio.wait(pumps, timeout=1.0)
+        finally:
+            # Runs on cancellation too (returncode still None): never leave wait() hanging
+            handle._exited.set()
+            for pump in pumps:
+                pump.cancel()
+            self.children.discard(handle)
+            self._record(handle.name, time.monotonic() - handle.started, handle.returncode not in (0, None))
+            if on_exit:
+                try: on_exit(handle)
+                except Exception: pass
+
+    @staticmethod
+    async def _pump(stream, on_line):
+        while True:
+            line = await stream.readline()
+            if not line:
+                return
+            text = line.decode(errors="replace").rstrip("\r\n")
+            if text:
+                try: on_line(text)
+                except Exception: pass
+
+    # --- thread API ---
+    def submit(self, coro, callback=None):
+        """Schedules a coroutine on the loop from any thread and returns a concurrent Future.
+
+        With a callback, callback(result, error) is queued for the consumer thread as well.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        if callback:
+            def done(f):
+                if f.cancelled():
+                    self.deliver(callback, None, asyncio.CancelledError())
+                elif f.exception():
+                    self.deliver(callback, None, f.exception())
+                else:
+                    self.deliver(callback, f.result(), None)
+            future.add_done_callback(done)
+        return future
+
+    def run_sync(self, args, timeout=None, **kwargs):
+        """Blocking run() for worker threads; the Tk thread uses submit() with a callback."""
+        return self.submit(self.run(args, timeout, **kwargs)).result()
+
+    def spawn_sync(self, args, **kwargs):
+        return self.submit(self.spawn(args, **kwargs)).result()
+
+    def launch(self, args):
+        """Fire-and-forget child (editor, terminal); the loop still reaps it."""
+        return self.spawn_sync(args, detach=True)
+
+    def deliver(self, fn, *args):
+        """Queues fn(*args) for the consumer thread."""
+        self.results.put((fn, args))
+
+    def drain(self):
+        """Runs the queued callbacks; call on the consumer (Tk) thread."""
+        while True:
+            try:
+                fn, args = self.results.get_nowait()
+            except queue.Empty:
+                return
+            fn(*args)
+
+    def _record(self, name, seconds, failed):
+        with self._lock:
+            m = self._metrics.setdefault(name, [0, 0, 0.0, 0.0])
+            m[0] += 1
+            m[1] += bool(failed)
+            m[2] += seconds
+            m[3] = max(m[3], seconds)
+
+    def stats(self):
+        """{name: (count, failures, avg_seconds, max_seconds)} for every command run so far."""
+        with self._lock:
+            return {n: (c, f, total / c, mx) for n, (c, f, total, mx) in self._metrics.items()}
+
+def run_probe(args, timeout=3):
+    """Short read-only command (ps, netstat, ipsec statusall, ...) for the module-level probes.
+
+    Goes through the shared ProcessRuntime once the app has started one, so probes are
+    bounded, timed and listed in Background Activity; plain subprocess.run() otherwise.
+    Raises OSError / subprocess.TimeoutExpired like subprocess.run(). Not for the loop thread.
+    """
+    runtime = ProcessRuntime.shared
+    if runtime is None:
+        return subprocess.run(args, capture_output=True, text=True, timeout=timeout)
+    res = runtime.run_sync(args, timeout=timeout)
+    if res.timed_out:
+        raise subprocess.TimeoutExpired(args, timeout, res.stdout, res.stderr)
+    return res
+
+# -----------------------------------------------------------------------------
+# SYSTEM INTROSPECTION (in-process replacements for which/pgrep)
+# -----------------------------------------------------------------------------
+_binary_cache = {}
+_binary_cache_path = None
+_binary_cache_lock = threading.Lock()
+
+def resolve_binary(name):
+    """Memoized shutil.which(). The cache is dropped whenever $PATH changes.
+
+    Only hits are cached: a tool installed while the app runs (strongSwan, sshpass, ...)
+    is found on the next call.
+    """
+    global _binary_cache_path
+    path_env = os.environ.get("PATH", "")
+    with _binary_cache_lock:
+        if path_env != _binary_cache_path:
+            _binary_cache.clear()
+            _binary_cache_path = path_env
+        if name in _binary_cache:
+            return _binary_cache[name]
+    found = shutil.which(name, path=path_env)
+    if found:
+        with _binary_cache_lock:
+            if path_env == _binary_cache_path:
+                _binary_cache[name] = found
+    return found
+
+def read_process_argv(pid):
+    """Returns the argv of a process from /proc/<pid>/cmdline ([] if unreadable)."""
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return [a.decode(errors="replace") for a in f.read().split(b"\0") if a]
+    except OSError:
+        return []
+
+def read_process_name(pid):
+    """Returns the kernel process name (/proc/<pid>/comm) or None."""
+    try:
+        with open(f"/proc/{pid}/comm", "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def find_pids_by_name(name):
+    """Equivalent of 'pgrep -x name': /proc scan on Linux, pgrep subprocess on macOS."""
+    if os.path.isdir("/proc/self"):
+        # comm is truncated to 15 chars by the kernel, like pgrep's matching
+        comm = name[:15]
+        pids = []
+        for entry in os.listdir("/proc"):
+            if entry.isdigit() and read_process_name(entry) == comm:
+                pids.append(int(entry))
+        return pids
+    try:
+        out = run_probe(["pgrep", "-x", name]).stdout
+        return [int(p) for p in out.split() if p.isdigit()]
+    except Exception:
+        return []
+
+def process_running(name):
+    """Returns True if any process with this exact name exists."""
+    return bool(find_pids_by_name(name))
+
+def benchmark_introspection(iterations=200):
+    """Micro-benchmark: per-call cost of the in-process lookups versus fork/exec of which/pgrep."""
+    def per_call(fn, n):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        return (time.perf_counter() - start) / n * 1e6  # microseconds
+
+    # Spawning is orders of magnitude slower, so fewer rounds keep the run short
+    spawn_rounds = max(1, iterations // 10)
+    results = [
+        ("resolve_binary('ssh') [memoized]", per_call(lambda: resolve_binary("ssh"), iterations)),
+        ("shutil.which('ssh') [PATH walk]", per_call(lambda: shutil.which("ssh"), iterations)),
+        ("process_running('openfortivpn')", per_call(lambda: process_running("openfortivpn"), iterations)),
+    ]
+    if resolve_binary("which"):
+        results.append(("subprocess 'which ssh'", per_call(lambda: subprocess.run(["which", "ssh"], capture_output=True), spawn_rounds)))
+    if resolve_binary("pgrep"):
+        results.append(("subprocess 'pgrep -x openfortivpn'", per_call(lambda: subprocess.run(["pgrep", "-x", "openfortivpn"], capture_output=True), spawn_rounds)))
+    return results
+
+def find_openfortivpn_pid(config_path, candidate_pid=None):
+    """Finds the openfortivpn process started with our config file (-c <config_path>).
+
+    Only the process running our profile is returned, other openfortivpn instances on the
+    machine are never matched.
+    """
+    def matches(argv):
+        if not argv or os.path.basename(argv[0]) != "openfortivpn":
+            return False
+        return config_path in argv[1:] or f"-c{config_path}" in argv[1:]
+
+    if os.path.isdir("/proc/self"):
+        # pkexec exec()s the target in place, so our Popen pid is usually openfortivpn itself
+        if candidate_pid and matches(read_process_argv(candidate_pid)):
+            return candidate_pid
+        for pid in find_pids_by_name("openfortivpn"):
+            if matches(read_process_argv(pid)):
+                return pid
+        return None
+
+    # macOS: osascript runs openfortivpn through a privileged shell, so match on the command line
+    try:
+        out = run_probe(["ps", "-axww", "-o", "pid=,command="]).stdout
+    except Exception:
+        return None
+    for line in out.splitlines():
+        parts = line.strip().split(None, 1)
+        if len(parts) != 2 or not parts[0].isdigit():
+            continue
+        try:
+            argv = shlex.split(parts[1])
+        except ValueError:
+            argv = parts[1].split()
+        if matches(argv):
+            return int(parts[0])
+    return None
+
+def read_route_table():
+    """Parses /proc/net/route into a list of dicts (Linux). Returns [] where unavailable."""
+    routes = []
+    try:
+        with open("/proc/net/route", "r") as f:
+            lines = f.readlines()[1:]
+    except OSError:
+        return routes
+
+    def hex_to_ip(h):
+        return socket.inet_ntoa(struct.pack("<L", int(h, 16)))
+
+    for line in lines:
+        cols = line.split()
+        if len(cols) < 8:
+            continue
+        try:
+            mask = hex_to_ip(cols[7])
+            routes.append({
+                "iface": cols[0],
+                "dest": hex_to_ip(cols[1]),
+                "gateway": hex_to_ip(cols[2]),
+                "flags": int(cols[3], 16),
+                "metric": int(cols[6]),
+                "mask": mask,
+                "prefix": bin(struct.unpack("!L", socket.inet_aton(mask))[0]).count("1"),
+            })
+        except (ValueError, OSError):
+            continue
+    return routes
+
+def read_default_route():
+    """(gateway, iface) of the preferred (lowest metric) IPv4 default route on a non-VPN interface, or None."""
+    defaults = [r for r in read_route_table() if r["prefix"] == 0 and not r["iface"].startswith(VPN_IFACE_PREFIXES)]
+    if not defaults:
+        return None
+    best = min(defaults, key=lambda r: r["metric"])
+    return (best["gateway"], best["iface"])
+
+def read_resolv_nameservers(path="/etc/resolv.conf"):
+    """Returns the nameserver entries of resolv.conf in order."""
+    servers = []
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == "nameserver":
+                    servers.append(parts[1])
+    except OSError:
+        pass
+    return servers
+
+def snapshot_network_state():
+    """Captures routes and DNS so teardown can verify they were restored."""
+    return {
+        "routes": {(r["iface"], r["dest"], r["prefix"], r["gateway"]) for r in read_route_table()},
+        "nameservers": read_resolv_nameservers(),
+    }
+
+def verify_network_restored(baseline):
+    """Compares the current routes/DNS with a pre-connect snapshot. Returns a list of issues."""
+    issues = []
+    if not baseline:
+        return issues
+
+    current = snapshot_network_state()
+    baseline_ifaces = {r[0] for r in baseline["routes"]}
+    stale = sorted(r for r in current["routes"] - baseline["routes"]
+                   if r[0].startswith(VPN_IFACE_PREFIXES) and r[0] not in baseline_ifaces)
+    for iface, dest, prefix, gw in stale:
+        issues.append(f"stale route {dest}/{prefix} via {gw} dev {iface}")
+
+    if baseline["nameservers"] and current["nameservers"] != baseline["nameservers"]:
+        issues.append(f"DNS not restored (now {', '.join(current['nameservers']) or 'none'}, "
+                      f"before {', '.join(baseline['nameservers'])})")
+    return issues
+
+# -----------------------------------------------------------------------------
+# STATE FILES (small JSON documents under ~/.livconnect)
+# -----------------------------------------------------------------------------
+def load_json_file(path, default):
+    """Reads a JSON state file, returning default if it is missing or corrupt."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def save_json_file(path, data):
+    """Writes a JSON state file atomically (temp file + rename)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+# -----------------------------------------------------------------------------
+# PROFILE INDEX (profile directories, watched with inotify or mtime polling)
+# -----------------------------------------------------------------------------
+IN_ATTRIB, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x4, 0x8, 0x40, 0x80, 0x100, 0x200
+IN_DELETE_SELF, IN_MOVE_SELF, IN_Q_OVERFLOW, IN_IGNORED = 0x400, 0x800, 0x4000, 0x8000
+PROFILE_WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+                      | IN_DELETE_SELF | IN_MOVE_SELF)
+
+# action: "add" | "remove" | "modify"
+ProfileChange = collections.namedtuple("ProfileChange", "kind action name")
+
+class ProfileIndex:
+    """Sorted profile names per kind, kept current from file events instead of listdir calls.
+
+    dirs maps kind -> (directory, profile extension, companion extensions); a change to a
+    companion file (e.g. an IPsec .secrets) is reported as a modify of its profile. Each
+    file's (mtime_ns, size) is remembered, so repeated events only yield real changes.
+    """
+    def __init__(self, dirs):
+        self.dirs = dirs
+        self._names = {kind: [] for kind in dirs}
+        self._sigs = {kind: {} for kind in dirs}   # filename -> (mtime_ns, size)
+        self._lock = threading.Lock()
+
+    def names(self, kind):
+        with self._lock:
+            return list(self._names.get(kind, ()))
+
+    def _split(self, kind, filename):
+        """(profile name, is the profile file itself) or (None, False) for unrelated files."""
+        _path, ext, companions = self.dirs[kind]
+        for e in (ext,) + tuple(companions):
+            if filename.endswith(e) and len(filename) > len(e) and not filename.startswith("."):
+                return filename[:-len(e)], e == ext
+        return None, False
+
+    def update(self, kind, filenames):
+        """Re-stats the given files of one kind and returns the resulting ProfileChanges."""
+        path = self.dirs[kind][0]
+        changes = []
+        with self._lock:
+            names, sigs = self._names[kind], self._sigs[kind]
+            for filename in filenames:
+                name, primary = self._split(kind, filename)
+                if name is None:
+                    continue
+                try:
+                    st = os.stat(os.path.join(path, filename))
+                    sig = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    sig = None
+                if sig == sigs.get(filename):
+                    continue
+                if sig is None:
+                    sigs.pop(filename, None)
+                else:
+                    sigs[filename] = sig
+                pos = bisect.bisect_left(names, name)
+                present = pos < len(names) and names[pos] == name
+                if primary and sig is None:
+                    if present:
+                        del names[pos]
+                        changes.append(ProfileChange(kind, "remove", name))
+                elif primary and not present:
+                    names.insert(pos, name)
+                    changes.append(ProfileChange(kind, "add", name))
+                elif present and ProfileChange(kind, "modify", name) not in changes:
+                    changes.append(ProfileChange(kind, "modify", name))
+        return changes
+
+    def rescan(self, kind):
+        """Lists one directory and diffs it against the index."""
+        try:
+            current = set(os.listdir(self.dirs[kind][0]))
+        except OSError:
+            current = set()
+        with self._lock:
+            known = set(self._sigs[kind])
+        return self.update(kind, sorted(current | known))
+
+def parse_inotify_events(data):
+    """[(wd, mask, name)] from one read() of an inotify descriptor."""
+    events, offset = [], 0
+    while offset + 16 <= len(data):
+        wd, mask, _cookie, length = struct.unpack_from("=iIII", data, offset)
+        name = data[offset + 16:offset + 16 + length].split(b"\0", 1)[0]
+        events.append((wd, mask, os.fsdecode(name)))
+        offset += 16 + length
+    return events
+
+class ProfileWatcher:
+    """Keeps a ProfileIndex current and reports diffs to on_changes(list_of_ProfileChange).
+
+    Uses inotify (through libc) on Linux, one thread blocked in read(). Elsewhere, or if a
+    directory cannot be watched, a scheduler job rescans the directories instead (3 s,
+    backing off to 30 s while nothing changes). The index is filled once in start()
+    without a callback.
+    """
+    POLL_JOB = "profile-watch"
+
+    def __init__(self, index, on_changes):
+        self.index = index
+        self.on_changes = on_changes
+        self.inotify = False
+        self._libc = None
+        self._fd = None
+        self._wds = {}   # watch descriptor -> kind
+        self._scheduler = None
+        self._running = False
+
+    def start(self, scheduler):
+        self._running = True
+        for kind in self.index.dirs:
+            self.index.rescan(kind)
+        if self._start_inotify():
+            self.inotify = True
+            threading.Thread(target=self._run, daemon=True).start()
+        else:
+            self._scheduler = scheduler
+            scheduler.add(self.POLL_JOB, self.poll, 3.0, 30.0, delay=3.0)
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._scheduler:
+            self._scheduler.remove(self.POLL_JOB)
+        if self._fd is not None:
+            for wd in list(self._wds):
+                self._libc.inotify_rm_watch(self._fd, wd)   # the IN_IGNORED events wake the reader
+
+    def _start_inotify(self):
+        if not sys.platform.startswith("linux"):
+            return False
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return False
+        if fd < 0:
+            return False
+        for kind, (path, _ext, _companions) in self.index.dirs.items():
+            wd = libc.inotify_add_watch(fd, os.fsencode(path), PROFILE_WATCH_MASK)
+            if wd < 0:
+                os.close(fd)
+                self._wds = {}
+                return False
+            self._wds[wd] = kind
+        self._libc, self._fd = libc, fd
+        return True
+
+    def _emit(self, changes):
+        if changes:
+            try: self.on_changes(changes)
+            except Exception: pass
+
+    def poll(self):
+        changes = []
+        for kind in self.index.dirs:
+            changes += self.index.rescan(kind)
+        self._emit(changes)
+        return bool(changes)
+
+    def _run(self):
+        fd = self._fd
+        while self._running:
+            try:
+                data = os.read(fd, 65536)
+                # Editors save as write + rename bursts; collect them before diffing
+                while select.select([fd], [], [], 0.2)[0] and len(data) < (1 << 20):
+                    data += os.read(fd, 65536)
+            except OSError:
+                break
+            if not self._running:
+                break
+            dirty, rescan = {}, set()
+            for wd, mask, name in parse_inotify_events(data):
+                kind = self._wds.get(wd)
+                if mask & IN_Q_OVERFLOW:
+                    rescan.update(self.index.dirs)
+                elif kind is None:
+                    continue
+                elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                    rescan.add(kind)
+                elif name:
+                    dirty.setdefault(kind, set()).add(name)
+            changes = []
+            for kind in self.index.dirs:
+                if kind in rescan:
+                    changes += self.index.rescan(kind)
+                elif kind in dirty:
+                    changes += self.index.update(kind, sorted(dirty[kind]))
+            self._emit(changes)
+        try: os.close(fd)
+        except OSError: pass
+
+# -----------------------------------------------------------------------------
+# PROFILE MODELS (parsed openfortivpn / strongSwan profiles, validated before connect)
+# -----------------------------------------------------------------------------
+PROFILE_PLACEHOLDERS = ("VPN_SERVER_IP", "YOUR_USERNAME", "YOUR_PASSWORD", "YOUR_PRE_SHARED_KEY", "YOUR_LOCAL_IP_OR_EMAIL")
+IPSEC_SECRET_TYPES = ("PSK", "EAP", "XAUTH", "NTLM", "RSA", "ECDSA", "BLISS", "PKCS8", "P12", "PIN")
+IPSEC_KEY_OPTIONS = ("leftcert", "rightcert", "leftsigkey", "rightsigkey")
+
+# errors block a connect attempt; warnings are only logged
+FortiProfile = collections.namedtuple(
+    "FortiProfile", "path host port username trusted_certs ca_file user_cert user_key auth_type options errors warnings")
+IpsecProfile = collections.namedtuple(
+    "IpsecProfile", "path conns hosts options secrets keys errors warnings")
+
+def _strip_comment(line):
+    """Drops a '#' comment that starts the line or follows whitespace (values may contain '#')."""
+    return re.sub(r'(?:^|\s)#.*$', '', line)
+
+def _missing_file(value):
+    return bool(value) and os.path.isabs(os.path.expanduser(value)) and not os.path.exists(os.path.expanduser(value))
+
+def parse_forti_profile(path):
+    """FortiProfile from an openfortivpn config file."""
+    options, trusted, errors, warnings = {}, [], [], []
+    try:
+        with open(path, 'r', errors='replace') as f:
+            lines = f.read().splitlines()
+    except OSError as e:
+        return FortiProfile(path, None, None, None, [], None, None, None, "normal", {}, [f"cannot read {os.path.basename(path)}: {e.strerror}"], [])
+    for n, raw in enumerate(lines, 1):
+        line = _strip_comment(raw).strip()
+        if not line:
+            continue
+        if "=" not in line:
+            # openfortivpn logs "Bad line" and carries on
+            warnings.append(f"line {n}: ignored, expected 'key = value'")
+            continue
+        key, value = (part.strip() for part in line.split("=", 1))
+        if key == "trusted-cert":
+            trusted.append(value)
+        else:
+            options[key] = value
+
+    host = options.get("host", "")
+    if not host:
+        errors.append("host is missing")
+    elif host in PROFILE_PLACEHOLDERS:
+        errors.append(f"host is still the template placeholder ({host})")
+    port = options.get("port", "443")
+    if not port.isdigit() or not 0 < int(port) < 65536:
+        errors.append(f"port '{port}' is not a valid port number")
+    for digest in trusted:
+        if not (re.fullmatch(r'[0-9a-fA-F]{64}', digest) or re.fullmatch(r'pin-sha256:[A-Za-z0-9+/]{43}=', digest)):
+            warnings.append(f"trusted-cert '{digest}' is neither a SHA-256 hex digest nor pin-sha256:<base64>; it will never match")
+    for key in ("ca-file", "user-cert", "user-key"):
+        if _missing_file(options.get(key)):
+            errors.append(f"{key} {options[key]} does not exist")
+    username = options.get("username", "")
+    if username in PROFILE_PLACEHOLDERS or options.get("password", "") in PROFILE_PLACEHOLDERS:
+        warnings.append("username/password still contain template placeholders")
+    auth_type = options.get("livconnect_auth_type", "normal").lower()
+    if auth_type not in ("normal", "otp"):
+        warnings.append(f"livconnect_auth_type '{auth_type}' is unknown, using 'normal'")
+        auth_type = "normal"
+    return FortiProfile(path, host or None, int(port) if port.isdigit() else None, username or None, trusted,
+                        options.get("ca-file"), options.get("user-cert"), options.get("user-key"),
+                        auth_type, options, errors, warnings)
+
+def _parse_ipsec_secrets(path, keys, errors, warnings):
+    """[(selectors, type)] from an ipsec.secrets style file; key files go to keys."""
+    secrets = []
+    try:
+        with open(path, 'r', errors='replace') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return secrets
+    name = os.path.basename(path)
+    for n, raw in enumerate(lines, 1):
+        line = _strip_comment(raw).strip()
+        if not line or line.startswith("include "):
+            continue
+        m = re.match(r'^(.*?):\s*(%s)\b\s*(.*)$' % "|".join(IPSEC_SECRET_TYPES), line)
+        if not m:
+            errors.append(f"{name} line {n}: expected 'selectors : TYPE value'")
+            continue
+        selectors, kind, value = m.group(1).strip(), m.group(2), m.group(3).strip()
+        secrets.append((selectors, kind))
+        if kind in ("RSA", "ECDSA", "BLISS", "PKCS8", "P12") and value:
+            keys.append(value.split()[0].strip('"'))
+        if any(p in selectors or p in value for p in PROFILE_PLACEHOLDERS):
+            warnings.append(f"{name} line {n}: still contains template placeholders")
+    return secrets
+
+def parse_ipsec_profile(path, secrets_path=None):
+    """IpsecProfile from a LivConnect ipsec.conf fragment and its .secrets file."""
+    conns, sections, keys, errors, warnings = [], {}, [], [], []
+    try:
+        with open(path, 'r', errors='replace') as f:
+            lines = f.read().splitlines()
+    except OSError as e:
+        return IpsecProfile(path, [], [], {}, [], [], [f"cannot read {os.path.basename(path)}: {e.strerror}"], [])
+    current = None
+    for n, raw in enumerate(lines, 1):
+        line = _strip_comment(raw).rstrip()
+        if not line.strip():
+            continue
+        if not raw[0].isspace():   # Section header
+            parts = line.split()
+            current = None
+            if parts[0] == "conn" and len(parts) == 2:
+                current = sections.setdefault(parts[1], {})
+                if parts[1] != "%default" and parts[1] not in conns:
+                    conns.append(parts[1])
+            elif (parts[0] == "ca" and len(parts) == 2) or parts == ["config", "setup"]:
+                current = {}
+            elif parts[0] != "include":
+                errors.append(f"line {n}: unknown section '{line.strip()}'")
+            continue
+        if current is None:
+            errors.append(f"line {n}: setting outside a conn section")
+            continue
+        if "=" not in line:
+            errors.append(f"line {n}: expected 'key=value'")
+            continue
+        key, value = (part.strip() for part in line.split("=", 1))
+        current[key] = value.strip('"')
+
+    def resolve(name, seen=()):
+        """Settings of a conn including %default and also= chains."""
+        merged = dict(sections.get("%default", {}))
+        for parent in sections.get(name, {}).get("also", "").split():
+            if parent not in seen:
+                merged.update(resolve(parent, seen + (name,)))
+        merged.update(sections.get(name, {}))
+        return merged
+
+    if not conns:
+        errors.append("no 'conn <name>' section found")
+    resolved = {name: resolve(name) for name in conns}
+    hosts = []
+    for name, opts in resolved.items():
+        right = opts.get("right", "")
+        if not right:
+            errors.append(f"conn {name}: right= (the gateway) is missing")
+        elif right in PROFILE_PLACEHOLDERS:
+            errors.append(f"conn {name}: right= is still the template placeholder ({right})")
+        elif right not in ("%any", "%any4", "%any6"):
+            hosts.append(right)
+        if opts.get("keyexchange", "ike") not in ("ike", "ikev1", "ikev2"):
+            warnings.append(f"conn {name}: keyexchange={opts['keyexchange']} is not ike, ikev1 or ikev2")
+        keys += [opts[k] for k in IPSEC_KEY_OPTIONS if opts.get(k)]
+
+    secrets = _parse_ipsec_secrets(secrets_path, keys, errors, warnings) if secrets_path else []
+    types = {kind for _selectors, kind in secrets}
+    for name, opts in resolved.items():
+        if opts.get("leftauth", "").startswith("eap") and not types & {"EAP", "XAUTH"}:
+            warnings.append(f"conn {name} uses {opts['leftauth']} but no EAP secret is defined")
+        if (opts.get("authby") in ("secret", "psk") or opts.get("leftauth") == "psk") and "PSK" not in types:
+            warnings.append(f"conn {name} uses a pre-shared key but no PSK secret is defined")
+    hosts, keys = list(dict.fromkeys(hosts)), list(dict.fromkeys(keys))
+    for key in keys:
+        if _missing_file(key):
+            errors.append(f"{key} does not exist")
+    return IpsecProfile(path, conns, hosts, resolved, secrets, keys, errors, warnings)
+
+def profile_search_fields(model):
+    """Host and conn names of a parsed profile, for the profile filter."""
+    if isinstance(model, FortiProfile):
+        return [model.host] if model.host else []
+    return list(model.conns) + list(model.hosts)
+
+class ProfileModelCache:
+    """Parsed profiles keyed by path; a profile is parsed again only when its files' mtime/size change."""
+    def __init__(self):
+        self._entries = {}   # path -> (signature, model)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _sig(path):
+        try:
+            st = os.stat(path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def get(self, kind, path):
+        """FortiProfile ("forti") or IpsecProfile ("ipsec", .secrets next to the .conf)."""
+        secrets = os.path.splitext(path)[0] + ".secrets" if kind == "ipsec" else None
+        sig = (self._sig(path), self._sig(secrets) if secrets else None)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry and entry[0] == sig:
+            return entry[1]
+        model = parse_ipsec_profile(path, secrets) if kind == "ipsec" else parse_forti_profile(path)
+        with self._lock:
+            self._entries[path] = (sig, model)
+        return model
+
+# -----------------------------------------------------------------------------
+# PROFILE SEARCH (type-to-filter index, LRU cache)
+# -----------------------------------------------------------------------------
+class ProfileSearchIndex:
+    """Filter index over profile names and key fields (host, conn name).
+
+    Query terms of three or more characters go through trigram postings and are then
+    confirmed as substrings; shorter terms match word prefixes via a sorted token list.
+    Every term of the query has to match.
+    """
+    def __init__(self):
+        self._texts = {}                                  # key -> lowercased searchable text
+        self._trigrams = collections.defaultdict(set)     # trigram -> keys
+        self._tokens = []                                 # sorted (token, key)
+
+    @staticmethod
+    def _grams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    @staticmethod
+    def _words(text):
+        return set(re.split(r"[^0-9a-z]+", text)) - {""}
+
+    def add(self, key, *fields):
+        self.remove(key)
+        text = " ".join(f for f in fields if f).lower()
+        self._texts[key] = text
+        for gram in self._grams(text):
+            self._trigrams[gram].add(key)
+        for word in self._words(text):
+            bisect.insort(self._tokens, (word, key))
+
+    def remove(self, key):
+        text = self._texts.pop(key, None)
+        if text is None:
+            return
+        for gram in self._grams(text):
+            keys = self._trigrams.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._trigrams[gram]
+        for word in self._words(text):
+            pos = bisect.bisect_left(self._tokens, (word, key))
+            if pos < len(self._tokens) and self._tokens[pos] == (word, key):
+                del self._tokens[pos]
+
+    def __len__(self):
+        return len(self._texts)
+
+    def search(self, query):
+        """Set of keys matching every whitespace-separated term of query."""
+        result = None
+        for term in query.lower().split():
+            if len(term) >= 3:
+                postings = sorted((self._trigrams.get(g, set()) for g in self._grams(term)), key=len)
+                found = {k for k in set.intersection(*postings) if term in self._texts[k]}
+            else:
+                found = set()
+                pos = bisect.bisect_left(self._tokens, (term,))
+                while pos < len(self._tokens) and self._tokens[pos][0].startswith(term):
+                    found.add(self._tokens[pos][1])
+                    pos += 1
+            result = found if result is None else result & found
+            if not result:
+                return set()
+        return set(self._texts) if result is None else result
+
+class LRUCache:
+    """Small least-recently-used map (OrderedDict based)."""
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        if key not in self._data:
+            return default
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        return self._data.pop(key, default)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+# -----------------------------------------------------------------------------
+# COMMAND PALETTE (fuzzy matching, connection history)
+# -----------------------------------------------------------------------------
+PALETTE_LIMIT = 50
+_WORD_BOUNDARY = " -_./@"
+
+def _is_subsequence(query, text, start=0):
+    for ch in query:
+        start = text.find(ch, start)
+        if start < 0:
+            return False
+        start += 1
+    return True
+
+def fuzzy_score(query, text):
+    """Subsequence match score of query in text (both lowercase), None if it does not match.
+
+    Every matched character scores; runs of consecutive characters and characters at the
+    start of a word score extra, and a late first match costs a little.
+    """
+    score, pos, prev = 0.0, 0, -2
+    first = None
+    for i, ch in enumerate(query):
+        pos = text.find(ch, pos)
+        if pos < 0:
+            return None
+        # Prefer a word start for this character if one follows shortly and the rest still fits
+        if pos > 0 and text[pos - 1] not in _WORD_BOUNDARY and pos != prev + 1:
+            for b in range(pos + 1, min(len(text), pos + 12)):
+                if text[b] == ch and text[b - 1] in _WORD_BOUNDARY and _is_subsequence(query[i + 1:], text, b + 1):
+                    pos = b
+                    break
+        score += 1.0
+        if pos == prev + 1:
+            score += 2.0
+        if pos == 0 or text[pos - 1] in _WORD_BOUNDARY:
+            score += 3.0
+        if first is None:
+            first = pos
+        prev, pos = pos, pos + 1
+    return score - min(first or 0, 10) * 0.2
+
+class ConnectionHistory:
+    """Use count and last use per "kind/name", persisted in history.json for palette ranking."""
+    HALF_LIFE = 7 * 86400   # a connection's weight halves every week
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = load_json_file(path, {})
+
+    def record(self, kind, name):
+        entry = self.entries.setdefault(f"{kind}/{name}", {"count": 0, "last": 0})
+        entry["count"] += 1
+        entry["last"] = time.time()
+        try: save_json_file(self.path, self.entries)
+        except OSError: pass
+
+    def frecency(self, kind, name, now=None):
+        entry = self.entries.get(f"{kind}/{name}")
+        if not entry:
+            return 0.0
+        age = max(0.0, (now or time.time()) - entry.get("last", 0))
+        return entry.get("count", 0) * 0.5 ** (age / self.HALF_LIFE)
+
+def rank_palette(query, candidates, history, limit=PALETTE_LIMIT):
+    """Best `limit` candidates for query.
+
+    candidates are (kind, name, search_text) tuples with lowercase search_text. The fuzzy
+    score is combined with log-scaled frecency from history; an empty query lists by
+    frecency, then name.
+    """
+    now = time.time()
+    query = "".join(query.lower().split())
+    if not query:
+        ranked = sorted(candidates, key=lambda c: (-history.frecency(c[0], c[1], now), c[1]))
+        return ranked[:limit]
+    # A compiled subsequence regex rejects most candidates at C speed before scoring
+    pattern = re.compile(".*?".join(re.escape(ch) for ch in query))
+    scored = []
+    for c in candidates:
+        if pattern.search(c[2]):
+            s = fuzzy_score(query, c[2])
+            if s is not None:
+                scored.append((s + 4.0 * math.log1p(history.frecency(c[0], c[1], now)), c))
+    scored.sort(key=lambda sc: (-sc[0], sc[1][1]))
+    return [c for _s, c in scored[:limit]]
+
+# -----------------------------------------------------------------------------
+# PROFILE GROUPS (batch connect/disconnect in dependency order)
+# -----------------------------------------------------------------------------
+GROUP_KINDS = ("forti", "ipsec", "ssh", "net")
+GROUP_VPN_KINDS = ("forti", "ipsec")
+GROUP_MEMBER_TIMEOUT = 120.0  # long enough to answer an OTP prompt
+
+# after: "kind:name" keys this member waits for; None means the default ordering
+GroupMember = collections.namedtuple("GroupMember", "kind name after")
+# ok: True / False, or None when the member was skipped
+GroupStep = collections.namedtuple("GroupStep", "kind name ok detail seconds")
+
+def load_profile_groups(path):
+    """Reads groups.json into {group: [GroupMember]}; malformed members are skipped.
+
+    Format: {"Customer X": [{"kind": "forti", "name": "custx"},
+                            {"kind": "ssh", "name": "db", "after": ["forti:custx"]}]}
+    """
+    groups = {}
+    for group, members in load_json_file(path, {}).items():
+        if not isinstance(members, list):
+            continue
+        groups[group] = [GroupMember(m["kind"], m["name"], list(m["after"]) if "after" in m else None)
+                         for m in members
+                         if isinstance(m, dict) and m.get("kind") in GROUP_KINDS and m.get("name")]
+    return groups
+
+def plan_group_stages(members):
+    """Splits a group into stages; the members of one stage do not depend on each other.
+
+    SSH tunnels without an explicit "after" wait for the group's VPN (they need its routes);
+    everything else starts right away. Raises ValueError for unknown dependencies, cycles,
+    or more VPNs/SSH tunnels than can be active at once.
+    """
+    keys = {f"{m.kind}:{m.name}": m for m in members}
+    vpns = [k for k, m in keys.items() if m.kind in GROUP_VPN_KINDS]
+    if len(vpns) > 1 or sum(m.kind == "ssh" for m in members) > 1:
+        raise ValueError("a group can hold one VPN and one SSH tunnel (only one of each can be active)")
+    deps = {}
+    for key, m in keys.items():
+        after = m.after if m.after is not None else (vpns if m.kind == "ssh" else [])
+        unknown = [d for d in after if d not in keys]
+        if unknown:
+            raise ValueError(f"{key} depends on {', '.join(unknown)}, which is not in the group")
+        deps[key] = set(after)
+    stages = []
+    while deps:
+        ready = [k for k in keys if k in deps and not deps[k]]
+        if not ready:
+            raise ValueError("dependency cycle between " + ", ".join(sorted(deps)))
+        stages.append([keys[k] for k in ready])
+        for k in ready:
+            del deps[k]
+        for pending in deps.values():
+            pending.difference_update(ready)
+    return stages
+
+def run_group_stages(stages, action, stop_on_failure=True):
+    """Runs action(member) -> (ok, detail) stage by stage, the members of a stage in parallel.
+
+    With stop_on_failure, members of the stages after a failed one are reported as skipped.
+    Returns one GroupStep per member, in stage order.
+    """
+    def timed(member):
+        started = time.monotonic()
+        try:
+            ok, detail = action(member)
+        except Exception as e:
+            ok, detail = False, str(e) or type(e).__name__
+        return GroupStep(member.kind, member.name, ok, detail, time.monotonic() - started)
+
+    steps, failed = [], False
+    for stage in stages:
+        if failed:
+            steps += [GroupStep(m.kind, m.name, None, "skipped", 0.0) for m in stage]
+            continue
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(stage), thread_name_prefix="group") as pool:
+            stage_steps = list(pool.map(timed, stage))
+        steps += stage_steps
+        failed = stop_on_failure and any(s.ok is False for s in stage_steps)
+    return steps
+
+# -----------------------------------------------------------------------------
+# SCHEDULING
+# -----------------------------------------------------------------------------
+class AdaptiveScheduler:
+    """One background thread that runs every periodic probe of the app.
+
+    A job function returns True when the state it watches changed (interval snaps back to
+    min_interval), False/None when it is stable (interval grows by `backoff` up to
+    max_interval) or a number to request an explicit delay. boost() keeps all jobs at their
+    minimum during transitions (connecting, OTP, reconnect). Jobs due within `coalesce`
+    seconds of each other share one wakeup.
+    """
+    def __init__(self, coalesce=0.5):
+        self.coalesce = coalesce
+        self.jobs = {}
+        self._cond = threading.Condition()
+        self._wakeups = collections.deque()
+        self._boost_until = 0.0
+        self._stop = False
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+
+    def add(self, name, fn, min_interval, max_interval=None, backoff=1.5, delay=0.0):
+        with self._cond:
+            self.jobs[name] = {"fn": fn, "min": min_interval, "max": max_interval or min_interval,
+                               "backoff": backoff, "interval": min_interval, "due": time.monotonic() + delay}
+            self._cond.notify()
+
+    def remove(self, name):
+        with self._cond:
+            self.jobs.pop(name, None)
+
+    def poke(self, name=None):
+        """Run the job (or all jobs) now and restart its fast schedule."""
+        with self._cond:
+            now = time.monotonic()
+            for job_name, job in self.jobs.items():
+                if name is None or job_name == name:
+                    job["interval"], job["due"] = job["min"], now
+            self._cond.notify()
+
+    def boost(self, seconds):
+        """Keep every job at its minimum interval for the next `seconds`."""
+        self._boost_until = max(self._boost_until, time.monotonic() + seconds)
+        self.poke()
+
+    def wakeups_per_minute(self):
+        with self._cond:
+            cutoff = time.monotonic() - 60
+            while self._wakeups and self._wakeups[0] < cutoff:
+                self._wakeups.popleft()
+            return len(self._wakeups)
+
+    def intervals(self):
+        with self._cond:
+            return {name: job["interval"] for name, job in self.jobs.items()}
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stop:
+                    return
+                now = time.monotonic()
+                next_due = min((job["due"] for job in self.jobs.values()), default=None)
+                if next_due is None or next_due > now:
+                    self._cond.wait(None if next_due is None else next_due - now)
+                    continue
+                due = [(name, job) for name, job in self.jobs.items() if job["due"] <= now + self.coalesce]
+                self._wakeups.append(now)
+            for name, job in due:
+                try: result = job["fn"]()
+                except Exception: result = None
+                with self._cond:
+                    if self.jobs.get(name) is not job:
+                        continue  # Removed or replaced while running
+                    if isinstance(result, (int, float)) and not isinstance(result, bool):
+                        job["interval"] = result
+                    elif result or time.monotonic() < self._boost_until:
+                        job["interval"] = job["min"]
+                    else:
+                        job["interval"] = min(job["interval"] * job["backoff"], job["max"])
+                    job["due"] = time.monotonic() + job["interval"]
+
+# -----------------------------------------------------------------------------
+# IPSEC CHANGE TRACKING
+# -----------------------------------------------------------------------------
+IPSEC_UPDATE_MARKER = "LIVCONNECT_UPDATE_NS="
+IPSEC_FALLBACK_MARKER = "LIVCONNECT_FALLBACK_UPDATE"
+
+def hash_ipsec_profiles(ipsec_dir):
+    """Returns {filename: sha256} for every .conf/.secrets file in the profile directory."""
+    hashes = {}
+    try:
+        names = os.listdir(ipsec_dir)
+    except OSError:
+        return hashes
+    for name in names:
+        if name.endswith((".conf", ".secrets")):
+            try:
+                with open(os.path.join(ipsec_dir, name), 'rb') as f:
+                    hashes[name] = hashlib.sha256(f.read()).hexdigest()
+            except OSError:
+                continue
+    return hashes
+
+def plan_ipsec_reload(current, saved):
+    """Compares profile hashes with those of the last successful update.
+
+    Returns (need_update, need_rereadsecrets). Added/removed files count as changes.
+    """
+    def subset(hashes, ext):
+        return {k: v for k, v in hashes.items() if k.endswith(ext)}
+    return (subset(current, ".conf") != subset(saved, ".conf"),
+            subset(current, ".secrets") != subset(saved, ".secrets"))
+
+def build_ipsec_reload_script(need_update, need_secrets):
+    """Shell lines for the optional 'ipsec update' / 'ipsec rereadsecrets' step.
+
+    The update duration is printed with IPSEC_UPDATE_MARKER where date supports %N.
+    """
+    lines = []
+    if need_update:
+        lines += [
+            "t0=$(date +%s%N 2>/dev/null)",
+            "ipsec update || exit $?",
+            "t1=$(date +%s%N 2>/dev/null)",
+            f'case "$t0$t1" in *N*|"") ;; *) echo "{IPSEC_UPDATE_MARKER}$((t1-t0))";; esac',
+        ]
+    if need_secrets:
+        lines.append("ipsec rereadsecrets || exit $?")
+    return lines
+
+def build_ipsec_connect_script(conn_name, need_update, need_secrets):
+    """Shell script for the privileged connect: optional update/rereadsecrets, then 'ipsec up'.
+
+    If the daemon does not know the conn (e.g. it was restarted), one 'ipsec update' is done
+    as a fallback.
+    """
+    conn = shlex.quote(conn_name)
+    lines = build_ipsec_reload_script(need_update, need_secrets)
+    lines += [
+        f"out=$(ipsec up {conn} 2>&1); rc=$?",
+        'echo "$out"',
+        'if [ $rc -ne 0 ] && echo "$out" | grep -qi "no config named"; then',
+        f'  echo "{IPSEC_FALLBACK_MARKER}"',
+        f"  ipsec update && sleep 1 && ipsec up {conn}; exit $?",
+        "fi",
+        "exit $rc",
+    ]
+    return "\n".join(lines)
+
+# -----------------------------------------------------------------------------
+# IPSEC STATUS (structured 'ipsec statusall' parsing + background sampler)
+# -----------------------------------------------------------------------------
+_IKE_SA_RE = re.compile(r'^\s*([^\s\[\{]+)\[(\d+)\]:\s+([A-Za-z0-9_]+)\b(.*)$')
+_CHILD_SA_RE = re.compile(r'^\s*([^\s\[\{]+)\{(\d+)\}:\s+(.*)$')
+_CHILD_STATE_RE = re.compile(r'^([A-Z_]+), ([A-Z_]+)')
+_BYTES_RE = re.compile(r'(\d+) bytes_([io])(?: \((\d+) pkts?)?')
+_REKEY_RE = re.compile(r'(rekeying|reauthentication) in ([^,]+)')
+# ike_sa_state_t names; any other "conn[N]: ..." line (SPIs, proposal, Tasks queued/active, ...) is a detail
+IKE_SA_STATES = ("CREATED", "CONNECTING", "ESTABLISHED", "PASSIVE", "REKEYING", "REKEYED", "DELETING", "DESTROYING")
+
+def format_bytes(n):
+    """1536 -> '1.5 KB'."""
+    n = float(n or 0)
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+def format_rate(bps):
+    """Bytes per second -> '1.2 MB/s'."""
+    return f"{format_bytes(bps)}/s"
+
+def parse_ipsec_statusall(text):
+    """Parses 'ipsec statusall' into {conn: record}.
+
+    record = {name, ike_id, ike_state, ike_info, ike_rekey,
+              children: [{id, state, mode, bytes_in, bytes_out, packets_in, packets_out,
+                          rekey, local_ts, remote_ts}]}
+    Only the "Security Associations" section is used; when a conn has several IKE SAs the
+    ESTABLISHED one wins.
+    """
+    records = {}
+    children = {}
+    in_sas = False
+    for line in text.splitlines():
+        if line.startswith("Security Associations"):
+            in_sas = True
+            continue
+        if not in_sas or not line.strip():
+            continue
+
+        m = _IKE_SA_RE.match(line)
+        if m:
+            name, ike_id, word, rest = m.group(1), int(m.group(2)), m.group(3), m.group(4)
+            rec = records.get(name)
+            if word not in IKE_SA_STATES:
+                # Detail line of an existing IKE SA (SPIs / proposal / rekey timers / tasks)
+                if rec is not None and rec["ike_id"] == ike_id:
+                    r = _REKEY_RE.search(rest)
+                    if r:
+                        rec["ike_rekey"] = f"{r.group(1)} in {r.group(2).strip()}"
+                continue
+            if rec is None or rec["ike_state"] != "ESTABLISHED" or word == "ESTABLISHED":
+                records[name] = {"name": name, "ike_id": ike_id, "ike_state": word,
+                                 "ike_info": rest.strip(" ,"), "ike_rekey": "", "children": []}
+            continue
+
+        m = _CHILD_SA_RE.match(line)
+        if m:
+            name, child_id, rest = m.group(1), int(m.group(2)), m.group(3)
+            key = (name, child_id)
+            child = children.get(key)
+            if child is None:
+                child = {"id": child_id, "state": "", "mode": "",
+                         "bytes_in": 0, "bytes_out": 0, "packets_in": 0, "packets_out": 0,
+                         "rekey": "", "local_ts": "", "remote_ts": ""}
+                children[key] = child
+                records.setdefault(name, {"name": name, "ike_id": None, "ike_state": "",
+                                          "ike_info": "", "ike_rekey": "", "children": []})["children"].append(child)
+            header = _CHILD_STATE_RE.match(rest)
+            if header:
+                child["state"], child["mode"] = header.group(1), header.group(2)
+                continue
+            if "===" in rest:
+                local_ts, _, remote_ts = rest.partition("===")
+                child["local_ts"], child["remote_ts"] = local_ts.strip(), remote_ts.strip()
+                continue
+            for count, direction, pkts in _BYTES_RE.findall(rest):
+                child["bytes_" + ("in" if direction == "i" else "out")] = int(count)
+                child["packets_" + ("in" if direction == "i" else "out")] = int(pkts or 0)
+            r = _REKEY_RE.search(rest)
+            if r:
+                child["rekey"] = f"{r.group(1)} in {r.group(2).strip()}"
+    return records
+
+class IpsecStatusSampler:
+    """Runs 'ipsec statusall' as an AdaptiveScheduler job and caches parsed SA records.
+
+    The interval adapts: it starts at min_interval, grows by `backoff` while nothing
+    changes and snaps back when SA states change or poke() is called (e.g. on connect).
+    """
+    JOB = "ipsec-sa"
+
+    def __init__(self, on_update=None, min_interval=2.0, max_interval=30.0, backoff=1.5):
+        self.on_update = on_update
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.records = {}
+        self.rates = {}   # conn -> (rx bytes/s, tx bytes/s)
+        self.sampled_at = None
+        self.scheduler = None
+        self._lock = threading.Lock()
+
+    def start(self, scheduler):
+        self.scheduler = scheduler
+        scheduler.add(self.JOB, self.tick, self.min_interval, self.max_interval, self.backoff)
+        return self
+
+    def stop(self):
+        if self.scheduler:
+            self.scheduler.remove(self.JOB)
+
+    def poke(self):
+        """Sample right away and restart the fast schedule (state is about to change)."""
+        if self.scheduler:
+            self.scheduler.poke(self.JOB)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.records), dict(self.rates)
+
+    def is_established(self, conn=None):
+        with self._lock:
+            recs = [self.records[conn]] if conn in self.records else ([] if conn else list(self.records.values()))
+        return any(r["ike_state"] == "ESTABLISHED" for r in recs)
+
+    def sample(self):
+        """Runs one statusall and updates the cache. Returns True if SA states changed."""
+        if not resolve_binary("ipsec"):
+            return False
+        try:
+            out = run_probe(["ipsec", "statusall"], timeout=5).stdout
+        except Exception:
+            return False
+        now = time.monotonic()
+        records = parse_ipsec_statusall(out)
+        with self._lock:
+            prev, prev_at = self.records, self.sampled_at
+            rates = {}
+            for name, rec in records.items():
+                old = prev.get(name)
+                if old and prev_at and now > prev_at:
+                    dt = now - prev_at
+                    rx = sum(c["bytes_in"] for c in rec["children"]) - sum(c["bytes_in"] for c in old["children"])
+                    tx = sum(c["bytes_out"] for c in rec["children"]) - sum(c["bytes_out"] for c in old["children"])
+                    rates[name] = (max(rx, 0) / dt, max(tx, 0) / dt)
+                else:
+                    rates[name] = (0.0, 0.0)
+            changed = ({n: (r["ike_state"], tuple(c["state"] for c in r["children"])) for n, r in records.items()} !=
+                       {n: (r["ike_state"], tuple(c["state"] for c in r["children"])) for n, r in prev.items()})
+            self.records, self.rates, self.sampled_at = records, rates, now
+        return changed
+
+    def tick(self):
+        changed = self.sample()
+        if self.on_update:
+            try: self.on_update()
+            except Exception: pass
+        return changed
+
+# -----------------------------------------------------------------------------
+# STRONGSWAN VICI CLIENT (event-driven monitoring, initiate/terminate without the CLI)
+# -----------------------------------------------------------------------------
+VICI_SOCKET_PATHS = ("/var/run/charon.vici", "/run/charon.vici",
+                     "/opt/homebrew/var/run/charon.vici", "/usr/local/var/run/charon.vici")
+
+# Packet types
+VICI_CMD_REQUEST, VICI_CMD_RESPONSE, VICI_CMD_UNKNOWN, VICI_EVENT_REGISTER, \
+    VICI_EVENT_UNREGISTER, VICI_EVENT_CONFIRM, VICI_EVENT_UNKNOWN, VICI_EVENT = range(8)
+# Message element types
+VICI_SECTION_START, VICI_SECTION_END, VICI_KEY_VALUE, VICI_LIST_START, VICI_LIST_ITEM, VICI_LIST_END = range(1, 7)
+# Packet types followed by a name
+_VICI_NAMED = (VICI_CMD_REQUEST, VICI_EVENT_REGISTER, VICI_EVENT_UNREGISTER, VICI_EVENT)
+
+class ViciError(Exception):
+    """Raised for VICI protocol errors and failed commands."""
+
+def vici_encode_message(msg):
+    """Encodes a dict (nested dicts = sections, lists = lists, rest = values) as a VICI message."""
+    out = bytearray()
+
+    def put_name(n):
+        b = str(n).encode()
+        out.append(len(b))
+        out.extend(b)
+
+    def put_value(v):
+        b = v if isinstance(v, bytes) else str(v).encode()
+        out.extend(struct.pack("!H", len(b)))
+        out.extend(b)
+
+    def walk(d):
+        for k, v in d.items():
+            if isinstance(v, dict):
+                out.append(VICI_SECTION_START); put_name(k); walk(v); out.append(VICI_SECTION_END)
+            elif isinstance(v, (list, tuple)):
+                out.append(VICI_LIST_START); put_name(k)
+                for item in v:
+                    out.append(VICI_LIST_ITEM); put_value(item)
+                out.append(VICI_LIST_END)
+            else:
+                out.append(VICI_KEY_VALUE); put_name(k); put_value(v)
+
+    walk(msg or {})
+    return bytes(out)
+
+def vici_decode_message(data):
+    """Decodes a VICI message into nested dicts/lists of str."""
+    root, stack, current_list, i = {}, [], None, 0
+    node = root
+
+    def get_name(i):
+        n = data[i]
+        return data[i + 1:i + 1 + n].decode(errors="replace"), i + 1 + n
+
+    def get_value(i):
+        (n,) = struct.unpack_from("!H", data, i)
+        return data[i + 2:i + 2 + n].decode(errors="replace"), i + 2 + n
+
+    try:
+        while i < len(data):
+            t = data[i]
+            i += 1
+            if t == VICI_SECTION_START:
+                name, i = get_name(i)
+                section = {}
+                node[name] = section
+                stack.append(node)
+                node = section
+            elif t == VICI_SECTION_END:
+                node = stack.pop()
+            elif t == VICI_KEY_VALUE:
+                name, i = get_name(i)
+                node[name], i = get_value(i)
+            elif t == VICI_LIST_START:
+                name, i = get_name(i)
+                current_list = node[name] = []
+            elif t == VICI_LIST_ITEM:
+                value, i = get_value(i)
+                current_list.append(value)
+            elif t == VICI_LIST_END:
+                current_list = None
+            else:
+                raise ViciError(f"Invalid VICI element type {t}")
+    except (IndexError, struct.error, AttributeError) as e:
+        raise ViciError(f"Malformed VICI message: {e}")
+    return root
+
+def vici_encode_packet(ptype, name=None, msg=None):
+    """Builds a length-prefixed VICI packet."""
+    body = bytearray([ptype])
+    if ptype in _VICI_NAMED:
+        b = (name or "").encode()
+        body.append(len(b))
+        body.extend(b)
+    if ptype in (VICI_CMD_REQUEST, VICI_CMD_RESPONSE, VICI_EVENT):
+        body.extend(vici_encode_message(msg))
+    return struct.pack("!I", len(body)) + bytes(body)
+
+def vici_decode_packet(body):
+    """Splits a packet body (without length prefix) into (type, name, message)."""
+    if not body:
+        raise ViciError("Empty VICI packet")
+    ptype, i, name = body[0], 1, None
+    if ptype in _VICI_NAMED:
+        n = body[1]
+        name, i = body[2:2 + n].decode(errors="replace"), 2 + n
+    msg = vici_decode_message(body[i:]) if ptype in (VICI_CMD_REQUEST, VICI_CMD_RESPONSE, VICI_EVENT) else {}
+    return ptype, name, msg
+
+def find_vici_socket():
+    """Returns the first existing charon VICI socket path, or None."""
+    return next((p for p in VICI_SOCKET_PATHS if os.path.exists(p)), None)
+
+class ViciClient:
+    """Minimal blocking client for strongSwan's VICI socket.
+
+    Works against any unix socket speaking the protocol (e.g. a local fake server in tests).
+    """
+    def __init__(self, path=None, timeout=5.0):
+        self.path = path or find_vici_socket()
+        self.timeout = timeout
+        self.sock = None
+
+    def connect(self):
+        if not self.path:
+            raise ViciError("No VICI socket found")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        return self
+
+    def close(self):
+        if self.sock:
+            try: self.sock.close()
+            except OSError: pass
+            self.sock = None
+
+    def __enter__(self):
+        return self.connect() if self.sock is None else self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _recv_exact(self, n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self.sock.recv(n - len(buf))
+            if not chunk:
+                raise ViciError("VICI socket closed")
+            buf.extend(chunk)
+        return bytes(buf)
+
+    def send_packet(self, ptype, name=None, msg=None):
+        self.sock.sendall(vici_encode_packet(ptype, name, msg))
+
+    def recv_packet(self):
+        (length,) = struct.unpack("!I", self._recv_exact(4))
+        return vici_decode_packet(self._recv_exact(length))
+
+    def _expect(self, ok_type, what):
+        while True:
+            ptype, name, msg = self.recv_packet()
+            if ptype == ok_type:
+                return msg
+            if ptype == VICI_EVENT:
+                continue  # Event for an earlier registration, not our answer
+            if ptype in (VICI_CMD_UNKNOWN, VICI_EVENT_UNKNOWN):
+                raise ViciError(f"Unknown VICI {what}")
+            raise ViciError(f"Unexpected VICI packet type {ptype}")
+
+    def register(self, event):
+        self.send_packet(VICI_EVENT_REGISTER, event)
+        self._expect(VICI_EVENT_CONFIRM, f"event '{event}'")
+
+    def unregister(self, event):
+        self.send_packet(VICI_EVENT_UNREGISTER, event)
+        self._expect(VICI_EVENT_CONFIRM, f"event '{event}'")
+
+    def request(self, cmd, msg=None, stream_event=None, on_event=None):
+        """Sends a command and returns the response message.
+
+        For streaming commands (e.g. initiate with 'control-log') events that arrive before
+        the response are passed to on_event(name, message).
+        """
+        if stream_event:
+            self.register(stream_event)
+        try:
+            self.send_packet(VICI_CMD_REQUEST, cmd, msg)
+            while True:
+                ptype, name, body = self.recv_packet()
+                if ptype == VICI_CMD_RESPONSE:
+                    return body
+                if ptype == VICI_EVENT:
+                    if on_event:
+                        on_event(name, body)
+                    continue
+                if ptype == VICI_CMD_UNKNOWN:
+                    raise ViciError(f"Unknown VICI command '{cmd}'")
+                raise ViciError(f"Unexpected VICI packet type {ptype}")
+        finally:
+            if stream_event:
+                try: self.unregister(stream_event)
+                except (ViciError, OSError): pass
+
+    def command(self, cmd, msg=None, **kwargs):
+        """request() that raises ViciError unless the response has success=yes."""
+        res = self.request(cmd, msg, **kwargs)
+        if res.get("success", "yes") != "yes":
+            raise ViciError(res.get("errmsg") or f"VICI '{cmd}' failed")
+        return res
+
+class ViciEventMonitor:
+    """Background thread subscribed to IKE/CHILD up/down and rekey events.
+
+    on_event(name, message) is called from the monitor thread. If the socket is missing or
+    not accessible the monitor stays idle (available=False) and retries every retry_interval.
+    """
+    EVENTS = ("ike-updown", "child-updown", "ike-rekey")
+
+    def __init__(self, on_event, path=None, retry_interval=30.0):
+        self.on_event = on_event
+        self.path = path
+        self.retry_interval = retry_interval
+        self.available = False
+        self.last_error = None
+        self._stop = threading.Event()
+        self._client = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        client = self._client
+        sock = client.sock if client else None
+        if sock:
+            # close() alone does not wake a thread blocked in recv(); shutdown() does
+            try: sock.shutdown(socket.SHUT_RDWR)
+            except OSError: pass
+            client.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            client = ViciClient(self.path, timeout=5.0)
+            try:
+                client.connect()
+                for event in self.EVENTS:
+                    client.register(event)
+                client.sock.settimeout(None)  # Block until the daemon pushes an event
+                self._client, self.available, self.last_error = client, True, None
+                while not self._stop.is_set():
+                    ptype, name, msg = client.recv_packet()
+                    if ptype == VICI_EVENT:
+                        try: self.on_event(name, msg)
+                        except Exception: pass
+            except (OSError, ViciError) as e:
+                self.last_error = str(e)
+            finally:
+                client.close()
+                self._client = None
+                was_available, self.available = self.available, False
+            if was_available:
+                try: self.on_event("monitor-lost", {})
+                except Exception: pass
+            self._stop.wait(self.retry_interval)
+
+# -----------------------------------------------------------------------------
+# TRAFFIC MONITORING
+# -----------------------------------------------------------------------------
+class RingBuffer:
+    """Fixed-size float ring buffer backed by array('d'); no allocation per sample."""
+    def __init__(self, size):
+        self.size = size
+        self.data = array.array("d", [0.0] * size)
+        self.pos = 0
+        self.count = 0
+
+    def append(self, value):
+        self.data[self.pos] = value
+        self.pos = (self.pos + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def clear(self):
+        self.pos = self.count = 0
+
+    def values(self):
+        """Oldest to newest."""
+        if self.count < self.size:
+            return self.data[:self.count].tolist()
+        return (self.data[self.pos:] + self.data[:self.pos]).tolist()
+
+    def last(self, default=None):
+        return self.data[self.pos - 1] if self.count else default
+
+    def __len__(self):
+        return self.count
+
+def read_netdev_counters(prefixes=VPN_IFACE_PREFIXES):
+    """Returns {iface: (rx_bytes, tx_bytes)} for interfaces whose name starts with one of prefixes."""
+    counters = {}
+    if IS_MAC:
+        try:
+            out = run_probe(["netstat", "-ibn"]).stdout
+        except Exception:
+            return counters
+        for line in out.splitlines()[1:]:
+            parts = line.split()
+            # Name Mtu Network Address Ipkts Ierrs Ibytes Opkts Oerrs Obytes Coll (link rows only)
+            if len(parts) >= 10 and parts[2].startswith("<Link") and parts[0].startswith(prefixes):
+                try: counters[parts[0]] = (int(parts[-5]), int(parts[-2]))
+                except ValueError: pass
+        return counters
+    try:
+        with open("/proc/net/dev") as f:
+            lines = f.readlines()[2:]
+    except OSError:
+        return counters
+    for line in lines:
+        name, _, data = line.partition(":")
+        name = name.strip()
+        if name.startswith(prefixes):
+            fields = data.split()
+            counters[name] = (int(fields[0]), int(fields[8]))
+    return counters
+
+def parse_host_port(target, default_port=443):
+    """'host', 'host:port' or '[v6]:port' -> (host, port); None for an empty/invalid target."""
+    target = (target or "").strip()
+    if not target:
+        return None
+    host, port = target, default_port
+    if target.startswith("["):
+        host, _, rest = target[1:].partition("]")
+        if rest.startswith(":"):
+            port = rest[1:]
+    elif target.count(":") == 1:
+        host, port = target.split(":")
+    try:
+        port = int(port)
+    except ValueError:
+        return None
+    return (host, port) if host and 0 < port < 65536 else None
+
+def tcp_probe(host, port, timeout=2.0):
+    """TCP connect time in milliseconds, or None if unreachable."""
+    started = time.perf_counter()
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return (time.perf_counter() - started) * 1000.0
+    except OSError:
+        return None
+
+class TrafficSampler:
+    """Samples VPN interface counters once per interval into ring buffers (AdaptiveScheduler job).
+
+    rx/tx hold bytes per second summed over all VPN interfaces; latency holds TCP connect
+    times in ms (NaN for a failed probe) to probe_target every probe_interval seconds.
+    While no VPN interface exists the sampler only checks every idle_interval seconds.
+    """
+    JOB = "traffic"
+
+    def __init__(self, on_update=None, interval=1.0, history=120, probe_interval=5.0, idle_interval=5.0):
+        self.on_update = on_update
+        self.interval = interval
+        self.probe_interval = probe_interval
+        self.idle_interval = idle_interval
+        self.probe_target = None   # (host, port)
+        self.rx = RingBuffer(history)
+        self.tx = RingBuffer(history)
+        self.latency = RingBuffer(max(2, int(history * interval / probe_interval)))
+        self.interfaces = []
+        self._prev = None
+        self._last_probe = 0.0
+        self._active = False
+        self._lock = threading.Lock()
+        self.scheduler = None
+
+    def start(self, scheduler):
+        self.scheduler = scheduler
+        scheduler.add(self.JOB, self.tick, self.interval, self.idle_interval)
+        return self
+
+    def stop(self):
+        if self.scheduler:
+            self.scheduler.remove(self.JOB)
+
+    def poke(self):
+        if self.scheduler:
+            self.scheduler.poke(self.JOB)
+
+    def set_probe_target(self, target):
+        self.probe_target = parse_host_port(target) if isinstance(target, str) else target
+        with self._lock:
+            self.latency.clear()
+        self._last_probe = 0.0
+        self.poke()
+
+    def snapshot(self):
+        with self._lock:
+            return {"rx": self.rx.values(), "tx": self.tx.values(), "latency": self.latency.values(),
+                    "interfaces": list(self.interfaces)}
+
+    def sample(self):
+        """One tick. Returns False when no VPN interface is up."""
+        now = time.monotonic()
+        counters = read_netdev_counters()
+        if not counters:
+            if self._prev is not None:
+                with self._lock:
+                    self.rx.clear(); self.tx.clear(); self.latency.clear()
+                    self.interfaces = []
+                self._prev = None
+            return False
+        rx_total = sum(c[0] for c in counters.values())
+        tx_total = sum(c[1] for c in counters.values())
+        with self._lock:
+            self.interfaces = sorted(counters)
+            if self._prev is not None:
+                prev_at, prev_rx, prev_tx, prev_ifaces = self._prev
+                dt = now - prev_at
+                # Interface recreated -> counters restarted; skip that interval
+                if dt > 0 and prev_ifaces == self.interfaces and rx_total >= prev_rx and tx_total >= prev_tx:
+                    self.rx.append((rx_total - prev_rx) / dt)
+                    self.tx.append((tx_total - prev_tx) / dt)
+            self._prev = (now, rx_total, tx_total, self.interfaces)
+        if self.probe_target and now - self._last_probe >= self.probe_interval:
+            self._last_probe = now
+            ms = tcp_probe(*self.probe_target)
+            with self._lock:
+                self.latency.append(math.nan if ms is None else ms)
+        return True
+
+    def tick(self):
+        active = self.sample()
+        changed, self._active = active != self._active, active
+        if (active or changed) and self.on_update:
+            try: self.on_update()
+            except Exception: pass
+        return self.interval if active else self.idle_interval
+
+# -----------------------------------------------------------------------------
+# NETLINK (Linux link/address/route change events)
+# -----------------------------------------------------------------------------
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+RTMGRP_IPV6_IFADDR = 0x100
+NLMSG_ERROR, NLMSG_DONE = 2, 3
+RTM_NEWLINK, RTM_DELLINK, RTM_NEWADDR, RTM_DELADDR, RTM_NEWROUTE, RTM_DELROUTE = 16, 17, 20, 21, 24, 25
+IFF_UP, IFF_RUNNING = 0x1, 0x40
+RT_TABLE_MAIN = 254
+
+# kind: "link" | "addr" | "route"; action: "new" | "del"; data holds the decoded attributes
+NetlinkEvent = collections.namedtuple("NetlinkEvent", "kind action ifname index data")
+
+def parse_rtattrs(data, offset):
+    """{type: raw bytes} for the rtattr list starting at offset."""
+    attrs = {}
+    while offset + 4 <= len(data):
+        length, rta_type = struct.unpack_from("=HH", data, offset)
+        if length < 4:
+            break
+        attrs[rta_type] = data[offset + 4:offset + length]
+        offset += (length + 3) & ~3
+    return attrs
+
+def _nl_ip(family, raw):
+    try:
+        return socket.inet_ntop(family, raw)
+    except (OSError, ValueError):
+        return None
+
+def _nl_str(raw):
+    return raw.split(b"\0", 1)[0].decode(errors="replace") if raw else None
+
+def parse_netlink_messages(data, index_names=None):
+    """Decodes RTM_* messages from one netlink datagram into NetlinkEvents.
+
+    index_names (ifindex -> name) is updated from link messages and used to name
+    address/route events.
+    """
+    index_names = {} if index_names is None else index_names
+    events, offset = [], 0
+    while offset + 16 <= len(data):
+        length, msg_type, _flags, _seq, _pid = struct.unpack_from("=IHHII", data, offset)
+        if length < 16:
+            break
+        body = offset + 16
+        action = "del" if msg_type in (RTM_DELLINK, RTM_DELADDR, RTM_DELROUTE) else "new"
+        if msg_type in (RTM_NEWLINK, RTM_DELLINK):
+            _family, _type, index, flags, _change = struct.unpack_from("=BxHiII", data, body)
+            attrs = parse_rtattrs(data[:offset + length], body + 16)
+            name = _nl_str(attrs.get(3)) or index_names.get(index)   # IFLA_IFNAME
+            mtu = struct.unpack("=I", attrs[4])[0] if len(attrs.get(4, b"")) == 4 else None
+            if action == "del":
+                index_names.pop(index, None)
+            elif name:
+                index_names[index] = name
+            events.append(NetlinkEvent("link", action, name, index,
+                                       {"up": bool(flags & IFF_UP), "running": bool(flags & IFF_RUNNING), "mtu": mtu}))
+        elif msg_type in (RTM_NEWADDR, RTM_DELADDR):
+            family, prefix, _flags, scope, index = struct.unpack_from("=BBBBI", data, body)
+            attrs = parse_rtattrs(data[:offset + length], body + 8)
+            address = _nl_ip(family, attrs.get(2) or attrs.get(1, b""))   # IFA_LOCAL, else IFA_ADDRESS
+            name = _nl_str(attrs.get(3)) or index_names.get(index)        # IFA_LABEL
+            events.append(NetlinkEvent("addr", action, name, index,
+                                       {"family": family, "address": address, "prefix": prefix, "scope": scope}))
+        elif msg_type in (RTM_NEWROUTE, RTM_DELROUTE):
+            family, dst_len, _src_len, _tos, table, _proto, _scope, rt_type, _flags = struct.unpack_from("=BBBBBBBBI", data, body)
+            attrs = parse_rtattrs(data[:offset + length], body + 12)
+            if 15 in attrs and len(attrs[15]) == 4:                        # RTA_TABLE
+                table = struct.unpack("=I", attrs[15])[0]
+            index = struct.unpack("=i", attrs[4])[0] if len(attrs.get(4, b"")) == 4 else None   # RTA_OIF
+            dst = _nl_ip(family, attrs[1]) if 1 in attrs else ("0.0.0.0" if family == socket.AF_INET else "::")
+            events.append(NetlinkEvent("route", action, index_names.get(index), index,
+                                       {"family": family, "dst": f"{dst}/{dst_len}", "gateway": _nl_ip(family, attrs.get(5, b"")),
+                                        "table": table, "default": dst_len == 0, "type": rt_type}))
+        elif msg_type == NLMSG_DONE:
+            break
+        offset += (length + 3) & ~3
+    return events
+
+def read_interface_names():
+    """{ifindex: name} from the system (socket.if_nameindex)."""
+    try:
+        return {index: name for index, name in socket.if_nameindex()}
+    except OSError:
+        return {}
+
+class NetlinkWatcher:
+    """Listens on an rtnetlink socket in one thread and reports link/address/route events.
+
+    on_events(list_of_NetlinkEvent) is called from the watcher thread once per burst:
+    everything already queued on the socket is read before the callback runs. Outside
+    Linux (or without AF_NETLINK) the watcher stays idle with available=False.
+    """
+    GROUPS = RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV4_ROUTE | RTMGRP_IPV6_IFADDR
+
+    def __init__(self, on_events, groups=GROUPS):
+        self.on_events = on_events
+        self.groups = groups
+        self.available = False
+        self.index_names = read_interface_names()
+        self._sock = None
+
+    def start(self):
+        if not hasattr(socket, "AF_NETLINK"):
+            return self
+        try:
+            self._sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, 0)   # NETLINK_ROUTE
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            self._sock.bind((0, self.groups))
+        except OSError:
+            self._sock = None
+            return self
+        self.available = True
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.available = False
+        if self._sock:
+            try: self._sock.close()
+            except OSError: pass
+
+    def _run(self):
+        sock = self._sock
+        while self.available:
+            try:
+                events = parse_netlink_messages(sock.recv(65536), self.index_names)
+                sock.setblocking(False)
+                try:
+                    while True:
+                        events += parse_netlink_messages(sock.recv(65536), self.index_names)
+                except (BlockingIOError, InterruptedError):
+                    pass
+                finally:
+                    sock.setblocking(True)
+            except OSError as e:
+                if e.errno == 105:   # ENOBUFS: events were dropped, listeners should resync
+                    events = [NetlinkEvent("overflow", "new", None, None, {})]
+                elif not self.available:
+                    return
+                else:
+                    time.sleep(1)
+                    continue
+            if events:
+                try: self.on_events(events)
+                except Exception: pass
+
+# -----------------------------------------------------------------------------
+# INTERFACE INVENTORY
+# -----------------------------------------------------------------------------
+RTM_GETLINK, RTM_GETADDR = 18, 22
+NLM_F_REQUEST, NLM_F_DUMP = 0x1, 0x300
+
+def netlink_dump(msg_type, family=socket.AF_UNSPEC, timeout=2.0):
+    """Runs one RTM_GET* dump request and returns the decoded NetlinkEvents."""
+    header_len = 16 if msg_type == RTM_GETLINK else 8   # ifinfomsg / ifaddrmsg
+    payload = struct.pack("=B", family) + b"\0" * (header_len - 1)
+    request = struct.pack("=IHHII", 16 + len(payload), msg_type, NLM_F_REQUEST | NLM_F_DUMP, 1, 0) + payload
+    events, names = [], read_interface_names()
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, 0) as sock:
+        sock.settimeout(timeout)
+        sock.bind((0, 0))
+        sock.send(request)
+        while True:
+            data = sock.recv(1 << 16)
+            events += parse_netlink_messages(data, names)
+            offset, done = 0, False
+            while offset + 16 <= len(data):
+                length, kind = struct.unpack_from("=IH", data, offset)
+                if kind in (NLMSG_DONE, NLMSG_ERROR) or length < 16:
+                    done = True
+                    break
+                offset += (length + 3) & ~3
+            if done or not data:
+                return events
+
+def _read_interfaces_netlink():
+    ifaces = {}
+    for ev in netlink_dump(RTM_GETLINK):
+        ifaces[ev.ifname] = {"index": ev.index, "up": ev.data["up"], "mtu": ev.data["mtu"], "ipv4": [], "ipv6": []}
+    for ev in netlink_dump(RTM_GETADDR):
+        iface = ifaces.get(ev.ifname)
+        if iface is not None and ev.data["address"]:
+            key = "ipv4" if ev.data["family"] == socket.AF_INET else "ipv6"
+            iface[key].append(f"{ev.data['address']}/{ev.data['prefix']}")
+    return ifaces
+
+def _read_interfaces_ifconfig():
+    """macOS / BSD fallback: parses 'ifconfig -a'."""
+    ifaces, current = {}, None
+    try:
+        out = run_probe(["ifconfig", "-a"]).stdout
+    except Exception:
+        return ifaces
+    for line in out.splitlines():
+        m = re.match(r"^(\S+?):? flags=\d+<([^>]*)>.*?(?:mtu (\d+))?$", line)
+        if m:
+            current = ifaces[m.group(1)] = {"index": None, "up": "UP" in m.group(2).split(","),
+                                            "mtu": int(m.group(3)) if m.group(3) else None, "ipv4": [], "ipv6": []}
+            continue
+        parts = line.split()
+        if current is None or len(parts) < 2:
+            continue
+        if parts[0] == "inet":
+            prefix = 32
+            if "netmask" in parts:
+                mask = parts[parts.index("netmask") + 1]
+                prefix = bin(int(mask, 16)).count("1") if mask.startswith("0x") else netmask_to_prefix(mask)
+            current["ipv4"].append(f"{parts[1]}/{prefix}")
+        elif parts[0] == "inet6":
+            prefix = parts[parts.index("prefixlen") + 1] if "prefixlen" in parts else "128"
+            current["ipv6"].append(f"{parts[1].split('%')[0]}/{prefix}")
+    return ifaces
+
+def read_macos_default_iface():
+    try:
+        out = run_probe(["route", "-n", "get", "default"]).stdout
+    except Exception:
+        return None
+    m = re.search(r"interface:\s*(\S+)", out)
+    return m.group(1) if m else None
+
+class InterfaceInventory:
+    """Per-interface IPv4/IPv6 addresses plus the default route, read once and cached.
+
+    refresh() re-reads everything (netlink dump on Linux, ifconfig elsewhere). With a
+    netlink watcher the app calls it on change; otherwise entries expire after `ttl`.
+    """
+    def __init__(self, ttl=30.0):
+        self.ttl = ttl
+        self.interfaces = {}
+        self.default_iface = None
+        self.read_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        try:
+            ifaces = _read_interfaces_netlink() if hasattr(socket, "AF_NETLINK") else _read_interfaces_ifconfig()
+        except OSError:
+            ifaces = _read_interfaces_ifconfig()
+        for name, iface in ifaces.items():
+            iface["vpn"] = name.startswith(VPN_IFACE_PREFIXES)
+        route = read_default_route()
+        default_iface = route[1] if route else (read_macos_default_iface() if IS_MAC else None)
+        with self._lock:
+            self.interfaces, self.default_iface, self.read_at = ifaces, default_iface, time.monotonic()
+        return self
+
+    def _ensure(self, watched):
+        if self.read_at is None or (not watched and time.monotonic() - self.read_at > self.ttl):
+            self.refresh()
+
+    def snapshot(self, watched=False):
+        """{name: {index, up, mtu, ipv4: [cidr], ipv6: [cidr], vpn}}"""
+        self._ensure(watched)
+        with self._lock:
+            return {name: dict(iface) for name, iface in self.interfaces.items()}
+
+    def primary_ip(self, watched=False):
+        """First IPv4 of the default-route interface, else of any other up, non-loopback interface."""
+        self._ensure(watched)
+        with self._lock:
+            order = [self.default_iface] + sorted(n for n, i in self.interfaces.items() if i["up"] and not i["vpn"])
+            for name in order:
+                for cidr in self.interfaces.get(name, {}).get("ipv4", []):
+                    if not cidr.startswith("127."):
+                        return cidr.split("/")[0]
+        return None
+
+    def vpn_ips(self, watched=False):
+        """[(iface, ip)] for VPN interfaces that have an address."""
+        self._ensure(watched)
+        with self._lock:
+            return [(name, cidr.split("/")[0]) for name, iface in sorted(self.interfaces.items())
+                    if iface["vpn"] for cidr in iface["ipv4"] + iface["ipv6"] if not cidr.startswith("fe80:")]
+
+# -----------------------------------------------------------------------------
+# GATEWAY CERTIFICATES (unprivileged TLS fingerprint probe, per-gateway pins)
+# -----------------------------------------------------------------------------
+def fetch_cert_digest(host, port=443, timeout=5.0):
+    """Hex SHA-256 of the gateway's leaf certificate (DER), the form openfortivpn's trusted-cert expects.
+
+    The certificate is deliberately not verified (that is what pinning a self-signed
+    gateway is for) and old protocol versions are allowed. Raises OSError on failure.
+    """
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    try:
+        ctx.minimum_version = ssl.TLSVersion.TLSv1
+        ctx.set_ciphers("ALL:@SECLEVEL=0")
+    except (ValueError, ssl.SSLError):
+        pass
+    sni = None
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        sni = host
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        with ctx.wrap_socket(sock, server_hostname=sni) as tls:
+            der = tls.getpeercert(binary_form=True)
+    if not der:
+        raise ssl.SSLError("the gateway did not present a certificate")
+    return hashlib.sha256(der).hexdigest()
+
+class CertPinStore:
+    """Last trusted leaf-certificate digest per gateway ("host:port"), kept in cert_pins.json."""
+    def __init__(self, path):
+        self.path = path
+        self.pins = load_json_file(path, {})
+
+    def get(self, host, port):
+        pin = self.pins.get(f"{host}:{port}")
+        return pin["digest"] if pin else None
+
+    def pin(self, host, port, digest):
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        entry = self.pins.get(f"{host}:{port}")
+        if not entry or entry["digest"] != digest:
+            entry = self.pins[f"{host}:{port}"] = {"digest": digest, "first_seen": now}
+        entry["last_seen"] = now
+        try: save_json_file(self.path, self.pins)
+        except OSError: pass
+
+# -----------------------------------------------------------------------------
+# CONNECT PREFLIGHT (concurrent checks before the privileged spawn)
+# -----------------------------------------------------------------------------
+PREFLIGHT_TIMEOUT = 1.5
+
+# status: "ok" | "warn" | "fail"; a "fail" stops the connect attempt
+PreflightCheck = collections.namedtuple("PreflightCheck", "name status detail seconds")
+
+def run_preflight(checks, timeout=PREFLIGHT_TIMEOUT):
+    """Runs (name, fn) checks concurrently; each fn returns (status, detail).
+
+    Results come back in input order within `timeout` seconds. A check that is still
+    running by then is reported as a warning and left to finish in the background; one
+    that raises counts as failed.
+    """
+    def timed(fn):
+        started = time.monotonic()
+        try:
+            status, detail = fn()
+        except Exception as e:
+            status, detail = "fail", str(e) or type(e).__name__
+        return status, detail, time.monotonic() - started
+
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(checks)), thread_name_prefix="preflight")
+    futures = [(name, pool.submit(timed, fn)) for name, fn in checks]
+    concurrent.futures.wait([f for _name, f in futures], timeout=timeout)
+    pool.shutdown(wait=False)
+    results = []
+    for name, future in futures:
+        if future.done():
+            results.append(PreflightCheck(name, *future.result()))
+        else:
+            results.append(PreflightCheck(name, "warn", f"no answer within {timeout:.1f}s", timeout))
+    return results
+
+def check_dns(host):
+    try:
+        ipaddress.ip_address(host)
+        return "ok", f"{host} is an address"
+    except ValueError:
+        pass
+    infos = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+    return "ok", f"{host} -> " + ", ".join(dict.fromkeys(info[4][0] for info in infos))
+
+def check_tls_gateway(host, port, trusted=(), pinned=None, timeout=1.0):
+    """TCP + TLS reachability and whether the leaf certificate matches trusted-cert (or the last pin).
+
+    Only a certificate that definitely matches no trusted-cert fails; an unreachable or
+    slow gateway is a warning, since openfortivpn may still get through (proxy, retry).
+    """
+    try:
+        digest = fetch_cert_digest(host, port, timeout=timeout)
+    except OSError as e:   # includes ssl.SSLError and socket timeouts
+        return "warn", f"{host}:{port} TLS handshake failed: {e.strerror or e}"
+    spki_pins = [d for d in trusted if d.startswith("pin-sha256:")]
+    trusted = [d.lower() for d in trusted if d not in spki_pins]
+    if spki_pins and digest not in trusted:
+        return "ok", f"{host}:{port} TLS ok, sha256 {digest[:16]}... (trusted-cert pins the public key, not compared here)"
+    if trusted and digest not in trusted:
+        try:   # openfortivpn still accepts a certificate that chains to a system CA
+            with socket.create_connection((host, port), timeout=timeout) as sock:
+                ssl.create_default_context().wrap_socket(sock, server_hostname=host).close()
+            return "warn", f"{host}:{port} certificate {digest[:16]}... is not in trusted-cert (but is CA-valid)"
+        except (OSError, ValueError):
+            return "fail", f"{host}:{port} certificate {digest[:16]}... matches no trusted-cert; openfortivpn would reject it"
+    if not trusted and pinned and pinned != digest:
+        return "warn", f"{host}:{port} certificate changed since it was pinned ({pinned[:16]}... -> {digest[:16]}...)"
+    return "ok", f"{host}:{port} TLS ok, sha256 {digest[:16]}..."
+
+def check_udp_route(host, port=500):
+    """Whether the kernel has a route to the gateway (UDP connect sends nothing)."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    with socket.socket(family, socket.SOCK_DGRAM) as s:
+        s.connect((host, port))
+        return "ok", f"route to {host} via local {s.getsockname()[0]}"
+
+def check_binaries(names):
+    missing = [n for n in names if not resolve_binary(n)]
+    if missing:
+        return "fail", "not installed: " + ", ".join(missing)
+    return "ok", ", ".join(names) + " found"
+
+def _resolve_glob_prefix(pattern):
+    """Resolves symlinks in the literal directories of a glob, leaving the wildcard part as is."""
+    parts = os.path.normpath(pattern).split(os.sep)
+    for i, part in enumerate(parts):
+        if any(c in part for c in "*?["):
+            return os.path.join(os.path.realpath(os.sep.join(parts[:i]) or os.sep), *parts[i:])
+    return os.path.realpath(pattern)
+
+def check_ipsec_include(ipsec_dir, conf_path=IPSEC_CONF):
+    """Whether the system ipsec.conf includes the LivConnect profile directory.
+
+    Any include whose glob covers a .conf file there counts, so hand-written equivalents
+    (other spacing, a trailing comment, a symlinked path or a wider glob) pass as well.
+    """
+    try:
+        with open(conf_path, 'r') as f:
+            lines = f.readlines()
+    except OSError as e:
+        return "warn", f"cannot read {conf_path}: {e.strerror}"
+    samples = {os.path.join(os.path.normpath(d), "livconnect.conf")
+               for d in (ipsec_dir, os.path.realpath(ipsec_dir))}
+    for line in lines:
+        try:
+            tokens = shlex.split(line, comments=True)
+        except ValueError:
+            continue
+        if len(tokens) < 2 or tokens[0] != "include":
+            continue
+        # Göreli include'lar ipsec.conf'un bulunduğu dizine göre çözülür
+        pattern = os.path.join(os.path.dirname(os.path.abspath(conf_path)), tokens[1])
+        globs = {os.path.normpath(pattern), _resolve_glob_prefix(pattern)}
+        if any(fnmatch.fnmatchcase(s, g) for s in samples for g in globs):
+            return "ok", f"{conf_path} includes the profile directory"
+    return "fail", f"{conf_path} does not include {ipsec_dir}/*.conf (Settings > Install includes)"
+
+def check_subnet_overlaps(subnets, kernel_routes):
+    """VPN subnets that overlap routes on physical interfaces (hosts there become unreachable)."""
+    overlaps = []
+    for subnet in subnets:
+        try:
+            net = ipaddress.IPv4Network(subnet, strict=False)
+        except ValueError:
+            continue
+        if net.prefixlen == 0:
+            continue
+        for knet, _gw, dev in kernel_routes:
+            if knet.prefixlen and not dev.startswith(VPN_IFACE_PREFIXES) and net.overlaps(knet):
+                overlaps.append(f"{net} overlaps {knet} dev {dev}")
+    if overlaps:
+        return "warn", "; ".join(overlaps)
+    return "ok", f"{len(subnets)} VPN subnet(s), no overlap with local routes" if subnets else "no known VPN subnets yet"
+
+# -----------------------------------------------------------------------------
+# PATH MTU
+# -----------------------------------------------------------------------------
+VPN_PROTOCOL_IFACES = {"forti": ("ppp", "tun", "utun"), "ipsec": ("xfrm", "vti", "ipsec", "utun")}
+MTU_PROBE_FLOOR = 576
+
+def ping_df(host, size, timeout=1):
+    """One ping with the don't-fragment bit set; size is the whole IP packet. True if answered."""
+    v6 = ":" in host
+    payload = size - (48 if v6 else 28)
+    if IS_MAC:
+        cmd = ["ping6" if v6 else "ping", "-c", "1", "-s", str(payload)] + ([] if v6 else ["-D", "-t", str(timeout)])
+    else:
+        cmd = ["ping", "-6" if v6 else "-4", "-M", "do", "-c", "1", "-W", str(timeout), "-s", str(payload)]
+    try:
+        return run_probe(cmd + [host], timeout=timeout + 2).returncode == 0
+    except Exception:
+        return False
+
+def discover_path_mtu(host, low=MTU_PROBE_FLOOR, high=1500, probe=ping_df):
+    """Binary search for the largest DF packet that gets through. None if even `low` fails."""
+    if not probe(host, low):
+        return None
+    if probe(host, high):
+        return high
+    while high - low > 1:
+        mid = (low + high) // 2
+        if probe(host, mid):
+            low = mid
+        else:
+            high = mid
+    return low
+
+def read_iface_mtu(iface):
+    try:
+        if IS_MAC:
+            out = run_probe(["ifconfig", iface]).stdout
+            m = re.search(r"mtu (\d+)", out)
+            return int(m.group(1)) if m else None
+        with open(f"/sys/class/net/{iface}/mtu") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+
+def find_vpn_interface(protocol):
+    """First VPN interface matching the protocol's naming, or None."""
+    ifaces = sorted(read_netdev_counters(VPN_PROTOCOL_IFACES.get(protocol, VPN_IFACE_PREFIXES)))
+    return ifaces[0] if ifaces else None
+
+def build_mtu_script(iface, mtu):
+    """Privileged command that sets the interface MTU.
+
+    Only the host's own connections use the tunnel, and the kernel derives their TCP MSS
+    from the route MTU, so no iptables clamp is needed.
+    """
+    dev = shlex.quote(iface)
+    if IS_MAC:
+        return f"ifconfig {dev} mtu {int(mtu)}"
+    return f"ip link set dev {dev} mtu {int(mtu)}"
+
+# -----------------------------------------------------------------------------
+# SSH COMMAND & PROXY HELPERS
+# -----------------------------------------------------------------------------
+SSH_BASE_OPTIONS = {"StrictHostKeyChecking": "no", "UserKnownHostsFile": "/dev/null",
+                    "ServerAliveInterval": "60", "ServerAliveCountMax": "3", "PasswordAuthentication": "yes"}
+SSH_BENCHMARK_MB = 32
+SSH_RECONNECT_BACKOFF = (1, 2, 5, 10, 30)  # seconds before each quiet reconnect attempt after a roam
+SSH_RECONNECT_SETTLE = 30.0  # an exit within this long after a reconnect continues the backoff
+
+def build_ssh_tunnel_args(profile, relay_ports=None):
+    """ssh arguments (without binary, auth and destination) for a tunnel profile dict.
+
+    relay_ports maps a forward's local port to the internal port ssh should listen on instead.
+    """
+    relay_ports = relay_ports or {}
+    args = ["-p", str(profile.get("port") or 22), "-N"]
+    # Options tuned per profile (cipher benchmark) override the defaults
+    for key, value in {**SSH_BASE_OPTIONS, **profile.get("ssh_options", {})}.items():
+        args += ["-o", f"{key}={value}"]
+    for rule in profile.get("port_forwards", []):
+        local_port, remote_host, remote_port = rule[:3]
+        if int(local_port) in relay_ports:
+            args += ["-L", f"127.0.0.1:{relay_ports[int(local_port)]}:{remote_host}:{remote_port}"]
+        else:
+            args += ["-L", f"{local_port}:{remote_host}:{remote_port}"]
+    if profile.get("dynamic_port"):
+        args += ["-D", f"127.0.0.1:{profile['dynamic_port']}"]
+    return args
+
+DEFAULT_FORWARD_PORT_RANGE = "20000-20999"
+
+def port_in_use(port, host="127.0.0.1"):
+    """Bind test with SO_REUSEADDR (as ssh does), so TIME_WAIT leftovers do not count as busy."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            s.bind((host, int(port)))
+        except OSError:
+            return True
+    return False
+
+def parse_port_range(text):
+    """'20000-20999' -> range(20000, 21000); ValueError if malformed."""
+    lo, _, hi = (text or "").partition("-")
+    lo, hi = int(lo), int(hi or lo)
+    if not (0 < lo <= hi < 65536):
+        raise ValueError(f"Invalid port range: {text}")
+    return range(lo, hi + 1)
+
+def ssh_profile_local_ports(profile):
+    """[(kind, port)] for every local listener a tunnel profile opens."""
+    ports = [("forward", int(rule[0])) for rule in profile.get("port_forwards", [])]
+    if profile.get("dynamic_port"):
+        ports.append(("dynamic_port", int(profile["dynamic_port"])))
+        if profile.get("pac_enabled") and profile.get("pac_port"):
+            ports.append(("pac_port", int(profile["pac_port"])))
+    return ports
+
+def find_port_conflicts(ports):
+    """Busy or duplicated ports out of a list, checked in one pass."""
+    seen, conflicts = set(), []
+    for port in ports:
+        if port in seen or port_in_use(port):
+            conflicts.append(port)
+        seen.add(port)
+    return conflicts
+
+def allocate_free_ports(count, port_range, exclude=()):
+    """Picks `count` bindable ports from port_range, skipping exclude. Raises OSError if exhausted."""
+    exclude, found = set(exclude), []
+    for port in port_range:
+        if len(found) == count:
+            break
+        if port not in exclude and not port_in_use(port):
+            found.append(port)
+    if len(found) < count:
+        raise OSError(f"Only {len(found)} of {count} free ports left in {port_range.start}-{port_range.stop - 1}")
+    return found
+
+def list_local_ciphers(ssh_binary="ssh"):
+    """Ciphers the local ssh client supports ('ssh -Q cipher')."""
+    try:
+        out = run_probe([ssh_binary, "-Q", "cipher"], timeout=5).stdout
+    except Exception:
+        return []
+    return [c.strip() for c in out.splitlines() if c.strip()]
+
+def benchmark_payload(size):
+    """Half random, half repetitive (log-like) data, so compression is measured fairly."""
+    rnd = os.urandom(size // 2)
+    line = b"2025-01-01 12:00:00 INFO request served path=/api/v1/items status=200\n"
+    return rnd + (line * (size // 2 // len(line) + 1))[:size - len(rnd)]
+
+def benchmark_ssh_transfer(cmd, payload, warmup=1 << 20, timeout=120):
+    """Pipes payload through 'ssh ... cat >/dev/null' and returns MB/s, or raises RuntimeError.
+
+    The clock starts after the first `warmup` bytes were accepted, which only happens once
+    the session channel is open, so the key exchange is not counted.
+    """
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    started = None
+    try:
+        view, chunk = memoryview(payload), 1 << 16
+        for off in range(0, len(view), chunk):
+            proc.stdin.write(view[off:off + chunk])
+            if started is None and off + chunk >= warmup:
+                started = time.perf_counter()
+        proc.stdin.close()
+        rc = proc.wait(timeout=timeout)
+    except (BrokenPipeError, subprocess.TimeoutExpired):
+        proc.kill()
+        rc = proc.wait()
+    elapsed = time.perf_counter() - (started or time.perf_counter())
+    if rc != 0:
+        err = proc.stderr.read().decode(errors="replace").strip().splitlines()
+        raise RuntimeError(err[-1] if err else f"ssh exited with {rc}")
+    return (len(payload) - warmup) / (1 << 20) / max(elapsed, 1e-6)
+
+def build_pac_file(socks_port, domains=()):
+    """PAC script sending the given domains (or everything when empty) through the SOCKS listener.
+
+    IPv6 networks are left out: isInNet() only understands IPv4.
+    """
+    proxy = f"SOCKS5 127.0.0.1:{socks_port}; SOCKS 127.0.0.1:{socks_port}"
+    if not domains:
+        return f'function FindProxyForURL(url, host) {{\n  return "{proxy}";\n}}\n'
+    checks = []
+    for d in domains:
+        if "/" in d:
+            net = ipaddress.ip_network(d, strict=False)
+            if net.version == 4:
+                checks.append(f'isInNet(host, "{net.network_address}", "{net.netmask}")')
+        else:
+            d = d.lstrip("*.")
+            checks.append(f'host == {json.dumps(d)} || dnsDomainIs(host, {json.dumps("." + d)})')
+    cond = " ||\n      ".join(checks) or "false"
+    return (f'function FindProxyForURL(url, host) {{\n'
+            f'  if ({cond})\n    return "{proxy}";\n'
+            f'  return "DIRECT";\n}}\n')
+
+def parse_pac_domains(text):
+    """'corp.local, 10.0.0.0/8' -> validated list; raises ValueError on a bad CIDR."""
+    domains = [d.strip() for d in re.split(r"[,\s]+", text or "") if d.strip()]
+    for d in domains:
+        if "/" in d and ipaddress.ip_network(d, strict=False).version == 6:
+            raise ValueError(f"{d}: PAC files cannot match IPv6 networks (isInNet is IPv4-only)")
+    return domains
+
+class PacServer:
+    """Serves one PAC file on 127.0.0.1:port from a daemon thread."""
+    def __init__(self, pac_text, port):
+        body = pac_text.encode()
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ns-proxy-autoconfig")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", int(port)), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/proxy.pac"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+# -----------------------------------------------------------------------------
+# SSH FORWARD ACCOUNTING
+# -----------------------------------------------------------------------------
+FORWARD_STATS_MODES = ("off", "sample", "relay")
+
+def free_local_port(host="127.0.0.1"):
+    """Asks the kernel for an unused TCP port on host."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+def count_port_connections(ports):
+    """Established TCP connections per local port: {port: count}, from /proc/net/tcp{,6} or netstat."""
+    ports = set(ports)
+    counts = dict.fromkeys(ports, 0)
+    if IS_MAC:
+        try:
+            out = run_probe(["netstat", "-an", "-p", "tcp"]).stdout
+        except Exception:
+            return counts
+        for line in out.splitlines():
+            parts = line.split()
+            if len(parts) >= 6 and parts[-1] == "ESTABLISHED":
+                try: port = int(parts[3].rsplit(".", 1)[1])
+                except (IndexError, ValueError): continue
+                if port in ports:
+                    counts[port] += 1
+        return counts
+    for path in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(path) as f:
+                next(f, None)
+                for line in f:
+                    parts = line.split(None, 4)
+                    # sl local_address rem_address st ...; st 01 = ESTABLISHED
+                    if len(parts) > 3 and parts[3] == "01":
+                        port = int(parts[1].rsplit(":", 1)[1], 16)
+                        if port in ports:
+                            counts[port] += 1
+        except OSError:
+            pass
+    return counts
+
+class ForwardRelay:
+    """asyncio relay in front of ssh -L forwards, counting connections and bytes.
+
+    Each entry maps a user-facing local port to the internal port ssh listens on. The
+    relay accepts on 127.0.0.1:local_port and splices to 127.0.0.1:internal_port.
+    """
+    def __init__(self, mapping, host="127.0.0.1"):
+        self.mapping = dict(mapping)   # local_port -> internal_port
+        self.host = host
+        self.stats = {p: {"active": 0, "total": 0, "failed": 0, "bytes_in": 0, "bytes_out": 0, "connect_ms": None}
+                      for p in self.mapping}
+        self.loop = None
+        self._servers = []
+
+    def start(self, timeout=5.0):
+        """Binds all listeners in a background event loop. Raises OSError if a port is taken."""
+        ready = threading.Event()
+        error = []
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            try:
+                for local_port in self.mapping:
+                    self._servers.append(self.loop.run_until_complete(asyncio.start_server(
+                        lambda r, w, p=local_port: self._handle(p, r, w), self.host, local_port)))
+            except OSError as e:
+                error.append(e)
+            ready.set()
+            if not error:
+                self.loop.run_forever()
+            for server in self._servers:
+                server.close()
+            self.loop.close()
+
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait(timeout)
+        if error:
+            raise error[0]
+        return self
+
+    def stop(self):
+        if self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def snapshot(self):
+        return {p: dict(s) for p, s in self.stats.items()}
+
+    async def _pipe(self, reader, writer, stats, key):
+        """Copies one direction. EOF is passed on as a half-close (the client may still be
+        waiting for the answer, e.g. nc -N); a reset tears the whole connection down."""
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                stats[key] += len(data)
+                writer.write(data)
+                await writer.drain()
+            if writer.can_write_eof():
+                writer.write_eof()
+                return
+        except (ConnectionError, OSError):
+            pass
+        try: writer.close()
+        except Exception: pass
+
+    async def _handle(self, local_port, client_reader, client_writer):
+        stats = self.stats[local_port]
+        stats["total"] += 1
+        started = time.perf_counter()
+        try:
+            upstream_reader, upstream_writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.mapping[local_port]), 10)
+        except (OSError, asyncio.TimeoutError):
+            stats["failed"] += 1
+            client_writer.close()
+            return
+        stats["connect_ms"] = (time.perf_counter() - started) * 1000.0
+        stats["active"] += 1
+        try:
+            await asyncio.gather(self._pipe(client_reader, upstream_writer, stats, "bytes_out"),
+                                 self._pipe(upstream_reader, client_writer, stats, "bytes_in"))
+        finally:
+            stats["active"] -= 1
+            for writer in (client_writer, upstream_writer):
+                try: writer.close()
+                except Exception: pass
+
+# -----------------------------------------------------------------------------
+# NETWORKMANAGER HELPERS
+# -----------------------------------------------------------------------------
+NM_IPV4_FIELDS = ("ipv4.method", "ipv4.addresses", "ipv4.gateway", "ipv4.dns", "ipv4.routes")
+
+def netmask_to_prefix(mask):
+    """Converts 255.255.255.0 to 24."""
+    try:
+        return sum([bin(int(x)).count('1') for x in mask.split('.')])
+    except:
+        return 24 # Fallback
+
+def split_nmcli_terse(line):
+    """Splits one 'nmcli -t' line on unescaped ':' and unescapes '\\:' / '\\\\'."""
+    fields, cur, i = [], [], 0
+    while i < len(line):
+        ch = line[i]
+        if ch == "\\" and i + 1 < len(line):
+            cur.append(line[i + 1])
+            i += 2
+            continue
+        if ch == ":":
+            fields.append("".join(cur))
+            cur = []
+        else:
+            cur.append(ch)
+        i += 1
+    fields.append("".join(cur))
+    return fields
+
+def parse_nmcli_multi(output, key="connection.id"):
+    """Splits 'nmcli -t -f connection.id,... con show id A id B' output into {id: {property: value}}."""
+    blocks, current = {}, None
+    for line in output.splitlines():
+        if ":" not in line:
+            continue
+        prop, _, value = line.partition(":")
+        value = value.replace("\\:", ":").strip()
+        if prop == key:
+            current = blocks.setdefault(value, {})
+        elif current is not None:
+            current[prop] = value
+    return blocks
+
+def normalize_nm_route(dest, gw=""):
+    """Canonical 'dest/prefix gw' string for a single route."""
+    dest = dest.strip()
+    if dest and "/" not in dest:
+        dest += "/32"
+    gw = gw.strip()
+    return f"{dest} {gw}".strip() if gw not in ("", "0.0.0.0", "--") else dest
+
+def normalize_nm_routes(value):
+    """Parses ipv4.routes in both nmcli formats into a sorted tuple of 'dest gw' strings.
+
+    Older nmcli:  '192.168.5.0/24 10.0.0.1, 10.0.0.0/8 10.0.0.1 100'
+    Newer nmcli:  '{ ip = 192.168.5.0/24, nh = 10.0.0.1 }; { ip = 10.0.0.0/8, nh = 10.0.0.1, mt = 100 }'
+    """
+    value = (value or "").strip()
+    if not value or value == "--":
+        return ()
+    routes = []
+    if "{" in value:
+        for block in re.findall(r'\{([^}]*)\}', value):
+            ip = re.search(r'ip\s*=\s*([^,\s]+)', block)
+            nh = re.search(r'nh\s*=\s*([^,\s]+)', block)
+            if ip:
+                routes.append(normalize_nm_route(ip.group(1), nh.group(1) if nh else ""))
+    else:
+        for item in value.split(","):
+            parts = item.split()
+            if parts:
+                routes.append(normalize_nm_route(parts[0], parts[1] if len(parts) > 1 else ""))
+    return tuple(sorted(set(routes)))
+
+def _nm_list(value):
+    value = (value or "").strip()
+    if not value or value == "--":
+        return ()
+    return tuple(v for v in re.split(r'[,\s]+', value) if v)
+
+def normalize_nm_ipv4(props):
+    """Normalizes nmcli ipv4.* properties so they can be compared with a desired state."""
+    gateway = (props.get("ipv4.gateway") or "").strip()
+    return {
+        "ipv4.method": (props.get("ipv4.method") or "auto").strip(),
+        "ipv4.addresses": tuple(sorted(_nm_list(props.get("ipv4.addresses")))),
+        "ipv4.gateway": "" if gateway == "--" else gateway,
+        "ipv4.dns": _nm_list(props.get("ipv4.dns")),
+        "ipv4.routes": normalize_nm_routes(props.get("ipv4.routes")),
+    }
+
+def nm_desired_ipv4(data):
+    """Builds the desired ipv4.* state from a network profile dict (form or JSON)."""
+    routes = tuple(sorted({normalize_nm_route(str(r[1]), str(r[2]))
+                           for r in data.get("routes", []) if len(r) >= 3 and r[0] == "ROUTE"}))
+    if data.get("mode") == "manual":
+        subnet = str(data.get("subnet", "")).strip()
+        prefix = netmask_to_prefix(subnet) if "." in subnet else (subnet or 24)
+        return {
+            "ipv4.method": "manual",
+            "ipv4.addresses": (f"{data.get('ip', '').strip()}/{prefix}",),
+            "ipv4.gateway": str(data.get("gateway", "")).strip(),
+            "ipv4.dns": _nm_list(data.get("dns", "")),
+            "ipv4.routes": routes,
+        }
+    # DHCP - Clear static settings
+    return {"ipv4.method": "auto", "ipv4.addresses": (), "ipv4.gateway": "", "ipv4.dns": (), "ipv4.routes": routes}
+
+def diff_nm_ipv4(current, desired):
+    """Returns [(property, current, desired)] for every ipv4 property that differs."""
+    return [(k, current.get(k), desired[k]) for k in NM_IPV4_FIELDS if current.get(k) != desired[k]]
+
+def format_nm_value(prop, value):
+    """Formats a normalized value the way 'nmcli con mod' expects it."""
+    if isinstance(value, tuple):
+        return ", ".join(value) if prop == "ipv4.routes" else ",".join(value)
+    return value or ""
+
+def nm_mod_args(delta):
+    """Flattens a delta into 'prop value prop value ...' for a single 'nmcli con mod' call."""
+    args = []
+    for prop, _, new in delta:
+        args.extend([prop, format_nm_value(prop, new)])
+    return args
+
+# -----------------------------------------------------------------------------
+# ROUTE ENGINE (validation, aggregation, kernel conflict detection)
+# -----------------------------------------------------------------------------
+def plan_routes(entries):
+    """Validates (target, gateway) pairs and collapses adjacent/contained prefixes per gateway.
+
+    Returns a dict with:
+      routes     - aggregated [(IPv4Network, IPv4Address)] sorted by gateway and network
+      errors     - entries that cannot be installed
+      warnings   - normalized host bits, duplicates, prefixes routed via two gateways
+      input_count / merged - sizes before aggregation and how many entries were folded away
+    """
+    errors, warnings = [], []
+    by_gateway = {}
+    seen = {}
+    valid = 0
+    for target, gateway in entries:
+        target, gateway = str(target).strip(), str(gateway).strip()
+        try:
+            net = ipaddress.IPv4Network(target, strict=False)
+        except ValueError:
+            errors.append(f"Invalid target subnet: '{target}'")
+            continue
+        try:
+            gw = ipaddress.IPv4Address(gateway)
+        except ValueError:
+            errors.append(f"Invalid gateway '{gateway}' for {target}")
+            continue
+        if str(net) != target and "/" in target:
+            warnings.append(f"{target} has host bits set, using {net}")
+        if net.prefixlen == 0:
+            errors.append(f"{net} via {gw} would replace the default route")
+            continue
+        if (net, gw) in seen:
+            warnings.append(f"Duplicate route {net} via {gw}")
+            continue
+        other = next((g for (n, g) in seen if n == net and g != gw), None)
+        if other is not None:
+            warnings.append(f"{net} is routed via both {other} and {gw}")
+        seen[(net, gw)] = True
+        by_gateway.setdefault(gw, []).append(net)
+        valid += 1
+
+    routes = []
+    for gw in sorted(by_gateway):
+        for net in ipaddress.collapse_addresses(by_gateway[gw]):
+            routes.append((net, gw))
+    return {
+        "routes": routes,
+        "errors": errors,
+        "warnings": warnings,
+        "input_count": valid,
+        "merged": valid - len(routes),
+    }
+
+def read_kernel_routes():
+    """Returns the IPv4 routing table as [(IPv4Network, gateway or None, iface)].
+
+    Reads /proc/net/route and falls back to 'ip -j route' where /proc is unavailable.
+    """
+    table = []
+    for r in read_route_table():
+        try:
+            net = ipaddress.IPv4Network(f"{r['dest']}/{r['prefix']}", strict=False)
+        except ValueError:
+            continue
+        table.append((net, None if r["gateway"] == "0.0.0.0" else r["gateway"], r["iface"]))
+    if table or not resolve_binary("ip"):
+        return table
+    try:
+        out = run_probe(["ip", "-j", "route"]).stdout
+        for r in json.loads(out or "[]"):
+            dst = r.get("dst", "")
+            dst = "0.0.0.0/0" if dst == "default" else dst
+            try:
+                net = ipaddress.IPv4Network(dst, strict=False)
+            except ValueError:
+                continue
+            table.append((net, r.get("gateway"), r.get("dev", "")))
+    except Exception:
+        pass
+    return table
+
+def find_route_conflicts(routes, kernel_routes, own_device=None):
+    """Lists planned routes that overlap kernel routes through a different gateway/interface.
+
+    The default route and routes already installed identically on our own device are ignored.
+    """
+    conflicts = []
+    for net, gw in routes:
+        for knet, kgw, kdev in kernel_routes:
+            if knet.prefixlen == 0 or not net.overlaps(knet):
+                continue
+            if kgw == str(gw) and (own_device is None or kdev == own_device):
+                continue  # Same next hop, e.g. installed by a previous apply
+            if kgw is None and own_device and kdev == own_device:
+                continue  # Connected subnet of the interface we are configuring
+            via = f"via {kgw} " if kgw else ""
+            conflicts.append(f"{net} via {gw} overlaps kernel route {knet} {via}dev {kdev}")
+    return conflicts
+
+# -----------------------------------------------------------------------------
+# WIDGETS
+# -----------------------------------------------------------------------------
+class VirtualListbox(tk.Canvas):
+    """Listbox look-alike that only draws the rows in view (hundreds of profiles scroll freely).
+
+    Implements the part of the tk.Listbox API the app uses (insert, delete, get, size,
+    curselection, selection_set/clear, see, yview, yscrollcommand) and fires
+    <<ListboxSelect>> on mouse or keyboard selection.
+    """
+    def __init__(self, master, font=("Segoe UI", 11), bg="white", fg=COLOR_TEXT,
+                 selectbackground="#e3f2fd", selectforeground="#0d47a1", yscrollcommand=None, **kw):
+        super().__init__(master, bg=bg, highlightthickness=0, bd=0, takefocus=1, **kw)
+        self.items = []
+        self._font = tkfont.Font(root=master, font=font)
+        self._row = self._font.metrics("linespace") + 6
+        self._fg, self._sel_bg, self._sel_fg = fg, selectbackground, selectforeground
+        self._yscroll = yscrollcommand
+        self._offset = 0        # pixels scrolled from the top
+        self._selected = None
+        self.bind("<Configure>", lambda e: self._redraw())
+        self.bind("<Button-1>", self._on_click)
+        self.bind("<MouseWheel>", lambda e: self.yview("scroll", -3 if e.delta > 0 else 3, "units"))
+        self.bind("<Button-4>", lambda e: self.yview("scroll", -3, "units"))
+        self.bind("<Button-5>", lambda e: self.yview("scroll", 3, "units"))
+        self.bind("<Up>", lambda e: self._move(-1))
+        self.bind("<Down>", lambda e: self._move(1))
+        self.bind("<Prior>", lambda e: self._move(-self._page()))
+        self.bind("<Next>", lambda e: self._move(self._page()))
+        self.bind("<Home>", lambda e: self._move(-len(self.items)))
+        self.bind("<End>", lambda e: self._move(len(self.items)))
+
+    # --- Listbox API ---
+    def _index(self, index):
+        return len(self.items) if index == tk.END else int(index)
+
+    def size(self):
+        return len(self.items)
+
+    def get(self, first, last=None):
+        if last is None:
+            i = self._index(first)
+            return self.items[i] if 0 <= i < len(self.items) else ""
+        return tuple(self.items[self._index(first):self._index(last) + 1])
+
+    def insert(self, index, *elements):
+        i = min(self._index(index), len(self.items))
+        self.items[i:i] = elements
+        if self._selected is not None and self._selected >= i:
+            self._selected += len(elements)
+        self._redraw()
+
+    def delete(self, first, last=None):
+        i = self._index(first)
+        j = i if last is None else min(self._index(last), len(self.items) - 1)
+        if i >= len(self.items) or j < i:
+            return
+        del self.items[i:j + 1]
+        if self._selected is not None:
+            if i <= self._selected <= j:
+                self._selected = None
+            elif self._selected > j:
+                self._selected -= j - i + 1
+        self._redraw()
+
+    def set_items(self, items):
+        """Replaces the contents, keeping the selected item selected while it is still listed."""
+        current = self.items[self._selected] if self._selected is not None else None
+        self.items = list(items)
+        try:
+            self._selected = self.items.index(current) if current is not None else None
+        except ValueError:
+            self._selected = None
+        self._redraw()
+
+    def curselection(self):
+        return () if self._selected is None else (self._selected,)
+
+    def selection_clear(self, first=0, last=None):
+        self._selected = None
+        self._redraw()
+
+    def selection_set(self, first, last=None):
+        i = self._index(first)
+        self._selected = i if 0 <= i < len(self.items) else None
+        self._redraw()
+
+    def see(self, index):
+        top = self._index(index) * self._row
+        height = self.winfo_height()
+        if top < self._offset:
+            self._offset = top
+        elif top + self._row > self._offset + height:
+            self._offset = top + self._row - height
+        self._redraw()
+
+    def yview(self, *args):
+        height = max(self.winfo_height(), 1)
+        total = len(self.items) * self._row
+        if not args:
+            return (self._offset / total, min((self._offset + height) / total, 1.0)) if total else (0.0, 1.0)
+        if args[0] == "moveto":
+            self._offset = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            self._offset += int(args[1]) * (self._row if args[2] == "units" else height)
+        self._redraw()
+
+    # --- Drawing & input ---
+    def _page(self):
+        return max(1, self.winfo_height() // self._row - 1)
+
+    def _redraw(self):
+        width, height = self.winfo_width(), self.winfo_height()
+        self._offset = max(0, min(self._offset, len(self.items) * self._row - height))
+        tk.Canvas.delete(self, "row")   # delete() is the listbox API here
+        first = self._offset // self._row
+        last = min(len(self.items), (self._offset + height) // self._row + 1)
+        for i in range(first, last):
+            y = i * self._row - self._offset
+            fg = self._fg
+            if i == self._selected:
+                self.create_rectangle(0, y, width, y + self._row, fill=self._sel_bg, outline="", tags="row")
+                fg = self._sel_fg
+            self.create_text(6, y + self._row // 2, text=self.items[i], anchor="w", font=self._font, fill=fg, tags="row")
+        if self._yscroll:
+            self._yscroll(*self.yview())
+
+    def _select(self, i):
+        self._selected = i
+        self.see(i)
+        self.event_generate("<<ListboxSelect>>")
+
+    def _on_click(self, e):
+        self.focus_set()
+        i = (self._offset + e.y) // self._row
+        if 0 <= i < len(self.items):
+            self._select(i)
+
+    def _move(self, delta):
+        if self.items:
+            start = -1 if self._selected is None and delta > 0 else (self._selected or 0)
+            self._select(max(0, min(len(self.items) - 1, start + delta)))
+        return "break"
+
 class LivConnectApp:
     def __init__(self, root):
         self.root = root
@@ -108,17 +3326,34 @@ class LivConnectApp:
         self.is_minimized = False
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
+        # Every external command runs on the runtime loop; UI callbacks come back through its queue,
+        # which the Tk thread polls (the loop thread never calls into Tk)
+        self.runtime = ProcessRuntime().start()
+        self.ui_thread = threading.current_thread()   # the only thread that may touch Tk widgets
+        self.root.after(RUNTIME_POLL_MS, self._drain_runtime)
+
         # State Variables
         self.current_process = None
+        self.forti_output_state = None    # Per-connect state of the openfortivpn output handler
         self.active_ipsec_conn = None
         self.is_connecting = False
+        self.is_disconnecting = False
         self.connected_profile_name = None
         self.livconnect_auth_type = 'normal'  # Track if profile requires OTP/2FA (livconnect_auth_type=otp) 
+        self.current_vpn_config_path = None  # Config file of our openfortivpn, used to find its exact pid
+        self.pre_connect_net_snapshot = None  # Routes/DNS before connect, verified again after teardown
         
         # SSH Tunnel State Variables
         self.ssh_tunnel_process = None
         self.ssh_tunnel_active = False
         self.active_ssh_tunnel = None
+        self.ssh_forward_relay = None      # ForwardRelay when forward stats mode is "relay"
+        self.ssh_forward_stats = {}        # local port -> stats dict
+        self.ssh_forward_ports = []
+        self.ssh_stats_mode = "off"
+        self.ssh_pac_server = None         # PacServer for the dynamic (SOCKS5) forward
+        self.ssh_tunnel_profile = None     # (name, profile dict) the running tunnel was started from
+        self.ssh_reconnect = None          # {"attempt", "after_id", "started"} while a quiet reconnect runs
 
         # Directories - use hidden folder in home directory
         self.user_home = os.path.expanduser("~")
@@ -127,7 +3362,51 @@ class LivConnectApp:
         self.ipsec_dir = os.path.join(self.base_dir, "ipsec")
         self.net_dir = os.path.join(self.base_dir, "network_profiles")
         self.ssh_dir = os.path.join(self.base_dir, "ssh_tunnels")
+        self.ipsec_state_file = os.path.join(self.base_dir, "ipsec_state.json")  # Profile hashes at last 'ipsec update'
+        self.settings_file = os.path.join(self.base_dir, "settings.json")
+        self.mtu_state_file = os.path.join(self.base_dir, "mtu_state.json")  # Discovered path MTU per VPN profile
+        self.vpn_subnets_file = os.path.join(self.base_dir, "vpn_subnets.json")  # Routes pushed per VPN profile (preflight)
+        self.mtu_tuned_for = None
+        self.established_profile = None    # Set once the tunnel is really up, not just spawned
         self.check_local_folders()
+        self.settings = load_json_file(self.settings_file, {})
+
+        # One adaptive scheduler thread drives every periodic probe (status, SA, traffic, forward stats)
+        self.scheduler = AdaptiveScheduler().start()
+        self.last_vpn_state = None
+
+        # Profile directories: one sorted index kept current by inotify (mtime polling elsewhere)
+        self.profile_index = ProfileIndex({
+            "forti": (self.forti_dir, ".vpn", ()),
+            "ipsec": (self.ipsec_dir, ".conf", (".secrets",)),
+            "net": (self.net_dir, ".json", ()),
+            "ssh": (self.ssh_dir, ".json", ()),
+        })
+        self.profile_watcher = ProfileWatcher(self.profile_index, on_changes=lambda chs: self.runtime.deliver(self.apply_profile_changes, chs)).start(self.scheduler)
+        self.profile_models = ProfileModelCache()    # Parsed + validated Forti/IPsec profiles, re-parsed on mtime change
+        self.cert_pins = CertPinStore(os.path.join(self.base_dir, "cert_pins.json"))   # Gateway cert digests
+        self.profile_search = ProfileSearchIndex()   # Forti/IPsec names + host/conn fields for the list filter
+        self.profile_cache = LRUCache(64)            # (kind, name) -> editor contents, dropped on file changes
+        self.build_profile_search()
+        self.connection_history = ConnectionHistory(os.path.join(self.base_dir, "history.json"))   # Palette ranking
+        self.palette_window = None
+        self.groups_file = os.path.join(self.base_dir, "groups.json")  # Named profile groups (batch connect)
+        self.group_reports = {}   # group -> (action, [GroupStep], seconds) of its last run
+        self.group_running = None
+
+        # Link/address/route changes (Linux rtnetlink); other platforms rely on polling
+        self.interface_inventory = InterfaceInventory()   # Addresses per interface, refreshed on netlink events
+        self.default_route = self.settled_route = read_default_route()   # (gateway, ifname), physical uplink
+        self.net_change_after_id = None
+        self.netlink_watcher = NetlinkWatcher(on_events=lambda evs: self.runtime.deliver(self._on_netlink_events, evs)).start()
+
+        # IPsec SA sampler (cached 'ipsec statusall', adaptive interval)
+        self.ipsec_sampler = IpsecStatusSampler(on_update=lambda: self.runtime.deliver(self.refresh_ipsec_sa_view)).start(self.scheduler)
+
+        # VPN interface throughput (/proc/net/dev) and in-VPN latency probe
+        self.traffic_sampler = TrafficSampler(on_update=lambda: self.runtime.deliver(self.refresh_traffic_graph))
+        self.traffic_sampler.set_probe_target(self.settings.get("latency_probe", ""))
+        self.traffic_sampler.start(self.scheduler)
 
         # UI Init
         self.setup_styles()
@@ -141,8 +3420,12 @@ class LivConnectApp:
         if HAS_TRAY:
             threading.Thread(target=self.init_tray_icon, daemon=True).start()
 
-        # Background Monitor
-        self.monitor_vpn_status()
+        # strongSwan VICI events (falls back to CLI polling when the socket is not accessible)
+        self.ipsec_user_disconnect = False
+        self.vici_monitor = ViciEventMonitor(on_event=lambda n, m: self.runtime.deliver(self._on_vici_event, n, m)).start()
+
+        # Background Monitor (3s while things change, backing off to 15s when stable)
+        self.scheduler.add("vpn-status", self.monitor_vpn_status, 3.0, 15.0)
 
     # -------------------------------------------------------------------------
     # UI COMPONENTS (MODULAR)
@@ -158,6 +3441,19 @@ class LivConnectApp:
         self.status_label = tk.Label(self.action_bar, text="Status: Ready", bg="white", font=("Segoe UI", 11))
         self.status_label.pack(side=tk.LEFT, padx=5)
 
+        # Traffic graph: RX (green) / TX (blue) rates and latency sparkline (orange)
+        self.traffic_canvas = tk.Canvas(self.action_bar, width=TRAFFIC_GRAPH_WIDTH, height=TRAFFIC_GRAPH_HEIGHT, bg="#fafafa", highlightthickness=1, highlightbackground="#e0e0e0")
+        self.traffic_canvas.pack(side=tk.LEFT, padx=(15, 5))
+        self.traffic_rx_line = self.traffic_canvas.create_line(0, 0, 0, 0, fill=COLOR_SUCCESS, width=1.5, state="hidden")
+        self.traffic_tx_line = self.traffic_canvas.create_line(0, 0, 0, 0, fill=COLOR_PRIMARY, width=1.5, state="hidden")
+        self.latency_canvas = tk.Canvas(self.action_bar, width=LATENCY_GRAPH_WIDTH, height=TRAFFIC_GRAPH_HEIGHT, bg="#fafafa", highlightthickness=1, highlightbackground="#e0e0e0")
+        self.latency_canvas.pack(side=tk.LEFT, padx=5)
+        self.latency_line = self.latency_canvas.create_line(0, 0, 0, 0, fill=COLOR_WARNING, width=1.5, state="hidden")
+        self.traffic_label = tk.Label(self.action_bar, text="", bg="white", fg="gray", font=("Consolas", 9), justify=tk.LEFT)
+        self.traffic_label.pack(side=tk.LEFT, padx=5)
+        self.ip_label = tk.Label(self.action_bar, text="", bg="white", fg="gray", font=("Segoe UI", 9))
+        self.ip_label.pack(side=tk.LEFT, padx=5)
+
         self.btn_disconnect = tk.Button(self.action_bar, text="■ DISCONNECT VPN", bg=COLOR_DANGER, fg="white", font=("Segoe UI", 10, "bold"), bd=0, padx=20, pady=8, command=self.disconnect_vpn, state="disabled", cursor="hand2")
         self.btn_disconnect.pack(side=tk.RIGHT, padx=5)
 
@@ -200,9 +3496,16 @@ class LivConnectApp:
         self.vpn_list_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
 
         tk.Label(self.vpn_list_container, text="VPN Profiles", bg=COLOR_SIDEBAR, fg="gray", font=("Segoe UI", 9)).pack(anchor="w", pady=(10,0))
+        # Type-to-filter over names, hosts and conn names (Down moves into the list, Esc clears)
+        self.profile_filter_var = tk.StringVar()
+        self.profile_filter_entry = tk.Entry(self.vpn_list_container, textvariable=self.profile_filter_var, font=("Segoe UI", 10), bd=1, relief="solid")
+        self.profile_filter_entry.pack(fill=tk.X, pady=(5, 0))
+        self.profile_filter_entry.bind("<Down>", lambda e: (self.file_listbox.focus_set(), self.file_listbox.event_generate("<Down>")))
+        self.profile_filter_entry.bind("<Escape>", lambda e: self.profile_filter_var.set(""))
+        self.profile_filter_var.trace_add("write", lambda *a: self.refresh_profile_list())
         list_scroll = tk.Scrollbar(self.vpn_list_container)
         list_scroll.pack(side=tk.RIGHT, fill=tk.Y)
-        self.file_listbox = tk.Listbox(self.vpn_list_container, font=("Segoe UI", 11), bd=0, highlightthickness=0, bg=COLOR_SIDEBAR, selectbackground="#e3f2fd", selectforeground="#0d47a1", activestyle="none", exportselection=False, yscrollcommand=list_scroll.set)
+        self.file_listbox = VirtualListbox(self.vpn_list_container, font=("Segoe UI", 11), bg=COLOR_SIDEBAR, selectbackground="#e3f2fd", selectforeground="#0d47a1", yscrollcommand=list_scroll.set)
         self.file_listbox.pack(fill=tk.BOTH, expand=True, pady=5)
         list_scroll.config(command=self.file_listbox.yview)
         self.file_listbox.bind('<<ListboxSelect>>', self.load_selected_profile)
@@ -247,6 +3550,18 @@ class LivConnectApp:
         self.editor_sec = scrolledtext.ScrolledText(self.tab2_frame, font=("Consolas", 10), bd=0, padx=10, pady=10)
         self.editor_sec.pack(fill=tk.BOTH, expand=True)
 
+        self.tab3_frame = tk.Frame(self.notebook, bg="white")
+        self.notebook.add(self.tab3_frame, text="  SA Status  ")
+        sa_columns = ("conn", "profile", "ike", "child", "rx_rate", "tx_rate", "bytes_in", "bytes_out", "packets", "rekey")
+        self.ipsec_sa_tree = ttk.Treeview(self.tab3_frame, columns=sa_columns, show="headings", height=8)
+        for col, title, width in (("conn", "Conn", 120), ("profile", "Profile", 110), ("ike", "IKE", 100), ("child", "CHILD", 90),
+                                  ("rx_rate", "RX/s", 80), ("tx_rate", "TX/s", 80), ("bytes_in", "Bytes In", 80),
+                                  ("bytes_out", "Bytes Out", 80), ("packets", "Pkts In/Out", 90), ("rekey", "Rekey", 150)):
+            self.ipsec_sa_tree.heading(col, text=title)
+            self.ipsec_sa_tree.column(col, width=width, anchor="w")
+        self.ipsec_sa_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.ipsec_conn_profiles = None   # conn name -> profile, reset on IPsec profile changes
+
         # -- VIEW 2: NETWORK MANAGER --
         self.net_view_frame = tk.Frame(self.content_container, bg=COLOR_BG)
         self.setup_network_manager_ui(self.net_view_frame)
@@ -367,6 +3682,18 @@ class LivConnectApp:
 
         self.toggle_ip_inputs() # Set initial state
 
+        # Target connections (multi-select; none selected = connection with the default route)
+        target_frame = tk.Frame(iface_frame, bg="white")
+        target_frame.pack(fill=tk.X, pady=(5, 0), padx=20)
+        tk.Label(target_frame, text="Apply To:", bg="white").pack(side=tk.LEFT, padx=5, anchor="n")
+        self.net_target_listbox = tk.Listbox(target_frame, selectmode=tk.MULTIPLE, height=3, width=45, exportselection=False, font=("Segoe UI", 9))
+        self.net_target_listbox.pack(side=tk.LEFT, padx=5)
+        tk.Button(target_frame, text="↻", bg="#e0e0e0", command=self.refresh_net_targets).pack(side=tk.LEFT, padx=5, anchor="n")
+        tk.Label(target_frame, text="(none selected = primary connection)", bg="white", fg="gray", font=("Segoe UI", 8)).pack(side=tk.LEFT, anchor="n")
+        self.net_target_names = []
+        self.net_active_connections = []   # last get_active_connections() answer
+        self.refresh_net_targets()
+
         # 3. Additional Rules (Routes)
         rule_frame = tk.LabelFrame(parent, text="Additional Rules (Static Routes)", bg="white", padx=10, pady=10)
         rule_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
@@ -388,6 +3715,9 @@ class LivConnectApp:
         # Remove Selected Button
         tk.Button(r_frame, text="Remove Selected", command=self.remove_net_row, bg="#ffcdd2").pack(side=tk.LEFT, padx=5)
 
+        # Validate & Merge Button
+        tk.Button(r_frame, text="Validate & Merge", command=self.optimize_net_routes, bg="#d1c4e9").pack(side=tk.LEFT, padx=5)
+
         # Treeview
         columns = ("type", "detail", "gateway")
         self.net_tree = ttk.Treeview(rule_frame, columns=columns, show="headings", height=5)
@@ -410,6 +3740,9 @@ class LivConnectApp:
                   font=("Segoe UI", 14, "bold"), pady=15, bd=0, cursor="hand2", 
                   activebackground="#512da8", activeforeground="white",
                   command=self.apply_current_net_config).pack(fill=tk.X, padx=20)
+        tk.Button(apply_frame, text="🔍 Preview Changes (Dry Run)", bg="#ede7f6", fg=COLOR_NETWORK, bd=0,
+                  font=("Segoe UI", 9, "bold"), pady=5, cursor="hand2",
+                  command=self.preview_net_config).pack(fill=tk.X, padx=20, pady=(5, 0))
 
         # Init
         self.refresh_net_profiles()
@@ -424,15 +3757,10 @@ class LivConnectApp:
     # --- Network Logic (JSON & Execution) ---
     def netmask_to_prefix(self, mask):
         """Converts 255.255.255.0 to 24."""
-        try:
-            return sum([bin(int(x)).count('1') for x in mask.split('.')])
-        except:
-            return 24 # Fallback
+        return netmask_to_prefix(mask)
 
     def refresh_net_profiles(self):
-        if not os.path.exists(self.net_dir): os.makedirs(self.net_dir)
-        files = [f.replace(".json", "") for f in os.listdir(self.net_dir) if f.endswith(".json")]
-        self.net_profile_combo['values'] = sorted(files)
+        self.net_profile_combo['values'] = self.profile_index.names("net")
 
     def create_network_profile(self):
         name = simple_input(self.root, "New Network Profile", "Profile Name:")
@@ -442,10 +3770,11 @@ class LivConnectApp:
             default_data = {
                 "mode": "auto",
                 "ip": "", "subnet": "255.255.255.0", "gateway": "", "dns": "",
-                "routes": []
+                "routes": [],
+                "targets": []
             }
             with open(path, 'w') as f: json.dump(default_data, f)
-            self.refresh_net_profiles()
+            self.sync_profiles("net")
             self.net_profile_combo.set(name)
             self.load_network_profile(None)
 
@@ -454,7 +3783,7 @@ class LivConnectApp:
         if not name: return
         if messagebox.askyesno("Confirm", "Delete network profile?"):
             os.remove(os.path.join(self.net_dir, name + ".json"))
-            self.refresh_net_profiles()
+            self.sync_profiles("net")
             self.net_profile_combo.set("")
             self.clear_net_tree()
 
@@ -464,22 +3793,60 @@ class LivConnectApp:
             messagebox.showwarning("Save", "Select/Create a profile first.")
             return
         
+        data = self._collect_net_profile_data()
+        
+        with open(os.path.join(self.net_dir, name + ".json"), 'w') as f:
+            json.dump(data, f)
+        self.sync_profiles("net")
+        self.log_message(f"Network profile saved: {name}", "INFO")
+
+    def _collect_net_profile_data(self):
+        """Returns the Network Manager form in the same layout as the JSON profiles."""
         routes = []
         for child in self.net_tree.get_children():
             routes.append(self.net_tree.item(child)["values"])
         
-        data = {
+        return {
             "mode": self.ip_mode_var.get(),
             "ip": self.ent_iface_ip.get(),
             "subnet": self.ent_iface_subnet.get(),
             "gateway": self.ent_iface_gw.get(),
             "dns": self.ent_iface_dns.get(),
-            "routes": routes
+            "routes": routes,
+            "targets": [self.net_target_names[i] for i in self.net_target_listbox.curselection()]
         }
-        
-        with open(os.path.join(self.net_dir, name + ".json"), 'w') as f:
-            json.dump(data, f)
-        self.log_message(f"Network profile saved: {name}", "INFO")
+
+    def refresh_net_targets(self, selected=None):
+        """Fills the target list with NetworkManager connections (active ones first).
+
+        The list is redrawn right away from the last nmcli answer (so a loaded profile's
+        targets are selected immediately); nmcli itself runs on a worker.
+        """
+        if selected is None:
+            selected = self._selected_net_targets()
+        self._render_net_targets(self.net_active_connections, selected)
+        self.run_in_worker(self.get_active_connections, then=self._on_net_targets_read)
+
+    def _selected_net_targets(self):
+        return [self.net_target_names[i] for i in self.net_target_listbox.curselection()]
+
+    def _on_net_targets_read(self, active, error):
+        if error:
+            return
+        self.net_active_connections = active
+        self._render_net_targets(active, self._selected_net_targets())
+
+    def _render_net_targets(self, active, selected):
+        names = [c["name"] for c in active]
+        names += [t for t in selected if t not in names]
+        self.net_target_names = names
+        self.net_target_listbox.delete(0, tk.END)
+        devices = {c["name"]: c["device"] for c in active}
+        for i, name in enumerate(names):
+            label = f"{name} ({devices[name]})" if devices.get(name) else f"{name} (inactive)"
+            self.net_target_listbox.insert(tk.END, label)
+            if name in selected:
+                self.net_target_listbox.selection_set(i)
 
     def load_network_profile(self, event):
         name = self.net_profile_combo.get()
@@ -510,10 +3877,42 @@ class LivConnectApp:
                 for route in data.get("routes", []):
                     self.net_tree.insert("", tk.END, values=route)
 
+                # Load Targets
+                self.refresh_net_targets(selected=data.get("targets", []))
+
     def add_route_to_list(self):
-        target = self.ent_target.get()
-        gw = self.ent_gateway.get()
-        if target and gw: self.net_tree.insert("", tk.END, values=("ROUTE", target, gw))
+        target = self.ent_target.get().strip()
+        gw = self.ent_gateway.get().strip()
+        if not (target and gw): return
+        check = plan_routes([(target, gw)])
+        if check["errors"]:
+            messagebox.showerror("Invalid Route", "\n".join(check["errors"]))
+            return
+        net = str(check["routes"][0][0])
+        for child in self.net_tree.get_children():
+            vals = self.net_tree.item(child)["values"]
+            if vals[0] == "ROUTE" and plan_routes([(vals[1], vals[2])])["routes"] == check["routes"]:
+                messagebox.showwarning("Duplicate", f"{net} via {gw} is already in the list.")
+                return
+        self.net_tree.insert("", tk.END, values=("ROUTE", net, gw))
+
+    def optimize_net_routes(self):
+        """Validates the route list and replaces it with the aggregated set (per gateway)."""
+        rows = [self.net_tree.item(c)["values"] for c in self.net_tree.get_children()]
+        route_plan = plan_routes((r[1], r[2]) for r in rows if r[0] == "ROUTE")
+        if route_plan["errors"]:
+            messagebox.showerror("Invalid Routes", "\n".join(route_plan["errors"]))
+            return
+        others = [r for r in rows if r[0] != "ROUTE"]
+        self.clear_net_tree()
+        for r in others:
+            self.net_tree.insert("", tk.END, values=r)
+        for net, gw in route_plan["routes"]:
+            self.net_tree.insert("", tk.END, values=("ROUTE", str(net), str(gw)))
+        summary = f"{route_plan['input_count']} routes -> {len(route_plan['routes'])} after merging"
+        self.log_message(f"Route list optimized: {summary}", "INFO")
+        for w in route_plan["warnings"]:
+            self.log_message(f"Route check: {w}", "WARN")
     
     def add_dns_to_list(self):
         # Deprecated in this UI version (handled in Interface Config)
@@ -526,39 +3925,60 @@ class LivConnectApp:
     def clear_net_tree(self):
         for item in self.net_tree.get_children(): self.net_tree.delete(item)
 
-    def get_active_connection_name(self):
-        """Returns the active NetworkManager connection name (Linux only)."""
+    def get_active_connections(self):
+        """Returns [{name, device, type}] for the active NetworkManager connections (Linux only)."""
         # NetworkManager is Linux-only
         if SYSTEM_OS != 'Linux':
-            return None
+            return []
         
         try:
-            # nmcli -t -f NAME,DEVICE connection show --active
-            # Returns: Wired connection 1:eth0
-            res = subprocess.check_output(["nmcli", "-t", "-f", "NAME", "connection", "show", "--active"], text=True, timeout=5)
-            if res:
-                return res.split('\n')[0].strip() # Return first active connection
+            # nmcli -t -f NAME,DEVICE,TYPE connection show --active
+            # Returns: Wired connection 1:eth0:802-3-ethernet
+            res = self.runtime.run_sync(["nmcli", "-t", "-f", "NAME,DEVICE,TYPE", "connection", "show", "--active"], timeout=5).check_returncode().stdout
         except Exception as e:
             self.log_message(f"Could not get NetworkManager connection: {e}", "WARN")
-            return None
-        return None
+            return []
+        conns = []
+        for line in res.splitlines():
+            if line.strip():
+                fields = split_nmcli_terse(line) + ["", ""]
+                conns.append({"name": fields[0], "device": fields[1], "type": fields[2]})
+        return conns
+
+    def get_primary_connection(self, conns):
+        """Picks the connection whose device carries the default route (fallback: first non-VPN)."""
+        usable = [c for c in conns if c["type"] not in ("loopback", "vpn", "wireguard", "tun") and c["device"]]
+        defaults = sorted((r for r in read_route_table() if r["prefix"] == 0), key=lambda r: r["metric"])
+        for r in defaults:
+            for c in usable:
+                if c["device"] == r["iface"]:
+                    return c
+        return usable[0] if usable else (conns[0] if conns else None)
+
+    def get_active_connection_name(self):
+        """Returns the primary active NetworkManager connection name (Linux only)."""
+        primary = self.get_primary_connection(self.get_active_connections())
+        return primary["name"] if primary else None
+
+    def read_nm_ipv4_states(self, conn_names):
+        """Reads ipv4 settings of several connections with a single unprivileged nmcli call."""
+        cmd = ["nmcli", "-t", "-f", "connection.id," + ",".join(NM_IPV4_FIELDS), "connection", "show"]
+        for name in conn_names:
+            cmd += ["id", name]
+        res = self.runtime.run_sync(cmd, timeout=5).check_returncode().stdout
+        return {name: normalize_nm_ipv4(props) for name, props in parse_nmcli_multi(res).items()}
 
     def get_internal_ip(self):
-        """Get the internal (local) IP address of the machine directly."""
-        return self.get_internal_ip_direct()
-
-    def get_internal_ip_direct(self):
-        """Get the internal (local) IP address of the machine directly."""
-        try:
-            # Get the primary network interface's IP
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            # Connect to a public DNS server (doesn't actually send data)
-            s.connect(("8.8.8.8", 80))
-            ip = s.getsockname()[0]
-            s.close()
-            return ip if ip else "N/A"
-        except Exception as e:
-            return "N/A"
+        """Internal IP from the cached interface inventory (kept fresh by netlink, else by TTL)."""
+        return self.interface_inventory.primary_ip(watched=self.netlink_watcher.available) or "N/A"
+
+    def get_vpn_ips(self):
+        """[(iface, ip)] of VPN interfaces, from the cached inventory."""
+        return self.interface_inventory.vpn_ips(watched=self.netlink_watcher.available)
+
+    def refresh_ip_label(self):
+        ips = [f"IP {self.get_internal_ip()}"] + [f"{name} {ip}" for name, ip in self.get_vpn_ips()]
+        self.ip_label.config(text="  ·  ".join(ips))
 
     def get_external_ip(self):
         """Get the external (public) IP address directly."""
@@ -602,133 +4022,56 @@ class LivConnectApp:
         except Exception as e:
             print(f"Error writing {protocol} log: {str(e)}")
 
-    def _monitor_forti_otp(self):
-        """Monitor openfortivpn stdout for OTP/SMS prompts and handle them"""
-        try:
-            if not self.current_process or not self.current_process.stdout:
-                return
-            
-            import select
-            import fcntl
-            
-            # Store process reference to detect if it gets killed mid-execution
-            process_ref = self.current_process
-            
-            # Set stdout to non-blocking mode
-            try:
-                flags = fcntl.fcntl(process_ref.stdout, fcntl.F_GETFL)
-                fcntl.fcntl(process_ref.stdout, fcntl.F_SETFL, flags | os.O_NONBLOCK)
-            except:
-                pass
-            
-            timeout_counter = 0
-            max_timeout = 300  # 5 minutes max wait for SMS
-            otp_prompt_triggered = False
-            buffer = ""
-            authenticated_without_otp = False  # Track if we got "Authenticated" without OTP
-            gateway_connected_time = None  # Track when gateway connected
-            last_output_time = time.time()  # Track last output from process
-            
-            while process_ref and process_ref.poll() is None and timeout_counter < max_timeout:
-                # Safety check: if current_process was changed/cleared, exit
-                if self.current_process != process_ref:
-                    self.log_message("OTP monitor: Process reference changed, exiting", "WARN")
-                    return
-                
-                # If we detected "Authenticated" → connection complete, no OTP needed
-                if authenticated_without_otp:
-                    self.log_message("VPN authenticated without OTP prompt. Connection successful.", "INFO")
-                    break
-                
-                try:
-                    # Check if data is available on stdout with 2-second select timeout
-                    if select.select([process_ref.stdout], [], [], 2)[0]:
-                        try:
-                            chunk = process_ref.stdout.read(1024)
-                            if chunk:
-                                buffer += chunk
-                                # Process complete lines
-                                while '\n' in buffer:
-                                    line, buffer = buffer.split('\n', 1)
-                                    line = line.strip()
-                                    if line:
-                                        last_output_time = time.time()  # Update last output time
-                                        self.log_message(f"[FortiVPN] {line}", "INFO")
-                                        self._write_protocol_log("openforti", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {line}")
-                                        
-                                        # Check for common OTP/SMS prompts
-                                        lower_line = line.lower()
-                                        # Trigger on 2FA/OTP keywords, but NOT on generic "authentication" or "Authenticated"
-                                        is_otp_prompt = any(prompt in lower_line for prompt in ["two-factor", "sms", "otp", "token:", "challenge:"])
-                                        is_not_auth_complete = "authenticated." not in lower_line  # Skip "Authenticated." completion message
-                                        
-                                        if not otp_prompt_triggered and is_otp_prompt and is_not_auth_complete:
-                                            self.log_message(f"OTP/SMS Prompt detected: {line}", "WARN")
-                                            self._write_protocol_log("openforti", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] OTP/SMS Prompt detected! Showing dialog...")
-                                            
-                                            # Ask user for OTP/SMS code
-                                            self.root.after(0, self._prompt_for_otp, line)
-                                            otp_prompt_triggered = True
-                                            # Don't return - continue monitoring for connection success
-                                        
-                                        # Check if connection was successful
-                                        if "authenticated" in lower_line:
-                                            # "Authenticated" message received
-                                            if self.livconnect_auth_type == 'otp':
-                                                # OTP-enabled profile: wait 3 seconds, then show OTP dialog
-                                                self.log_message(f"Authenticated detected. OTP profile - waiting 3s for SMS...", "INFO")
-                                                time.sleep(3)
-                                                if not otp_prompt_triggered:
-                                                    self.log_message(f"Showing OTP dialog (3s after Authenticated)", "WARN")
-                                                    self._write_protocol_log("openforti", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] OTP profile: showing SMS dialog after Authenticated")
-                                                    self.root.after(0, self._prompt_for_otp, "SMS/OTP Code Required")
-                                                    otp_prompt_triggered = True
-                                            else:
-                                                # Normal profile: no OTP needed
-                                                authenticated_without_otp = True
-                                                otp_prompt_triggered = True  # Prevent dialog from opening
-                                                gateway_connected_time = time.time()  # Record when gateway connected
-                                                self.log_message(f"VPN Connection Established (No OTP required)", "INFO")
-                                                self.root.after(0, lambda: (
-                                                    self.toggle_buttons(True),
-                                                    self.set_status(f"Connected: {self.connected_profile_name}", "connected"),
-                                                    self.root.update()
-                                                ))
-                                        elif "connected to gateway" in lower_line or "add route" in lower_line:
-                                            # Gateway connected - check if OTP needed
-                                            if self.livconnect_auth_type == 'otp' and not otp_prompt_triggered:
-                                                # OTP profile: show dialog after gateway connect
-                                                self.log_message(f"Gateway connected. OTP profile detected - showing SMS dialog...", "WARN")
-                                                self._write_protocol_log("openforti", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] OTP profile: showing SMS dialog after gateway connect")
-                                                self.root.after(0, self._prompt_for_otp, "SMS/OTP Code Required")
-                                                otp_prompt_triggered = True
-                                            else:
-                                                # Normal profile: connection is complete
-                                                if not authenticated_without_otp and not otp_prompt_triggered:
-                                                    gateway_connected_time = time.time()  # Record when gateway connected
-                                                    last_output_time = time.time()  # Reset output timer
-                                                self.log_message(f"VPN Connection Established", "INFO")
-                                                self.root.after(0, lambda: (
-                                                    self.toggle_buttons(True),
-                                                    self.set_status(f"Connected: {self.connected_profile_name}", "connected"),
-                                                    self.root.update()
-                                                ))
-                        except (IOError, OSError):
-                            # Non-blocking read when no data available
-                            pass
-                    else:
-                        timeout_counter += 1
-                        time.sleep(1)
-                except Exception as inner_e:
-                    self.log_message(f"OTP monitor read error: {str(inner_e)}", "ERROR")
-                    break
-                    
-        except Exception as e:
-            self.log_message(f"Error monitoring OTP: {str(e)}", "ERROR")
-            self._write_protocol_log("openforti", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Monitor error: {str(e)}")
+    def _on_forti_line(self, state, line):
+        """Runtime output callback (Tk thread): logs openfortivpn output and drives the OTP/connected flow."""
+        if state is not self.forti_output_state:
+            return  # Output of a replaced process
+        self._write_protocol_log("openforti", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {line}")
+        if state["established"]:
+            return
+        self.log_message(f"[FortiVPN] {line}", "INFO")
+
+        # Trigger on 2FA/OTP keywords, but NOT on generic "authentication" or the "Authenticated." completion message
+        lower_line = line.lower()
+        is_otp_prompt = any(prompt in lower_line for prompt in ["two-factor", "sms", "otp", "token:", "challenge:"])
+        if not state["otp_prompted"] and is_otp_prompt and "authenticated." not in lower_line:
+            self.log_message(f"OTP/SMS Prompt detected: {line}", "WARN")
+            self._write_protocol_log("openforti", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] OTP/SMS Prompt detected! Showing dialog...")
+            state["otp_prompted"] = True
+            self._prompt_for_otp(line)
+
+        if "authenticated" in lower_line:
+            if self.livconnect_auth_type == 'otp':
+                # OTP-enabled profile: give the SMS 3 seconds, then show the OTP dialog
+                self.log_message(f"Authenticated detected. OTP profile - waiting 3s for SMS...", "INFO")
+                self.root.after(3000, self._prompt_for_forti_sms, state, "after Authenticated")
+            else:
+                self.log_message(f"VPN Connection Established (No OTP required)", "INFO")
+                self._on_forti_established(state)
+        elif "connected to gateway" in lower_line or "add route" in lower_line:
+            if self.livconnect_auth_type == 'otp' and not state["otp_prompted"]:
+                self.log_message(f"Gateway connected. OTP profile detected - showing SMS dialog...", "WARN")
+                self._prompt_for_forti_sms(state, "after gateway connect")
+            else:
+                self.log_message(f"VPN Connection Established", "INFO")
+                self._on_forti_established(state)
+
+    def _prompt_for_forti_sms(self, state, when):
+        if state is not self.forti_output_state or state["otp_prompted"] or state["established"]:
+            return
+        state["otp_prompted"] = True
+        self._write_protocol_log("openforti", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] OTP profile: showing SMS dialog {when}")
+        self._prompt_for_otp("SMS/OTP Code Required")
+
+    def _on_forti_established(self, state):
+        state["otp_prompted"] = state["established"] = True  # No dialog once the tunnel is up
+        self.toggle_buttons(True)
+        self.set_status(f"Connected: {self.connected_profile_name}", "connected")
+        self.on_vpn_established("forti")
 
     def _prompt_for_otp(self, prompt_message):
         """Prompt user for OTP/SMS code via Tkinter dialog"""
+        self.scheduler.boost(120)
         try:
             top = tk.Toplevel(self.root)
             top.title("2FA Authentication Required")
@@ -762,12 +4105,11 @@ class LivConnectApp:
                     return
                 
                 try:
-                    self.log_message(f"[OTP Dialog] Checking process: {self.current_process is not None}, stdin: {self.current_process.stdin if self.current_process else None}", "INFO")
+                    self.log_message(f"[OTP Dialog] Checking process: {self.current_process is not None}", "INFO")
                     
-                    if self.current_process and self.current_process.stdin:
+                    if self.current_process and self.current_process.poll() is None:
                         self.log_message(f"[OTP Dialog] Sending code to stdin", "INFO")
-                        self.current_process.stdin.write(otp_code + "\n")
-                        self.current_process.stdin.flush()
+                        self.current_process.write_async(otp_code + "\n")
                         self.log_message(f"OTP code sent to VPN. Closing dialog...", "INFO")
                         self._write_protocol_log("openforti", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] OTP code submitted by user")
                         top.destroy()  # Close immediately after sending
@@ -794,83 +4136,180 @@ class LivConnectApp:
             messagebox.showerror("Error", f"Failed to show OTP prompt: {str(e)}")
             self.log_message(f"Error showing OTP prompt: {str(e)}", "ERROR")
 
-    def apply_current_net_config(self):
+    def plan_net_config(self, then):
+        """Validates routes and diffs the form against every target connection.
+
+        NetworkManager state (active connections, ipv4 settings, kernel routes) is read once
+        for all targets, on a worker. then(plan) runs on the Tk thread with
+        {"targets": [{conn, device, delta, conflicts}], "routes": plan}, or None if nothing can be applied.
+        """
         # NetworkManager is Linux-only
         if SYSTEM_OS != 'Linux':
             messagebox.showerror("Error", "Network Manager is only available on Linux. On macOS, please use System Settings.")
-            return
-        
-        conn_name = self.get_active_connection_name()
-        if not conn_name:
-            messagebox.showerror("Error", "No active NetworkManager connection found.")
-            return
-
-        if not messagebox.askyesno("Apply", f"Apply configuration to interface: '{conn_name}'?\n(Requires Admin Privileges)"): return
-
-        self.log_message(f"Applying config to: {conn_name}", "WARN")
-        commands = []
-
-        # 1. Interface Configuration
-        if self.ip_mode_var.get() == "manual":
-            ip = self.ent_iface_ip.get()
-            subnet_input = self.ent_iface_subnet.get() # Get Mask string
-            gw = self.ent_iface_gw.get()
-            dns = self.ent_iface_dns.get()
-            
-            # Convert Mask to Prefix (if not already)
-            if "." in subnet_input:
-                prefix = self.netmask_to_prefix(subnet_input)
-            else:
-                prefix = subnet_input # Fallback if user typed 24
-
-            # Combine for nmcli
-            full_ip = f"{ip}/{prefix}"
-            
-            # Set Manual
-            commands.append(f"nmcli con mod '{conn_name}' ipv4.method manual")
-            commands.append(f"nmcli con mod '{conn_name}' ipv4.addresses {full_ip}")
-            commands.append(f"nmcli con mod '{conn_name}' ipv4.gateway {gw}")
-            commands.append(f"nmcli con mod '{conn_name}' ipv4.dns {dns}")
-        else:
-            # Set Auto (DHCP) - Clear static settings
-            commands.append(f"nmcli con mod '{conn_name}' ipv4.method auto")
-            commands.append(f"nmcli con mod '{conn_name}' ipv4.addresses ''")
-            commands.append(f"nmcli con mod '{conn_name}' ipv4.gateway ''")
-            commands.append(f"nmcli con mod '{conn_name}' ipv4.dns ''")
-
-        # 2. Additional Routes (Iterate Treeview)
-        # Note: Persistent static routes in NM are ipv4.routes "ip/mask gw"
-        # We need to collect them all
-        routes_str = ""
-        for child in self.net_tree.get_children():
-            vals = self.net_tree.item(child)["values"]
-            if vals[0] == "ROUTE":
-                # nmcli format: "192.168.5.0/24 10.0.0.1"
-                routes_str += f"{vals[1]} {vals[2]},"
+            return then(None)
         
-        if routes_str:
-            routes_str = routes_str.rstrip(',')
-            commands.append(f"nmcli con mod '{conn_name}' ipv4.routes '{routes_str}'")
-        else:
-            # Clear routes if empty list
-            commands.append(f"nmcli con mod '{conn_name}' ipv4.routes ''")
-
-        # 3. Apply Changes (Up the connection)
-        commands.append(f"nmcli con up '{conn_name}'")
+        data = self._collect_net_profile_data()
+        route_plan = plan_routes((r[1], r[2]) for r in data["routes"] if len(r) >= 3 and r[0] == "ROUTE")
+        if route_plan["errors"]:
+            messagebox.showerror("Invalid Routes", "Fix these routes before applying:\n\n" + "\n".join(route_plan["errors"]))
+            return then(None)
+        for w in route_plan["warnings"]:
+            self.log_message(f"Route check: {w}", "WARN")
+
+        def done(plan, error):
+            if error:
+                messagebox.showerror("Error", str(error))
+            then(plan)
+        self.run_in_worker(self._plan_net_targets, data, route_plan, then=done)
+
+    def _plan_net_targets(self, data, route_plan):
+        """Worker half of plan_net_config; raises ValueError with a message for the user."""
+        # Resolve targets: connection names or device names; default = primary connection
+        active = self.get_active_connections()
+        targets = []
+        for t in data.get("targets") or []:
+            match = next((c for c in active if t in (c["name"], c["device"])), None)
+            targets.append((match["name"], match["device"]) if match else (t, ""))
+        if not targets:
+            primary = self.get_primary_connection(active)
+            if not primary:
+                raise ValueError("No active NetworkManager connection found.")
+            targets = [(primary["name"], primary["device"])]
+        targets = list(dict.fromkeys(targets))
 
-        # Execute as Root
-        full_script = "\n".join(commands)
+        try:
+            states = self.read_nm_ipv4_states([name for name, _ in targets])
+        except Exception as e:
+            self.log_message(f"nmcli read failed: {e}", "ERROR")
+            raise ValueError(f"Could not read connection(s) {', '.join(n for n, _ in targets)}:\n{e}")
+        missing = [name for name, _ in targets if name not in states]
+        if missing:
+            raise ValueError(f"Connection(s) not found: {', '.join(missing)}")
+
+        # Install the aggregated set instead of the raw list
+        data["routes"] = [["ROUTE", str(net), str(gw)] for net, gw in route_plan["routes"]]
+        if route_plan["merged"]:
+            self.log_message(f"Routes aggregated: {route_plan['input_count']} -> {len(route_plan['routes'])}", "INFO")
+        desired = nm_desired_ipv4(data)
+        kernel_routes = read_kernel_routes()
+
+        planned = []
+        for conn_name, device in targets:
+            current = states[conn_name]
+            # Routes this connection already owns are not conflicts
+            owned = {tuple(r.split()) for r in current["ipv4.routes"]}
+            kernel = [k for k in kernel_routes if not (k[2] == device and (f"{k[0]}", k[1]) in owned)]
+            planned.append({
+                "conn": conn_name,
+                "device": device,
+                "delta": diff_nm_ipv4(current, desired),
+                "conflicts": find_route_conflicts(route_plan["routes"], kernel, own_device=device or None),
+            })
+        return {"targets": planned, "routes": route_plan}
+
+    def format_net_delta(self, delta):
+        lines = []
+        for prop, old, new in delta:
+            lines.append(f"{prop}:\n   - {format_nm_value(prop, old) or '(empty)'}\n   + {format_nm_value(prop, new) or '(empty)'}")
+        return "\n".join(lines)
+
+    def format_net_plan(self, plan):
+        """Human readable summary of a plan: per-connection delta, route aggregation and conflicts."""
+        parts = []
+        for t in plan["targets"]:
+            header = f"[{t['conn']}] ({t['device'] or 'inactive'})"
+            parts.append(header + "\n" + (self.format_net_delta(t["delta"]) or "   no changes"))
+            if t["conflicts"]:
+                more = f"\n   ... and {len(t['conflicts']) - 10} more" if len(t["conflicts"]) > 10 else ""
+                parts.append("Conflicts with current routing table:\n" + "\n".join(f"   ! {c}" for c in t["conflicts"][:10]) + more)
+        rp = plan["routes"]
+        if rp["merged"]:
+            parts.append(f"Routes: {rp['input_count']} entries aggregated to {len(rp['routes'])}")
+        if rp["warnings"]:
+            parts.append("Route warnings:\n" + "\n".join(f"   ! {w}" for w in rp["warnings"][:10]))
+        return "\n\n".join(p for p in parts if p)
+
+    def preview_net_config(self):
+        """Dry run: shows what APPLY would change without touching the system."""
+        self.plan_net_config(self._show_net_preview)
+
+    def _show_net_preview(self, plan):
+        if not plan: return
+        names = ", ".join(t["conn"] for t in plan["targets"])
+        if not any(t["delta"] for t in plan["targets"]):
+            messagebox.showinfo("Preview", f"{names} already match this configuration.\nNothing to apply.")
+            return
+        self.log_message(f"Preview for {names}: {sum(len(t['delta']) for t in plan['targets'])} change(s)", "INFO")
+        messagebox.showinfo("Preview", f"Changes:\n\n{self.format_net_plan(plan)}")
+
+    def build_net_apply_script(self, targets):
+        """One privileged shell batch that applies every connection concurrently.
+
+        Each connection gets a single 'nmcli con mod' followed by 'device reapply' (fallback
+        'con up'); inactive connections are only modified. Exit status is non-zero if any job failed.
+        """
+        lines = ["rc=0"]
+        for i, t in enumerate(targets):
+            job = shlex.join(["nmcli", "con", "mod", t["conn"], *nm_mod_args(t["delta"])])
+            if t["device"]:
+                job += f" && {{ nmcli device reapply {shlex.quote(t['device'])} || nmcli con up {shlex.quote(t['conn'])}; }}"
+            lines.append(f"( {job} ) & p{i}=$!")
+        for i, t in enumerate(targets):
+            lines.append(f"wait $p{i} || {{ echo {shlex.quote('Failed: ' + t['conn'])} >&2; rc=1; }}")
+        lines.append("exit $rc")
+        return "\n".join(lines)
+
+    def apply_current_net_config(self, interactive=True, done=None):
+        """Applies the loaded network profile; done(ok) is called on the Tk thread afterwards.
+
+        interactive=False (profile groups) skips the confirmation and success dialogs.
+        """
+        done = done or (lambda ok: None)
+        self.plan_net_config(lambda plan: self._apply_net_plan(plan, interactive, done))
+
+    def _apply_net_plan(self, plan, interactive, done):
+        if not plan: return done(False)
+        targets = [t for t in plan["targets"] if t["delta"]]
+        names = ", ".join(t["conn"] for t in plan["targets"])
+
+        if not targets:
+            self.log_message(f"{names} already match the profile, nothing to apply.", "INFO")
+            if interactive:
+                messagebox.showinfo("Apply", f"{names} already match this configuration.")
+            return done(True)
+
+        for t in plan["targets"]:
+            for c in t["conflicts"]:
+                self.log_message(f"Route conflict ({t['conn']}): {c}", "WARN")
+
+        if interactive and not messagebox.askyesno("Apply", f"Apply configuration to: {', '.join(t['conn'] for t in targets)}?\n(Requires Admin Privileges)\n\n{self.format_net_plan(plan)}"): return done(False)
+
+        self.log_message(f"Applying config to: {', '.join(t['conn'] for t in targets)}", "WARN")
+        self.connection_history.record("net", self.net_profile_combo.get())
+
+        # Execute as Root (single prompt, connections applied in parallel)
+        full_script = self.build_net_apply_script(targets)
         self.log_message(f"Executing nmcli commands...", "INFO")
-        
-        res = self.run_as_root(["sh", "-c", full_script])
-        
+        started = time.monotonic()
+        self.run_as_root(["sh", "-c", full_script],
+                         then=lambda res: self._finish_net_apply(res, len(targets), started, interactive, done))
+
+    def _finish_net_apply(self, res, count, started, interactive, done):
         if res and res.returncode == 0:
-            messagebox.showinfo("Success", "Network configuration applied successfully.")
-            self.log_message("Network config applied.", "INFO")
-        else:
-            err = res.stderr if res else "Unknown Error"
-            messagebox.showerror("Failure", f"Failed to apply settings:\n{err}")
-            self.log_message(f"Net Apply Fail: {err}", "ERROR")
+            if interactive:
+                messagebox.showinfo("Success", "Network configuration applied successfully.")
+            self.log_message(f"Network config applied to {count} connection(s) in {time.monotonic() - started:.2f}s.", "INFO")
+            return done(True)
+        err = res.stderr if res else "Unknown Error"
+        messagebox.showerror("Failure", f"Failed to apply settings:\n{err}")
+        self.log_message(f"Net Apply Fail: {err}", "ERROR")
+        done(False)
+
+    def apply_net_profile(self, name, interactive=True, done=None):
+        """Loads a saved network profile into the editor and applies it."""
+        self.net_profile_combo.set(name)
+        self.load_network_profile(None)
+        self.apply_current_net_config(interactive, done)
 
     # -------------------------------------------------------------------------
     # TRAY IMPLEMENTATION
@@ -1011,6 +4450,7 @@ class LivConnectApp:
         menu_items = []
         # Sol-click: window açılır, sağ-click: bu menü açılır
         menu_items.append(pystray.MenuItem("Show LivConnect", self.show_window_from_tray, default=True))
+        menu_items.append(pystray.MenuItem("Quick Connect...", lambda: self.root.after(0, self.open_command_palette)))
         menu_items.append(pystray.Menu.SEPARATOR)
 
         lbl = "Disconnect"
@@ -1020,47 +4460,27 @@ class LivConnectApp:
         menu_items.append(pystray.MenuItem(lbl, self.disconnect_vpn_from_tray, enabled=(self.connected_profile_name is not None)))
         menu_items.append(pystray.Menu.SEPARATOR)
 
-        forti_subs = []
-        if os.path.exists(self.forti_dir):
-            for f in sorted(os.listdir(self.forti_dir)):
-                if f.endswith(".vpn"):
-                    name = f[:-4]
-                    item = pystray.MenuItem(name, self._tray_action_closure(name, "forti"), checked=self._tray_check_closure(name))
-                    forti_subs.append(item)
-        if forti_subs:
-            menu_items.append(pystray.MenuItem("FortiSSL", pystray.Menu(*forti_subs)))
-
-        ipsec_subs = []
-        if os.path.exists(self.ipsec_dir):
-            for f in sorted(os.listdir(self.ipsec_dir)):
-                if f.endswith(".conf"):
-                    name = f[:-5]
-                    item = pystray.MenuItem(name, self._tray_action_closure(name, "ipsec"), checked=self._tray_check_closure(name))
-                    ipsec_subs.append(item)
-        if ipsec_subs:
-            menu_items.append(pystray.MenuItem("IPsec", pystray.Menu(*ipsec_subs)))
+        # Profile submenus are generated from the profile index whenever the menu is shown,
+        # so file changes only need icon.update_menu() instead of a rebuild
+        has = lambda kind: (lambda item: bool(self.profile_index.names(kind)))
+        menu_items.append(pystray.MenuItem("FortiSSL", pystray.Menu(lambda: self._tray_profile_items("forti")), visible=has("forti")))
+        menu_items.append(pystray.MenuItem("IPsec", pystray.Menu(lambda: self._tray_profile_items("ipsec")), visible=has("ipsec")))
 
         # SSH Tunnel
-        ssh_subs = []
         ssh_status_label = "SSH Tunnel"
         if self.ssh_tunnel_active:
             ssh_status_label = f"🔐 SSH Tunnel (Connected)"
-        if os.path.exists(self.ssh_dir):
-            for f in sorted(os.listdir(self.ssh_dir)):
-                if f.endswith(".json"):
-                    name = f[:-5]
-                    checked = lambda n=name: (self.active_ssh_tunnel == n)
-                    ssh_subs.append(pystray.MenuItem(name, self._tray_ssh_action_closure(name), checked=checked))
-        if ssh_subs:
-            ssh_subs.append(pystray.Menu.SEPARATOR)
-            ssh_subs.append(pystray.MenuItem("Disconnect SSH", lambda: self.root.after(0, self.disconnect_ssh_tunnel_from_tray), enabled=self.ssh_tunnel_active))
-            menu_items.append(pystray.MenuItem(ssh_status_label, pystray.Menu(*ssh_subs)))
+        menu_items.append(pystray.MenuItem(ssh_status_label, pystray.Menu(lambda: self._tray_profile_items("ssh")), visible=has("ssh")))
+        menu_items.append(pystray.MenuItem("Groups", pystray.Menu(self._tray_group_items),
+                                           visible=lambda item: bool(load_profile_groups(self.groups_file))))
 
         # IP Information - Load fresh when menu opens
         menu_items.append(pystray.Menu.SEPARATOR)
-        internal_ip = self.get_internal_ip_direct()
+        internal_ip = self.get_internal_ip()
         external_ip = self.get_external_ip_direct()
         menu_items.append(pystray.MenuItem(f"Internal IP: {internal_ip}", lambda: None, enabled=False))
+        for name, ip in self.get_vpn_ips():
+            menu_items.append(pystray.MenuItem(f"VPN IP ({name}): {ip}", lambda: None, enabled=False))
         menu_items.append(pystray.MenuItem(f"External IP: {external_ip}", lambda: None, enabled=False))
         
         menu_items.append(pystray.Menu.SEPARATOR)
@@ -1125,6 +4545,30 @@ class LivConnectApp:
             import traceback
             log_debug(traceback.format_exc())
 
+    def _tray_profile_items(self, kind):
+        """pystray submenu items for one profile kind, read from the profile index."""
+        names = self.profile_index.names(kind)
+        if kind != "ssh":
+            return [pystray.MenuItem(n, self._tray_action_closure(n, kind), checked=self._tray_check_closure(n)) for n in names]
+        items = [pystray.MenuItem(n, self._tray_ssh_action_closure(n), checked=lambda item, n=n: self.active_ssh_tunnel == n) for n in names]
+        items.append(pystray.Menu.SEPARATOR)
+        items.append(pystray.MenuItem("Disconnect SSH", lambda: self.root.after(0, self.disconnect_ssh_tunnel_from_tray), enabled=lambda item: self.ssh_tunnel_active))
+        return items
+
+    def _tray_group_items(self):
+        """pystray submenu: Connect/Disconnect per profile group, with the timing of its last run."""
+        items = []
+        for group in load_profile_groups(self.groups_file):
+            sub = [pystray.MenuItem("Connect", lambda icon, item, g=group: self.root.after(0, self.run_profile_group, g, "up")),
+                   pystray.MenuItem("Disconnect", lambda icon, item, g=group: self.root.after(0, self.run_profile_group, g, "down"))]
+            summary = self.group_summary(group)
+            if summary:
+                _action, steps, _elapsed = self.group_reports.get(group, (None, [], 0))
+                sub += [pystray.Menu.SEPARATOR, pystray.MenuItem(f"Last: {summary}", lambda: None, enabled=False)]
+                sub += [pystray.MenuItem(f"{st.name}: {st.detail} ({st.seconds:.1f}s)", lambda: None, enabled=False) for st in steps]
+            items.append(pystray.MenuItem(group, pystray.Menu(*sub)))
+        return items
+
     def update_tray_menu(self):
         if hasattr(self, 'tray_icon') and self.tray_icon.visible:
             try:
@@ -1168,6 +4612,7 @@ class LivConnectApp:
         # Tray menüsü
         tray_menu = tk.Menu(self.root, tearoff=0, bg=COLOR_SIDEBAR, fg=COLOR_TEXT)
         tray_menu.add_command(label="Show LivConnect", command=self._restore_window)
+        tray_menu.add_command(label="Quick Connect...", command=self.open_command_palette)
         tray_menu.add_separator()
         
         # Disconnect seçeneği
@@ -1182,49 +4627,65 @@ class LivConnectApp:
         tray_menu.add_separator()
         
         # FortiSSL submenu
-        if os.path.exists(self.forti_dir):
-            forti_files = [f[:-4] for f in sorted(os.listdir(self.forti_dir)) if f.endswith(".vpn")]
-            if forti_files:
-                forti_submenu = tk.Menu(tray_menu, tearoff=0, bg=COLOR_SIDEBAR, fg=COLOR_TEXT)
-                for name in forti_files:
-                    forti_submenu.add_command(
-                        label=name, 
-                        command=lambda n=name: self.connect_vpn(n, "forti")
-                    )
-                tray_menu.add_cascade(label="FortiSSL", menu=forti_submenu)
+        forti_files = self.profile_index.names("forti")
+        if forti_files:
+            forti_submenu = tk.Menu(tray_menu, tearoff=0, bg=COLOR_SIDEBAR, fg=COLOR_TEXT)
+            for name in forti_files:
+                forti_submenu.add_command(
+                    label=name, 
+                    command=lambda n=name: self.connect_vpn(n, "forti")
+                )
+            tray_menu.add_cascade(label="FortiSSL", menu=forti_submenu)
         
         # IPsec submenu
-        if os.path.exists(self.ipsec_dir):
-            ipsec_files = [f[:-5] for f in sorted(os.listdir(self.ipsec_dir)) if f.endswith(".conf")]
-            if ipsec_files:
-                ipsec_submenu = tk.Menu(tray_menu, tearoff=0, bg=COLOR_SIDEBAR, fg=COLOR_TEXT)
-                for name in ipsec_files:
-                    ipsec_submenu.add_command(
-                        label=name,
-                        command=lambda n=name: self.connect_vpn(n, "ipsec")
-                    )
-                tray_menu.add_cascade(label="IPsec", menu=ipsec_submenu)
+        ipsec_files = self.profile_index.names("ipsec")
+        if ipsec_files:
+            ipsec_submenu = tk.Menu(tray_menu, tearoff=0, bg=COLOR_SIDEBAR, fg=COLOR_TEXT)
+            for name in ipsec_files:
+                ipsec_submenu.add_command(
+                    label=name,
+                    command=lambda n=name: self.connect_vpn(n, "ipsec")
+                )
+            tray_menu.add_cascade(label="IPsec", menu=ipsec_submenu)
         
         # SSH Tunnel submenu
-        if os.path.exists(self.ssh_dir):
-            ssh_files = [f[:-5] for f in sorted(os.listdir(self.ssh_dir)) if f.endswith(".json")]
-            if ssh_files:
-                ssh_submenu = tk.Menu(tray_menu, tearoff=0, bg=COLOR_SIDEBAR, fg=COLOR_TEXT)
-                for name in ssh_files:
-                    ssh_submenu.add_command(
-                        label=name,
-                        command=lambda n=name: self.connect_ssh_tunnel_from_tray(n)
-                    )
-                ssh_submenu.add_separator()
-                ssh_submenu.add_command(label="Disconnect SSH", command=self.disconnect_ssh_tunnel_from_tray, state="normal" if self.ssh_tunnel_active else "disabled")
-                ssh_status = "🔐 SSH Tunnel (Connected)" if self.ssh_tunnel_active else "🔐 SSH Tunnel"
-                tray_menu.add_cascade(label=ssh_status, menu=ssh_submenu)
+        ssh_files = self.profile_index.names("ssh")
+        if ssh_files:
+            ssh_submenu = tk.Menu(tray_menu, tearoff=0, bg=COLOR_SIDEBAR, fg=COLOR_TEXT)
+            for name in ssh_files:
+                ssh_submenu.add_command(
+                    label=name,
+                    command=lambda n=name: self.connect_ssh_tunnel_from_tray(n)
+                )
+            ssh_submenu.add_separator()
+            ssh_submenu.add_command(label="Disconnect SSH", command=self.disconnect_ssh_tunnel_from_tray, state="normal" if self.ssh_tunnel_active else "disabled")
+            ssh_status = "🔐 SSH Tunnel (Connected)" if self.ssh_tunnel_active else "🔐 SSH Tunnel"
+            tray_menu.add_cascade(label=ssh_status, menu=ssh_submenu)
+
+        # Profile groups submenu
+        groups = load_profile_groups(self.groups_file)
+        if groups:
+            groups_submenu = tk.Menu(tray_menu, tearoff=0, bg=COLOR_SIDEBAR, fg=COLOR_TEXT)
+            for group in groups:
+                group_menu = tk.Menu(groups_submenu, tearoff=0, bg=COLOR_SIDEBAR, fg=COLOR_TEXT)
+                group_menu.add_command(label="Connect", command=lambda g=group: self.run_profile_group(g, "up"))
+                group_menu.add_command(label="Disconnect", command=lambda g=group: self.run_profile_group(g, "down"))
+                summary = self.group_summary(group)
+                if summary:
+                    group_menu.add_separator()
+                    group_menu.add_command(label=f"Last: {summary}", state="disabled")
+                    for st in self.group_reports.get(group, (None, [], 0))[1]:
+                        group_menu.add_command(label=f"{st.name}: {st.detail} ({st.seconds:.1f}s)", state="disabled")
+                groups_submenu.add_cascade(label=group, menu=group_menu)
+            tray_menu.add_cascade(label="Groups", menu=groups_submenu)
         
         # IP Information - Load fresh when menu opens
         tray_menu.add_separator()
-        internal_ip = self.get_internal_ip_direct()
+        internal_ip = self.get_internal_ip()
         external_ip = self.get_external_ip_direct()
         tray_menu.add_command(label=f"Internal IP: {internal_ip}", state="disabled")
+        for name, ip in self.get_vpn_ips():
+            tray_menu.add_command(label=f"VPN IP ({name}): {ip}", state="disabled")
         tray_menu.add_command(label=f"External IP: {external_ip}", state="disabled")
         
         tray_menu.add_separator()
@@ -1259,7 +4720,69 @@ class LivConnectApp:
     # -------------------------------------------------------------------------
     # VPN OPERATIONS
     # -------------------------------------------------------------------------
+    def validate_profile(self, protocol, profile_name):
+        """Parsed profile, or None (after telling the user) when its errors would make the connect fail."""
+        model = self.profile_models.get(protocol, self.profile_path(protocol, profile_name))
+        for w in model.warnings:
+            self.log_message(f"{profile_name}: {w}", "WARN")
+        if not model.errors:
+            return model
+        for e in model.errors:
+            self.log_message(f"{profile_name}: {e}", "ERROR")
+        self._write_protocol_log("openforti" if protocol == "forti" else "ipsec",
+                                 f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Profile check failed for {profile_name}: {'; '.join(model.errors)}")
+        self.set_status("Profile error", "error")
+        messagebox.showerror("Profile Error", f"'{profile_name}' cannot be used yet:\n\n" + "\n".join(f"• {e}" for e in model.errors))
+        return None
+
+    def preflight_checks(self, protocol, profile_name, model):
+        """(name, fn) checks for run_preflight; all of them run without privileges."""
+        subnets = load_json_file(self.vpn_subnets_file, {}).get(profile_name, [])
+        if protocol == "forti":
+            host, port = model.host, model.port or 443
+            binaries = ["openfortivpn"] if IS_MAC else ["openfortivpn", "pkexec"]
+            checks = [("binaries", lambda: check_binaries(binaries))]
+            if host:
+                pinned = self.cert_pins.get(host, port)
+                checks += [("dns", lambda: check_dns(host)),
+                           ("gateway", lambda: check_tls_gateway(host, port, model.trusted_certs, pinned))]
+        else:
+            options = model.options.get(model.conns[0], {}) if model.conns else {}
+            host = options.get("right", "")
+            subnets = list(dict.fromkeys(subnets + [n.strip() for n in options.get("rightsubnet", "").split(",") if n.strip()]))
+            checks = [("binaries", lambda: ("ok", "VICI socket available") if find_vici_socket() else check_binaries(["ipsec"])),
+                      ("include", lambda: check_ipsec_include(self.ipsec_dir))]
+            if host and not host.startswith("%"):
+                checks += [("dns", lambda: check_dns(host)), ("gateway", lambda: check_udp_route(host))]
+        checks.append(("routes", lambda: check_subnet_overlaps(subnets, read_kernel_routes())))
+        return checks
+
+    def run_connect_preflight(self, protocol, profile_name, model, then):
+        """Runs the preflight checks concurrently on a worker; then() follows on the Tk thread if none failed."""
+        started = time.monotonic()
+        self.run_in_worker(run_preflight, self.preflight_checks(protocol, profile_name, model),
+                           then=lambda results, error: self._finish_connect_preflight(
+                               protocol, profile_name, results, error, time.monotonic() - started, then))
+
+    def _finish_connect_preflight(self, protocol, profile_name, results, error, elapsed, then):
+        log_proto = "openforti" if protocol == "forti" else "ipsec"
+        if error:
+            results = [PreflightCheck("preflight", "fail", str(error), elapsed)]
+        levels = {"ok": "INFO", "warn": "WARN", "fail": "ERROR"}
+        for r in results:
+            self.log_message(f"Preflight {r.name}: {r.detail} ({r.seconds * 1000:.0f} ms)", levels[r.status])
+        failed = [r for r in results if r.status == "fail"]
+        self._write_protocol_log(log_proto, f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Preflight for {profile_name}: "
+                                 + ", ".join(f"{r.name}={r.status}" for r in results) + f" ({elapsed * 1000:.0f} ms)")
+        if not failed:
+            return then()
+        self.is_connecting = False
+        self.set_status("Preflight failed", "error")
+        messagebox.showerror("Preflight", f"'{profile_name}' would not connect:\n\n" + "\n".join(f"• {r.name}: {r.detail}" for r in failed))
+
     def connect_vpn(self, profile_name=None, protocol=None):
+        if self.is_connecting:
+            return  # A connect is already in flight (preflight or IPsec initiate on a worker)
         if profile_name is None:
             selection = self.file_listbox.curselection()
             if not selection: 
@@ -1268,8 +4791,20 @@ class LivConnectApp:
             profile_name = self.file_listbox.get(selection[0])
             protocol = self.protocol_var.get()
 
-        current_dir = self.forti_dir if protocol == "forti" else self.ipsec_dir
+        self.connection_history.record(protocol, profile_name)
+        model = self.validate_profile(protocol, profile_name)
+        if model is None:
+            return
+        # Blocks further connects until the preflight worker has answered
         self.is_connecting = True
+        self.set_status(f"Checking {profile_name}...", "working")
+        self.run_connect_preflight(protocol, profile_name, model,
+                                   then=lambda: self._start_vpn_connect(protocol, profile_name, model))
+
+    def _start_vpn_connect(self, protocol, profile_name, model):
+        """Tk thread, after a passed preflight: spawns openfortivpn or initiates the IPsec conn."""
+        current_dir = self.forti_dir if protocol == "forti" else self.ipsec_dir
+        self.scheduler.boost(60)
         self.set_status(f"Connecting to {profile_name}...", "working")
         self.root.update()
 
@@ -1281,32 +4816,30 @@ class LivConnectApp:
             try:
                 # Log the connection attempt
                 self._write_protocol_log("openforti", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Attempting to connect: {profile_name}")
+                self.pre_connect_net_snapshot = snapshot_network_state()
+                self.current_vpn_config_path = path
                 
                 if IS_MAC:
                     # macOS: Escape path for AppleScript
                     escaped_path = path.replace('"', '\\"').replace("'", "\\'")
                     safe_cmd = f'openfortivpn -c "{escaped_path}" --set-dns=1 --pppd-use-peerdns=1 --use-resolvconf=1 --otp-prompt="Challenge\\|OTP\\|SMS\\|Enter code" --otp-delay=5'
-                    self.current_process = subprocess.Popen(["osascript", "-e", f'do shell script "{safe_cmd}" with administrator privileges'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+                    cmd = ["osascript", "-e", f'do shell script "{safe_cmd}" with administrator privileges']
                 else:
-                    self.current_process = subprocess.Popen(["pkexec", "openfortivpn", "-c", path, "--set-dns=1", "--pppd-use-peerdns=1", "--use-resolvconf=1", "--otp-prompt=Challenge|OTP|SMS|Enter code", "--otp-delay=5"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+                    cmd = ["pkexec", "openfortivpn", "-c", path, "--set-dns=1", "--pppd-use-peerdns=1", "--use-resolvconf=1", "--otp-prompt=Challenge|OTP|SMS|Enter code", "--otp-delay=5"]
+
+                # openfortivpn output is handled line by line on the Tk thread (OTP prompts, connect detection)
+                state = self.forti_output_state = {"otp_prompted": False, "established": False}
+                self.current_process = self.runtime.spawn_sync(
+                    cmd, on_line=lambda line: self.runtime.deliver(self._on_forti_line, state, line),
+                    stdin=True, merge_stderr=True, name="openfortivpn")
                 
                 self.active_ipsec_conn = None 
                 self.connected_profile_name = profile_name 
                 
-                # Read livconnect_auth_type from profile config (livconnect_auth_type=otp or livconnect_auth_type=normal)
-                try:
-                    self.livconnect_auth_type = 'normal'  # Default
-                    with open(path, 'r') as f:
-                        for line in f:
-                            if line.strip().startswith('livconnect_auth_type'):
-                                self.livconnect_auth_type = line.split('=')[1].strip().lower()
-                                self.log_message(f"Profile livconnect_auth_type: {self.livconnect_auth_type}", "INFO")
-                                break
-                except Exception as e:
-                    self.livconnect_auth_type = 'normal'
-                
-                # Start thread to monitor OTP/SMS prompt
-                threading.Thread(target=self._monitor_forti_otp, daemon=True).start()
+                # livconnect_auth_type=otp|normal from the parsed profile
+                self.livconnect_auth_type = model.auth_type
+                if "livconnect_auth_type" in model.options:
+                    self.log_message(f"Profile livconnect_auth_type: {self.livconnect_auth_type}", "INFO")
                 
                 # Don't set status to "Connected" yet - let the monitoring thread confirm it
                 # based on actual openfortivpn output
@@ -1322,102 +4855,432 @@ class LivConnectApp:
                 self.root.update()
                 self.is_connecting = False
 
-        elif protocol == "ipsec":
-            conf_path = os.path.join(current_dir, profile_name + ".conf")
-            conn_name = self.find_ipsec_conn_name(conf_path)
-            
-            if not conn_name: 
-                self.is_connecting = False
-                self.log_message("Connection name not found.", "ERROR")
-                self._write_protocol_log("ipsec", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Connection name not found: {profile_name}")
-                return
-            
-            # Log the connection attempt
-            self._write_protocol_log("ipsec", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Attempting to connect: {profile_name} (conn: {conn_name})")
-            
-            # Toplu ipsec komutlarını tek seferde çalıştır - şifre 1 kez soruluyor
-            combined_cmd = ["sh", "-c", f"ipsec update && ipsec up {conn_name}"]
-            res = self.run_as_root(combined_cmd)
-            
-            if res and res.returncode == 0:
-                self.current_process = None 
-                self.active_ipsec_conn = conn_name
-                self.connected_profile_name = profile_name 
-                self.set_status(f"Connected: {profile_name}", "connected")
-                self.log_message("Connection Established", "INFO")
-                self.toggle_buttons(True)
-                self.root.update()
-                self._write_protocol_log("ipsec", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Successfully connected: {profile_name}")
-                self.is_connecting = False
+        elif protocol == "ipsec":
+            conn_name = model.conns[0] if model.conns else None
+            
+            if not conn_name: 
+                self.is_connecting = False
+                self.log_message("Connection name not found.", "ERROR")
+                self._write_protocol_log("ipsec", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Connection name not found: {profile_name}")
+                return
+            
+            # Log the connection attempt
+            self._write_protocol_log("ipsec", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Attempting to connect: {profile_name} (conn: {conn_name})")
+            
+            self.pre_connect_net_snapshot = snapshot_network_state()
+
+            # Only reload strongSwan when profile files changed since the last successful update
+            hashes = hash_ipsec_profiles(self.ipsec_dir)
+            state = load_json_file(self.ipsec_state_file, {})
+            need_update, need_secrets = plan_ipsec_reload(hashes, state.get("files", {}))
+            if not need_update and not need_secrets:
+                saved = state.get("update_seconds")
+                self.log_message(f"IPsec profiles unchanged, skipping 'ipsec update'" + (f" (saves ~{saved:.2f}s)" if saved else ""), "INFO")
+            elif not need_update:
+                self.log_message("Only secrets changed, using 'ipsec rereadsecrets'", "INFO")
+
+            # VICI / pkexec block for seconds: run them on a worker, finish on the Tk thread
+            self.run_in_worker(self._connect_ipsec, conn_name, need_update, need_secrets, hashes, state,
+                               then=lambda res, error: self._finish_ipsec_connect(profile_name, conn_name, res, error))
+            return
+
+        self.is_connecting = False
+        self.update_tray_menu()
+
+    def _connect_ipsec(self, conn_name, need_update, need_secrets, hashes, state):
+        """Worker: initiates conn_name via VICI, or via the ipsec CLI as root. Returns the command result."""
+        # Preferred: initiate through VICI (no privileges needed unless profiles changed)
+        res = self._connect_ipsec_vici(conn_name, need_update, need_secrets, hashes, state)
+        if res is None:
+            # Toplu ipsec komutlarını tek seferde çalıştır - şifre 1 kez soruluyor
+            combined_cmd = ["sh", "-c", build_ipsec_connect_script(conn_name, need_update, need_secrets)]
+            res = self.run_as_root(combined_cmd)
+            if res:
+                res = res._replace(stdout=self._record_ipsec_reload(res, hashes, state, need_update or need_secrets))
+        self.ipsec_sampler.poke()
+        return res
+
+    def _finish_ipsec_connect(self, profile_name, conn_name, res, error):
+        """Tk thread: reports the outcome of _connect_ipsec."""
+        if error:
+            self.log_message(f"IPsec connect failed: {error}", "ERROR")
+        if res and res.returncode == 0:
+            self.current_process = None 
+            self.active_ipsec_conn = conn_name
+            self.connected_profile_name = profile_name 
+            self.set_status(f"Connected: {profile_name}", "connected")
+            self.log_message("Connection Established", "INFO")
+            self.toggle_buttons(True)
+            self.root.update()
+            self._write_protocol_log("ipsec", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Successfully connected: {profile_name}")
+            self.is_connecting = False
+            self.on_vpn_established("ipsec")
+        else:
+            self.set_status("Error", "error")
+            if res:
+                self.log_message(res.stderr + res.stdout, "ERROR")
+                self._write_protocol_log("ipsec", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Connection error: {res.stderr + res.stdout}")
+            self.toggle_buttons(False)  # Re-enable connect button on error
+            self.root.update()
+            self.is_connecting = False
+        self.update_tray_menu()
+
+    def _on_netlink_events(self, events):
+        """Reacts to link/address/route changes (UI thread)."""
+        is_vpn = lambda name: bool(name) and name.startswith(VPN_IFACE_PREFIXES)
+        addr_or_route = False
+        vpn_touched = False
+        for ev in events:
+            if ev.kind == "overflow":
+                addr_or_route = vpn_touched = True
+                continue
+            if ev.kind in ("addr", "route"):
+                addr_or_route = True
+            if is_vpn(ev.ifname):
+                vpn_touched = True
+                if (ev.kind == "link" and (ev.action == "del" or not ev.data["up"])
+                        and self.connected_profile_name and not self.ipsec_user_disconnect):
+                    self.log_message(f"VPN interface {ev.ifname} went {'away' if ev.action == 'del' else 'down'}", "WARN")
+            if (ev.kind == "route" and ev.data["default"] and ev.data["table"] == RT_TABLE_MAIN
+                    and ev.data["family"] == socket.AF_INET and not is_vpn(ev.ifname)):
+                route = read_default_route()   # Another default may still be preferred (metric)
+                if route != self.default_route:
+                    self.log_message(f"Default route changed: {self.default_route} -> {route}", "INFO")
+                    self.default_route = route
+                    self._schedule_network_change_reaction()
+
+        if addr_or_route or vpn_touched:
+            previous = (self.get_internal_ip(), self.get_vpn_ips())
+            self.interface_inventory.refresh()
+            if (self.get_internal_ip(), self.get_vpn_ips()) != previous:
+                self.refresh_ip_label()
+                self.update_tray_menu()
+        if vpn_touched:
+            # Let status, SA and traffic probes see the change right away
+            self.scheduler.poke()
+
+    def _schedule_network_change_reaction(self, delay_ms=2000):
+        """Debounced: roams/docking produce bursts of route events; react once the network settled."""
+        if self.net_change_after_id:
+            self.root.after_cancel(self.net_change_after_id)
+        self.net_change_after_id = self.root.after(delay_ms, self._on_network_changed)
+
+    def _on_network_changed(self):
+        self.net_change_after_id = None
+        if self.default_route is None or self.default_route == self.settled_route:
+            return  # Offline for now, or the route flapped back to where it was
+        self.settled_route = self.default_route
+        # The tunnel's TCP session is bound to the old path and would only notice after
+        # ServerAliveInterval x ServerAliveCountMax; reconnect it now
+        if self.ssh_tunnel_active and self.ssh_tunnel_process:
+            self.reconnect_ssh_tunnel("network changed")
+
+    def on_vpn_established(self, protocol):
+        """Post-connect steps; may be reported more than once per connect by the forti monitor."""
+        profile = self.connected_profile_name
+        self.established_profile = profile
+        if not profile or self.mtu_tuned_for == profile:
+            return
+        self.mtu_tuned_for = profile
+        threading.Thread(target=self.tune_vpn_mtu, args=(profile, protocol), daemon=True).start()
+        threading.Thread(target=self.record_vpn_subnets, args=(profile, protocol), daemon=True).start()
+
+    def record_vpn_subnets(self, profile, protocol):
+        """Remembers the routes the VPN installed, for the next preflight's overlap check."""
+        time.sleep(5)  # pushed routes land a moment after the interface comes up
+        iface = find_vpn_interface(protocol)
+        if not iface:
+            return
+        subnets = sorted({str(net) for net, _gw, dev in read_kernel_routes() if dev == iface and net.prefixlen})
+        if subnets:
+            state = load_json_file(self.vpn_subnets_file, {})
+            state[profile] = subnets
+            try: save_json_file(self.vpn_subnets_file, state)
+            except OSError: pass
+
+    def tune_vpn_mtu(self, profile, protocol, rediscover=False):
+        """Applies the recorded path MTU of the profile, or discovers it with DF pings first."""
+        iface = None
+        for _ in range(20):  # ppp comes up a moment after openfortivpn reports success
+            iface = find_vpn_interface(protocol)
+            if iface:
+                break
+            time.sleep(0.5)
+        if not iface:
+            self.log_message("MTU: no VPN interface found (policy-based IPsec?), skipping", "DEBUG")
+            return
+        current = read_iface_mtu(iface)
+        state = load_json_file(self.mtu_state_file, {})
+        record = state.get(profile)
+
+        if record and not rediscover:
+            mtu = record["mtu"]
+            if mtu == current:
+                self.log_message(f"MTU: {iface} already at the recorded {mtu} for {profile}", "DEBUG")
+                return
+            self.log_message(f"MTU: using recorded path MTU {mtu} for {profile}", "INFO")
+        else:
+            target = parse_host_port(self.settings.get("mtu_probe_target") or self.settings.get("latency_probe", ""))
+            if not target:
+                self.log_message("MTU: no probe target configured (Settings > Monitoring), skipping discovery", "DEBUG")
+                return
+            started = time.monotonic()
+            mtu = discover_path_mtu(target[0], high=current or 1500)
+            if mtu is None:
+                self.log_message(f"MTU: {target[0]} does not answer DF pings, skipping", "WARN")
+                return
+            self.log_message(f"MTU: path MTU to {target[0]} via {iface} is {mtu} ({time.monotonic() - started:.1f}s)", "INFO")
+            state[profile] = {"mtu": mtu, "iface": iface, "target": target[0],
+                              "measured": datetime.datetime.now().isoformat(timespec="seconds")}
+            try: save_json_file(self.mtu_state_file, state)
+            except OSError as e: self.log_message(f"MTU state could not be saved: {e}", "ERROR")
+
+        if mtu == current:
+            self.log_message(f"MTU: {iface} already at {mtu}", "DEBUG")
+            return
+        res = self.run_as_root(["sh", "-c", build_mtu_script(iface, mtu)])
+        if res and res.returncode == 0:
+            self.log_message(f"MTU: {iface} set to {mtu} (was {current})", "INFO")
+        else:
+            self.log_message(f"MTU: could not set {iface} to {mtu}: {res.stderr.strip() if res else 'cancelled'}", "WARN")
+
+    def rediscover_vpn_mtu(self):
+        if not self.connected_profile_name:
+            messagebox.showwarning("MTU", "Connect a VPN profile first.")
+            return
+        protocol = "ipsec" if self.active_ipsec_conn else "forti"
+        threading.Thread(target=self.tune_vpn_mtu, args=(self.connected_profile_name, protocol, True), daemon=True).start()
+
+    def _connect_ipsec_vici(self, conn_name, need_update, need_secrets, hashes, state):
+        """Initiates conn_name via VICI. Returns a CompletedProcess, or None to use the CLI path."""
+        client = ViciClient(timeout=5.0)
+        try:
+            client.connect()
+        except (OSError, ViciError) as e:
+            self.log_message(f"VICI not available ({e}), using ipsec CLI", "DEBUG")
+            return None
+
+        logs = []
+        try:
+            def reload(update, secrets):
+                res = self.run_as_root(["sh", "-c", "\n".join(build_ipsec_reload_script(update, secrets))])
+                if res:
+                    self._record_ipsec_reload(res, hashes, state, True)
+                return res is not None and res.returncode == 0
+
+            if (need_update or need_secrets) and not reload(need_update, need_secrets):
+                return subprocess.CompletedProcess(["vici", "initiate"], 1, "", "ipsec update failed")
+
+            def initiate():
+                client.sock.settimeout(40.0)
+                return client.command("initiate", {"child": conn_name, "ike": conn_name, "timeout": "30000", "init-limits": "no"},
+                                      stream_event="control-log",
+                                      on_event=lambda name, msg: logs.append(msg.get("msg", "")))
+
+            started = time.monotonic()
+            try:
+                initiate()
+            except ViciError as e:
+                if need_update or "not found" not in str(e).lower():
+                    raise
+                # Daemon does not know the conn yet (e.g. restarted): load configs once and retry
+                self.log_message("strongSwan did not know the conn, running 'ipsec update'", "WARN")
+                if not reload(True, False):
+                    raise
+                initiate()
+            self.log_message(f"IPsec initiated via VICI in {time.monotonic() - started:.2f}s", "INFO")
+            return subprocess.CompletedProcess(["vici", "initiate"], 0, "\n".join(logs), "")
+        except (OSError, ViciError) as e:
+            return subprocess.CompletedProcess(["vici", "initiate"], 1, "\n".join(logs), f"VICI initiate failed: {e}\n")
+        finally:
+            client.close()
+
+    def _terminate_ipsec_vici(self, conn_name):
+        """Terminates conn_name via VICI. Returns True on success, False to fall back to 'ipsec down'."""
+        try:
+            with ViciClient(timeout=10.0) as client:
+                client.command("terminate", {"ike": conn_name, "timeout": "5000"})
+            return True
+        except (OSError, ViciError) as e:
+            self.log_message(f"VICI terminate unavailable ({e}), using 'ipsec down'", "DEBUG")
+            return False
+
+    def _on_vici_event(self, name, msg):
+        """Reacts to strongSwan events immediately instead of waiting for the next poll."""
+        self.ipsec_sampler.poke()
+        if name == "monitor-lost":
+            self.log_message("VICI event stream lost, falling back to polling", "WARN")
+            return
+        sas = [k for k, v in msg.items() if isinstance(v, dict)]
+        if name == "ike-rekey":
+            self.log_message(f"IPsec rekeyed: {', '.join(sas)}", "DEBUG")
+            return
+        up = msg.get("up") == "yes"
+        self.log_message(f"VICI {name}: {', '.join(sas)} {'up' if up else 'down'}", "DEBUG")
+
+        conn = self.active_ipsec_conn
+        if not conn or conn not in sas:
+            return
+        if up:
+            self.set_status(f"Connected: {self.connected_profile_name}", "connected")
+        elif name == "ike-updown" and not self.ipsec_user_disconnect and not self.is_connecting:
+            self.log_message(f"IPsec SA '{conn}' went down, re-initiating...", "WARN")
+            self._write_protocol_log("ipsec", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] SA lost, re-initiating: {conn}")
+            self.set_status(f"Reconnecting: {self.connected_profile_name}...", "working")
+            self.scheduler.boost(60)
+
+            def reconnect():
+                try:
+                    with ViciClient(timeout=40.0) as client:
+                        client.command("initiate", {"child": conn, "ike": conn, "timeout": "30000", "init-limits": "no"})
+                    self.log_message(f"IPsec '{conn}' re-established", "INFO")
+                except (OSError, ViciError) as e:
+                    self.log_message(f"IPsec re-initiate failed: {e}", "ERROR")
+                    self.runtime.deliver(self.set_status, "Connection lost", "error")
+            threading.Thread(target=reconnect, daemon=True).start()
+
+    def _record_ipsec_reload(self, res, hashes, state, reloaded):
+        """Stores profile hashes/update timing after a connect; returns the output without our markers."""
+        update_ns = None
+        fallback = False
+        kept = []
+        for line in (res.stdout or "").splitlines():
+            if line.startswith(IPSEC_UPDATE_MARKER):
+                try: update_ns = int(line[len(IPSEC_UPDATE_MARKER):])
+                except ValueError: pass
+            elif line.strip() == IPSEC_FALLBACK_MARKER:
+                fallback = True
             else:
-                self.set_status("Error", "error")
-                if res:
-                    self.log_message(res.stderr + res.stdout, "ERROR")
-                    self._write_protocol_log("ipsec", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Connection error: {res.stderr + res.stdout}")
-                self.toggle_buttons(False)  # Re-enable connect button on error
-                self.root.update()
-                self.is_connecting = False
-        
-        self.is_connecting = False
-        self.update_tray_menu()
+                kept.append(line)
+
+        if fallback:
+            self.log_message("strongSwan did not know the conn, ran 'ipsec update' as fallback", "WARN")
+        if update_ns is not None:
+            seconds = update_ns / 1e9
+            self.log_message(f"'ipsec update' took {seconds:.2f}s", "DEBUG")
+            state["update_seconds"] = seconds
+        if res.returncode == 0 and (reloaded or fallback or "files" not in state):
+            state["files"] = hashes
+        try:
+            save_json_file(self.ipsec_state_file, state)
+        except OSError as e:
+            self.log_message(f"Could not save IPsec state: {e}", "WARN")
+        return "\n".join(kept)
+
     def disconnect_vpn(self):
-        """Terminates the VPN connection forcefully and with proper privileges."""
+        """Gracefully stops our VPN: SIGTERM to the tracked pid, SIGKILL only after a timeout.
+
+        The privileged calls and the exit wait run on a worker; the UI is updated once it is done.
+        """
+        if self.is_disconnecting:
+            return
+        self.is_disconnecting = True
+        self.ipsec_user_disconnect = True
         self.log_message("Sending disconnect command...", "WARN")
-        
-        try:
-            # Log the disconnection attempt
-            if self.connected_profile_name:
-                current_protocol = "openforti" if not self.active_ipsec_conn else "ipsec"
-                self._write_protocol_log(current_protocol, f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Disconnecting: {self.connected_profile_name}")
-            
-            if IS_MAC:
-                # macOS: Use osascript to send a privileged pkill -9 command
-                cmd = '/usr/bin/pkill -9 openfortivpn'
-                subprocess.run(["osascript", "-e", f'do shell script "{cmd}" with administrator privileges'])
-                if hasattr(self, 'active_ipsec_conn') and self.active_ipsec_conn:
-                    ipsec_cmd = f'ipsec down {self.active_ipsec_conn}'
-                    subprocess.run(["osascript", "-e", f'do shell script "{ipsec_cmd}" with administrator privileges'])
-                    self._write_protocol_log("ipsec", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Disconnected successfully")
-                    self.active_ipsec_conn = None
-            else:
-                # Linux: Toplu komut - şifre sadece 1 kez soruluyor
-                if hasattr(self, 'active_ipsec_conn') and self.active_ipsec_conn:
-                    # IPsec aktif ise: pkill + ipsec down toplu yapılır
-                    combined_cmd = ["sh", "-c", f"pkill -9 openfortivpn; ipsec down {self.active_ipsec_conn}"]
-                    self.run_as_root(combined_cmd)
-                    self._write_protocol_log("ipsec", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Disconnected successfully")
-                    self.active_ipsec_conn = None
-                else:
-                    # Sadece FortiVPN açık ise
-                    subprocess.run(["pkexec", "pkill", "-9", "openfortivpn"])
-                    self._write_protocol_log("openforti", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Disconnected successfully")
+        self.set_status("Disconnecting...", "working")
+        self.btn_disconnect.config(state="disabled")
+        log_protocol = "openforti" if not self.active_ipsec_conn else "ipsec"
 
-            # Clean up the Python process object if it exists
-            if hasattr(self, 'current_process') and self.current_process:
-                try:
-                    # Use kill() instead of terminate() for a non-catchable signal
-                    self.current_process.kill()
-                except:
-                    pass
-                self.current_process = None
+        # Log the disconnection attempt
+        if self.connected_profile_name:
+            self._write_protocol_log(log_protocol, f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Disconnecting: {self.connected_profile_name}")
+        self.run_in_worker(self._disconnect_vpn, log_protocol, self.current_process, self.current_vpn_config_path,
+                           self.active_ipsec_conn, self.pre_connect_net_snapshot,
+                           then=lambda result, error: self._finish_disconnect_vpn(log_protocol, result, error))
+
+    def _disconnect_vpn(self, log_protocol, process, config_path, ipsec_conn, snapshot):
+        """Worker: signals the tunnel, waits for it to exit and checks routes/DNS. Returns (escalated, issues, seconds)."""
+        started = time.monotonic()
+
+        # Resolve the exact openfortivpn pid of our profile (never touch other instances)
+        forti_pid = None
+        if config_path:
+            candidate = process.pid if process else None
+            forti_pid = find_openfortivpn_pid(config_path, candidate)
+        elif process and process.poll() is None:
+            self.log_message("No tracked openfortivpn config; other instances are left untouched.", "WARN")
+
+        # Single privileged batch: SIGTERM lets openfortivpn/pppd remove routes and restore DNS
+        steps = []
+        if forti_pid:
+            steps.append(f"kill -TERM {forti_pid}")
+        if ipsec_conn and (forti_pid or not self._terminate_ipsec_vici(ipsec_conn)):
+            steps.append(f"ipsec down {shlex.quote(ipsec_conn)}")
+        if steps:
+            self.run_as_root(["sh", "-c", "; ".join(steps)])
+
+        escalated = False
+        if forti_pid:
+            exited = wait_for_pid_exit(forti_pid, VPN_TERM_TIMEOUT, popen=process)
+            if not exited:
+                escalated = True
+                self.log_message(f"openfortivpn (pid {forti_pid}) ignored SIGTERM for {VPN_TERM_TIMEOUT:.0f}s, sending SIGKILL", "WARN")
+                self.run_as_root(["kill", "-KILL", str(forti_pid)])
+                exited = wait_for_pid_exit(forti_pid, VPN_KILL_TIMEOUT, popen=process)
+            if not exited:
+                self.log_message(f"openfortivpn (pid {forti_pid}) is still running", "ERROR")
+            self._write_protocol_log("openforti", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Disconnected successfully")
+
+        if ipsec_conn:
+            self._write_protocol_log("ipsec", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Disconnected successfully")
+            self.ipsec_sampler.poke()
+
+        # Reap the process object if it exists
+        if process:
+            try:
+                process.wait(timeout=0.5)
+            except Exception:
+                pass
 
-            # Update UI state to reflect the disconnection
-            self.connected_profile_name = None
-            self.set_status("Ready", "ready")
-            self.toggle_buttons(False)
-            self.root.update()
-            self.update_tray_menu()
-            self.log_message("VPN process terminated.", "INFO")
-            
-        except Exception as e:
-            self.log_message(f"Disconnection error: {str(e)}", "ERROR")
+        # Verify openfortivpn/strongSwan cleaned up after themselves
+        issues = verify_network_restored(snapshot)
+        return escalated, issues, time.monotonic() - started
+
+    def _finish_disconnect_vpn(self, log_protocol, result, error):
+        """Tk thread: clears the connection state after _disconnect_vpn."""
+        self.is_disconnecting = False
+        self.ipsec_user_disconnect = False
+        if error:
+            self.log_message(f"Disconnection error: {str(error)}", "ERROR")
             self.toggle_buttons(False)
-            self.root.update()
-            
+            return
+        escalated, issues, elapsed = result
+        self.active_ipsec_conn = None
+        self.current_process = None
+        self.current_vpn_config_path = None
+        self.pre_connect_net_snapshot = None
+        for issue in issues:
+            self.log_message(f"Teardown check: {issue}", "WARN")
+
+        mode = "SIGKILL" if escalated else "graceful"
+        self.log_message(f"Teardown completed in {elapsed:.2f}s ({mode}{', routes/DNS restored' if not issues else ''})", "INFO")
+        self._write_protocol_log(log_protocol, f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Teardown took {elapsed:.2f}s ({mode})")
+
+        # Update UI state to reflect the disconnection
+        self.connected_profile_name = None
+        self.mtu_tuned_for = None
+        self.established_profile = None
+        self.scheduler.boost(10)
+        self.set_status("Ready", "ready")
+        self.toggle_buttons(False)
+        self.update_tray_menu()
+        self.log_message("VPN process terminated.", "INFO")
+
     def monitor_vpn_status(self):
+        """Scheduler job: probes process/SA state off the UI thread. Returns True when it changed."""
+        if self.is_connecting:
+            return True  # Transition: keep polling fast
+
+        # Update status display based on actual process state
+        state = (self.check_process_running("openfortivpn"), self.check_ipsec_established(), self.connected_profile_name)
+        changed, self.last_vpn_state = state != self.last_vpn_state, state
+        self.runtime.deliver(self.apply_vpn_status, state[0], state[1])
+        return changed
+
+    def apply_vpn_status(self, is_forti_up, is_ipsec_up):
         if self.is_connecting:
-            self.root.after(3000, self.monitor_vpn_status)
             return
+        self.refresh_ip_label()
 
         # Only show buttons as locked if we actually have a confirmed connection
         # (i.e., connected_profile_name is set, not just because process is running)
@@ -1428,10 +5291,6 @@ class LivConnectApp:
             # No active connection confirmed
             self.toggle_buttons(False)
         
-        # Update status display based on actual process state
-        is_forti_up = self.check_process_running("openfortivpn")
-        is_ipsec_up = self.check_ipsec_established()
-
         if is_forti_up and not self.connected_profile_name:
             # Process running but not our connection - might be stale
             self.set_status("Stale Process Detected", "warning")
@@ -1441,9 +5300,6 @@ class LivConnectApp:
             self.set_status(f"Connected: {self.connected_profile_name}", "connected")
         else:
             self.set_status("Ready", "ready")
-        
-
-        self.root.after(3000, self.monitor_vpn_status)
 
     # -------------------------------------------------------------------------
     # CONFIG MANAGEMENT
@@ -1544,8 +5400,7 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
                 with open(os.path.join(current_dir, name + ".secrets"), 'w') as f: f.write(sec)
 
             top.destroy()
-            self.refresh_profile_list()
-            self.update_tray_menu() 
+            self.sync_profiles(protocol)
             self.log_message(f"Created: {name}")
 
         top.bind('<Return>', confirm)
@@ -1576,8 +5431,7 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
             self.log_message(f"Deleted: {profile_name}", "WARN")
             self.editor_conf.delete('1.0', tk.END)
             self.editor_sec.delete('1.0', tk.END)
-            self.refresh_profile_list()
-            self.update_tray_menu()
+            self.sync_profiles(protocol)
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
@@ -1597,35 +5451,84 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
                 with open(p2, 'w') as f: f.write(self.editor_sec.get('1.0', tk.END))
                 os.chmod(p2, 0o600)
             self.log_message(f"Saved: {profile_name}")
-            self.update_tray_menu()
+            model = self.profile_models.get(protocol, p1)
+            for issue in model.errors + model.warnings:
+                self.log_message(f"{profile_name}: {issue}", "WARN")
+            self.profile_cache.pop((protocol, profile_name))
+            self.sync_profiles(protocol)
         except Exception as e: messagebox.showerror("Error", str(e))
 
     # -------------------------------------------------------------------------
     # UTILS & SETTINGS
     # -------------------------------------------------------------------------
     def detect_forti_cert(self):
+        """Fetches the gateway certificate digest with a plain TLS handshake (no root, no connect attempt)."""
         selection = self.file_listbox.curselection()
         if not selection: return
         profile_name = self.file_listbox.get(selection[0])
-        path = os.path.join(self.get_current_dir(), profile_name + ".vpn")
+        model = self.profile_models.get("forti", self.profile_path("forti", profile_name))
+        if not model.host or model.host in PROFILE_PLACEHOLDERS or not model.port:
+            messagebox.showerror("Certificate", "Set a valid host (and port) in the profile first.")
+            return
+        host, port = model.host, model.port
+        self.log_message(f"Checking cert: {profile_name} ({host}:{port})", "INFO")
+
+        def worker():
+            started = time.monotonic()
+            try:
+                digest, error = fetch_cert_digest(host, port), None
+            except OSError as e:
+                digest, error = None, e
+            self.runtime.deliver(self._finish_forti_cert_probe, profile_name, model, digest, error, time.monotonic() - started)
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _finish_forti_cert_probe(self, profile_name, model, digest, error, elapsed):
+        host, port = model.host, model.port
+        if digest is None:
+            self.log_message(f"TLS probe to {host}:{port} failed: {error}", "ERROR")
+            if messagebox.askyesno("Certificate", f"Could not read the certificate of {host}:{port}:\n{error}\n\n"
+                                                  "Try again through openfortivpn (requires admin privileges)?"):
+                self.detect_forti_cert_openforti(profile_name)
+            return
+        self.log_message(f"Gateway certificate {host}:{port} sha256 {digest} ({elapsed * 1000:.0f} ms)", "INFO")
+        pinned = self.cert_pins.get(host, port)
+        if digest in [d.lower() for d in model.trusted_certs]:
+            self.cert_pins.pin(host, port, digest)
+            messagebox.showinfo("Certificate", f"The gateway certificate is already trusted by this profile.\n\n{digest}")
+            return
+        if pinned and pinned != digest:
+            self.log_message(f"Certificate of {host}:{port} CHANGED (was {pinned})", "WARN")
+            question = (f"⚠️ The certificate of {host}:{port} has CHANGED.\n\nBefore: {pinned}\nNow:    {digest}\n\n"
+                        "This is expected after a certificate renewal, but can also mean the connection is being intercepted. "
+                        "Trust the new certificate?")
+        else:
+            question = f"Hash: {digest}\nTrust?"
+        if messagebox.askyesno("Certificate", question):
+            self.cert_pins.pin(host, port, digest)
+            sel = self.file_listbox.curselection()
+            if self.protocol_var.get() == "forti" and sel and self.file_listbox.get(sel[0]) == profile_name:
+                self.append_cert_to_config(digest)
+            else:
+                self.log_message(f"Select '{profile_name}' again and add: trusted-cert = {digest}", "WARN")
+
+    def detect_forti_cert_openforti(self, profile_name):
+        """Fallback: runs openfortivpn as root and reads the digest from its certificate error."""
+        path = os.path.join(self.forti_dir, profile_name + ".vpn")
         
         self.log_message(f"Checking cert: {profile_name}", "WARN")
-        self.root.update()
-        try:
-            full_cmd = ["pkexec", "openfortivpn", "-c", path]
-            if IS_MAC:
-                escaped_path = path.replace('"', '\\"').replace("'", "\\'")
-                safe = f'openfortivpn -c "{escaped_path}" 2>&1'
-                proc = subprocess.run(["osascript", "-e", f'do shell script "{safe}" with administrator privileges'], capture_output=True, text=True)
-                out = proc.stdout + proc.stderr
-            else:
-                proc = subprocess.run(full_cmd, capture_output=True, text=True, timeout=10)
-                out = proc.stdout + proc.stderr
-        except subprocess.TimeoutExpired:
+        if IS_MAC:
+            escaped_path = path.replace('"', '\\"').replace("'", "\\'")
+            safe = f'openfortivpn -c "{escaped_path}" 2>&1'
+            coro = self.runtime.run(["osascript", "-e", f'do shell script "{safe}" with administrator privileges'])
+        else:
+            coro = self.runtime.run(["pkexec", "openfortivpn", "-c", path], timeout=10)
+        self.runtime.submit(coro, callback=self._finish_forti_cert_openforti)
+
+    def _finish_forti_cert_openforti(self, proc, error):
+        if proc is not None and proc.timed_out:
             self.log_message("Timeout", "ERROR")
             return
-        except Exception as e:
-            out = str(e)
+        out = str(error) if error else proc.stdout + proc.stderr
 
         match = re.search(r'(?:trusted-cert|digest)\s+([\w]+)', out)
         if match:
@@ -1637,9 +5540,8 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
 
     def append_cert_to_config(self, h):
         txt = self.editor_conf.get('1.0', tk.END)
-        if "trusted-cert" in txt:
-            new = re.sub(r'trusted-cert\s*=\s*.*', f'trusted-cert = {h}', txt)
-        else:
+        new, count = re.subn(r'(?m)^[ \t]*trusted-cert\s*=.*$', f'trusted-cert = {h}', txt)
+        if not count:   # The template's commented-out example does not count
             new = txt.strip() + f"\ntrusted-cert = {h}\n"
         self.editor_conf.delete('1.0', tk.END)
         self.editor_conf.insert(tk.END, new)
@@ -1648,7 +5550,7 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
     def open_settings_window(self):
         top = tk.Toplevel(self.root)
         top.title("Settings")
-        top.geometry("500x550")
+        top.geometry("500x860")
         top.configure(bg=COLOR_BG)
         
         tk.Label(top, text="Configuration", font=("Segoe UI", 14), bg=COLOR_BG).pack(pady=20)
@@ -1667,11 +5569,58 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
         g3.pack(fill=tk.X, padx=15)
         tk.Button(g3, text="Remove Config (Root)", bg=COLOR_DANGER, fg="white", command=lambda: self.manage_includes("remove")).pack(fill=tk.X)
 
+        g4 = tk.LabelFrame(top, text="Monitoring", bg=COLOR_BG, padx=10, pady=10)
+        g4.pack(fill=tk.X, padx=15, pady=10)
+        tk.Label(g4, text="Latency probe (in-VPN host:port):", bg=COLOR_BG).pack(anchor="w")
+        probe_entry = tk.Entry(g4)
+        probe_entry.insert(0, self.settings.get("latency_probe", ""))
+        probe_entry.pack(fill=tk.X, pady=(2, 5))
+        tk.Label(g4, text="Path MTU probe host (empty = latency probe host):", bg=COLOR_BG).pack(anchor="w")
+        mtu_entry = tk.Entry(g4)
+        mtu_entry.insert(0, self.settings.get("mtu_probe_target", ""))
+        mtu_entry.pack(fill=tk.X, pady=(2, 5))
+        tk.Button(g4, text="Save", bg=COLOR_PRIMARY, fg="white", command=lambda: self.save_latency_probe(probe_entry.get(), mtu_entry.get())).pack(fill=tk.X)
+
+        g5 = tk.LabelFrame(top, text="SSH Tunnels", bg=COLOR_BG, padx=10, pady=10)
+        g5.pack(fill=tk.X, padx=15)
+        tk.Label(g5, text="Free port range for reassigned forwards:", bg=COLOR_BG).pack(anchor="w")
+        range_entry = tk.Entry(g5)
+        range_entry.insert(0, self.settings.get("forward_port_range", DEFAULT_FORWARD_PORT_RANGE))
+        range_entry.pack(fill=tk.X, pady=(2, 5))
+        tk.Button(g5, text="Save", bg=COLOR_PRIMARY, fg="white", command=lambda: self.save_forward_port_range(range_entry.get())).pack(fill=tk.X)
+
+    def save_latency_probe(self, target, mtu_target=""):
+        target, mtu_target = target.strip(), mtu_target.strip()
+        if (target and not parse_host_port(target)) or (mtu_target and not parse_host_port(mtu_target)):
+            messagebox.showerror("Error", "Use host or host:port (e.g. 10.0.0.1:443).")
+            return
+        self.settings["latency_probe"] = target
+        self.settings["mtu_probe_target"] = mtu_target
+        self.save_settings()
+        self.traffic_sampler.set_probe_target(target)
+        self.log_message(f"Latency probe target: {target or 'disabled'}", "INFO")
+
+    def save_forward_port_range(self, text):
+        try:
+            parse_port_range(text.strip())
+        except ValueError:
+            messagebox.showerror("Error", "Use a range like 20000-20999.")
+            return
+        self.settings["forward_port_range"] = text.strip()
+        self.save_settings()
+        self.log_message(f"Forward port range: {text.strip()}", "INFO")
+
+    def save_settings(self):
+        try:
+            save_json_file(self.settings_file, self.settings)
+        except OSError as e:
+            self.log_message(f"Settings could not be saved: {e}", "ERROR")
+
     def check_dependency_ui(self, p, l, c):
         f = tk.Frame(p, bg=COLOR_BG)
         f.pack(fill=tk.X, pady=2)
         tk.Label(f, text=f"{l}:", bg=COLOR_BG, width=20, anchor="w").pack(side=tk.LEFT)
-        exist = shutil.which(c) is not None
+        exist = resolve_binary(c) is not None
         tk.Label(f, text="INSTALLED" if exist else "MISSING", fg=COLOR_SUCCESS if exist else COLOR_DANGER, bg=COLOR_BG).pack(side=tk.LEFT)
 
     def manage_includes(self, action):
@@ -1684,22 +5633,61 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
             # Raw string to prevent invalid escape sequence warning
             s = rf"sed -i.bak '\|{self.ipsec_dir}|d' {IPSEC_CONF}" + "\n" + rf"sed -i.bak '\|{self.ipsec_dir}|d' {IPSEC_SECRETS}" + "\nipsec update"
         
-        self.run_as_root(["sh", "-c", s])
+        self.run_as_root(["sh", "-c", s], then=lambda res: self._finish_manage_includes(action, res))
+
+    def _finish_manage_includes(self, action, res):
+        if res and res.returncode == 0:
+            # 'ipsec update' just ran, so the loaded configs match the files on disk
+            state = load_json_file(self.ipsec_state_file, {})
+            state["files"] = hash_ipsec_profiles(self.ipsec_dir) if action == "install" else {}
+            try: save_json_file(self.ipsec_state_file, state)
+            except OSError: pass
         messagebox.showinfo("Info", "Done.")
 
-    def run_as_root(self, cmd):
-        """Run privileged command using pkexec (Linux) or AppleScript (macOS)."""
+    def run_as_root(self, cmd, then=None):
+        """Run privileged command using pkexec (Linux) or AppleScript (macOS).
+
+        Blocks the calling worker thread and returns the result. On the Tk thread pass
+        then(result) instead; it runs there once the command finished (None if it failed to start).
+        """
+        if IS_MAC:
+            cmd_str = shlex.join(cmd)
+            escaped_cmd = cmd_str.replace('"', '\\"')
+            script = f'do shell script "{escaped_cmd}" with administrator privileges'
+            argv = ["osascript", "-e", script]
+        else:
+            argv = ["pkexec", *cmd]
+        if then:
+            def done(res, error):
+                if error:
+                    self.log_message(f"run_as_root failed: {error}", "ERROR")
+                then(res)
+            self.runtime.submit(self.runtime.run(argv), callback=done)
+            return None
         try:
-            if IS_MAC:
-                cmd_str = shlex.join(cmd)
-                escaped_cmd = cmd_str.replace('"', '\\"')
-                script = f'do shell script "{escaped_cmd}" with administrator privileges'
-                return subprocess.run(["osascript", "-e", script], capture_output=True, text=True)
-            return subprocess.run(["pkexec", *cmd], capture_output=True, text=True)
+            return self.runtime.run_sync(argv)
         except Exception as exc:
             self.log_message(f"run_as_root failed: {exc}", "ERROR")
             return None
 
+    def run_in_worker(self, fn, *args, then=None):
+        """Runs fn(*args) on a worker thread and then(result, error) on the Tk thread afterwards."""
+        def worker():
+            try:
+                result, error = fn(*args), None
+            except Exception as e:
+                result, error = None, e
+            if then:
+                self.runtime.deliver(then, result, error)
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _drain_runtime(self):
+        """Runs the callbacks the process runtime and workers queued for the Tk thread."""
+        try:
+            self.runtime.drain()
+        finally:
+            self.root.after(RUNTIME_POLL_MS, self._drain_runtime)
+
     # --- STANDARD HELPERS ---
     def create_menu_bar(self):
         menubar = tk.Menu(self.root)
@@ -1713,16 +5701,285 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
         # Tools menu
         t = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Tools", menu=t)
+        t.add_command(label="⚡ Quick Connect", accelerator="Ctrl+Shift+P", command=self.open_command_palette)
+        t.add_command(label="🔗 Edit Profile Groups", command=self.edit_profile_groups)
+        t.add_separator()
         t.add_command(label="📋 View Logs Folder", command=self.open_logs_directory)
         t.add_separator()
         t.add_command(label="📝 View OpenForti Logs", command=self.open_openforti_log)
         t.add_command(label="📝 View IPsec Logs", command=self.open_ipsec_log)
         t.add_command(label="📝 View SSH Tunnel Logs", command=self.open_ssh_debug_log)
+        t.add_separator()
+        t.add_command(label="📏 Re-discover Path MTU", command=self.rediscover_vpn_mtu)
+        t.add_command(label="⏱️ Background Activity", command=self.show_scheduler_stats)
         
         h = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Help", menu=h)
         h.add_command(label="About", command=self.show_about_dialog)
 
+        # Quick Connect palette (Ctrl+Shift+P; Cmd+Shift+P on macOS)
+        self.root.bind_all("<Control-P>", self.open_command_palette)
+        if IS_MAC:
+            self.root.bind_all("<Command-P>", self.open_command_palette)
+
+    def open_command_palette(self, event=None):
+        """Quick Connect: fuzzy search over every profile, ranked by match quality and connection history."""
+        if self.palette_window is not None and self.palette_window.winfo_exists():
+            self.palette_window.lift()
+            return "break"
+        labels = {"forti": "FortiSSL", "ipsec": "IPsec", "ssh": "SSH Tunnel", "net": "Network", "group": "Group", "action": ""}
+        candidates = [(kind, name, f"{labels[kind]} {name}".lower())
+                      for kind in ("forti", "ipsec", "ssh", "net") for name in self.profile_index.names(kind)]
+        candidates += [("group", name, f"group {name}".lower()) for name in load_profile_groups(self.groups_file)]
+        if self.connected_profile_name:
+            candidates.append(("action", "Disconnect VPN", "disconnect vpn"))
+        if self.ssh_tunnel_active:
+            candidates.append(("action", "Disconnect SSH", "disconnect ssh tunnel"))
+
+        top = tk.Toplevel(self.root)
+        self.palette_window = top
+        top.title("Quick Connect")
+        top.configure(bg="white")
+        if self.root.winfo_viewable():
+            top.transient(self.root)
+            x = self.root.winfo_rootx() + (self.root.winfo_width() - 480) // 2
+            y = self.root.winfo_rooty() + 80
+        else:
+            x, y = (self.root.winfo_screenwidth() - 480) // 2, self.root.winfo_screenheight() // 4
+        top.geometry(f"480x380+{max(x, 0)}+{max(y, 0)}")
+
+        query_var = tk.StringVar()
+        entry = tk.Entry(top, textvariable=query_var, font=("Segoe UI", 12), bd=1, relief="solid")
+        entry.pack(fill=tk.X, padx=10, pady=(10, 5))
+        lb = tk.Listbox(top, font=("Segoe UI", 10), bd=0, highlightthickness=0, activestyle="none",
+                        selectbackground="#e3f2fd", selectforeground="#0d47a1", exportselection=False)
+        lb.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 5))
+        tk.Label(top, text="Enter: connect   ↑/↓: select   Esc: close", bg="white", fg="gray", font=("Segoe UI", 8)).pack(pady=(0, 5))
+        shown = []
+
+        def update(*_):
+            shown[:] = rank_palette(query_var.get(), candidates, self.connection_history)
+            lb.delete(0, tk.END)
+            for kind, name, _text in shown:
+                lb.insert(tk.END, f"{name}    ({labels[kind]})" if labels[kind] else name)
+            if shown:
+                lb.selection_set(0)
+
+        def move(delta):
+            if shown:
+                i = max(0, min(len(shown) - 1, (lb.curselection() or (0,))[0] + delta))
+                lb.selection_clear(0, tk.END)
+                lb.selection_set(i)
+                lb.see(i)
+            return "break"
+
+        def launch(_e=None):
+            sel = lb.curselection()
+            if not sel:
+                return "break"
+            kind, name, _text = shown[sel[0]]
+            top.destroy()
+            self.launch_palette_entry(kind, name)
+            return "break"
+
+        query_var.trace_add("write", update)
+        entry.bind("<Down>", lambda e: move(1))
+        entry.bind("<Up>", lambda e: move(-1))
+        entry.bind("<Next>", lambda e: move(10))
+        entry.bind("<Prior>", lambda e: move(-10))
+        entry.bind("<Return>", launch)
+        lb.bind("<Double-Button-1>", launch)
+        lb.bind("<Return>", launch)
+        top.bind("<Escape>", lambda e: top.destroy())
+        update()
+        entry.focus_force()
+        return "break"
+
+    def launch_palette_entry(self, kind, name):
+        if kind in ("forti", "ipsec"):
+            self.connect_vpn(name, kind)
+        elif kind == "ssh":
+            self._connect_ssh_tunnel_tray(name)
+        elif kind == "group":
+            self.run_profile_group(name, "up")
+        elif kind == "net":
+            self._restore_window()
+            self.protocol_var.set("network")
+            self.switch_main_view()
+            self.apply_net_profile(name)
+        elif name == "Disconnect VPN":
+            self.disconnect_vpn()
+        elif name == "Disconnect SSH":
+            self.disconnect_ssh_tunnel_from_tray()
+
+    # -------------------------------------------------------------------------
+    # PROFILE GROUPS
+    # -------------------------------------------------------------------------
+    def run_profile_group(self, group, action="up"):
+        """Connects ("up") or disconnects ("down") every member of a group on a worker thread."""
+        if self.group_running:
+            messagebox.showwarning("Profile Group", f"'{self.group_running}' is still running.")
+            return
+        members = load_profile_groups(self.groups_file).get(group)
+        if not members:
+            messagebox.showerror("Profile Group", f"Group '{group}' not found or empty in {self.groups_file}")
+            return
+        missing = [f"{m.kind}:{m.name}" for m in members if m.name not in self.profile_index.names(m.kind)]
+        try:
+            if missing:
+                raise ValueError("missing profiles: " + ", ".join(missing))
+            stages = plan_group_stages(members)
+        except ValueError as e:
+            messagebox.showerror("Profile Group", f"'{group}' cannot run: {e}")
+            return
+        if action == "down":
+            stages = stages[::-1]
+        else:
+            self.connection_history.record("group", group)
+        self.group_running = group
+        self.set_status(f"{'Starting' if action == 'up' else 'Stopping'} group {group}...", "working")
+        self.log_message(f"Group {group} {action}: " + " -> ".join(" + ".join(f"{m.kind}:{m.name}" for m in st) for st in stages), "INFO")
+
+        def worker():
+            started = time.monotonic()
+            if action == "up":
+                steps = run_group_stages(stages, self._group_member_up)
+            else:
+                steps = run_group_stages(stages, self._group_member_down, stop_on_failure=False)
+            self.runtime.deliver(self._finish_profile_group, group, action, steps, time.monotonic() - started)
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _finish_profile_group(self, group, action, steps, elapsed):
+        self.group_running = None
+        self.group_reports[group] = (action, steps, elapsed)
+        levels = {True: "INFO", False: "ERROR", None: "WARN"}
+        for st in steps:
+            self.log_message(f"Group {group}: {st.kind}:{st.name} {st.detail} ({st.seconds:.2f}s)", levels[st.ok])
+        failed = [st for st in steps if st.ok is False]
+        self.log_message(f"Group {group} {action} {'failed' if failed else 'done'} in {elapsed:.2f}s", "ERROR" if failed else "INFO")
+        self.update_tray_menu()
+        if failed:
+            self.set_status(f"Group {group}: {len(failed)} member(s) failed", "error")
+            messagebox.showerror("Profile Group", f"'{group}' {action}:\n\n" + "\n".join(
+                f"• {st.kind}:{st.name}: {st.detail} ({st.seconds:.1f}s)" for st in steps))
+        elif action == "down" or not self.connected_profile_name:
+            self.set_status("Ready", "ready")
+
+    def _call_in_ui(self, fn, *args):
+        """Runs fn on the Tk thread and hands its result back to the calling worker thread."""
+        done, box = threading.Event(), {}
+        def call():
+            try:
+                box["result"] = fn(*args)
+            except Exception as e:
+                box["error"] = e
+            finally:
+                done.set()
+        self.runtime.deliver(call)
+        done.wait()
+        if "error" in box:
+            raise box["error"]
+        return box.get("result")
+
+    def _wait_for_member(self, ready, failed, timeout=GROUP_MEMBER_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if ready():
+                return True, "up"
+            if failed():
+                return False, "failed to connect (see log)"
+            time.sleep(0.25)
+        return False, f"not up after {timeout:.0f}s"
+
+    def _group_member_up(self, m):
+        """Starts one group member and waits until it is usable (worker thread)."""
+        if m.kind in GROUP_VPN_KINDS:
+            if self.established_profile == m.name:
+                return True, "already connected"
+            if self.connected_profile_name:
+                return False, f"another VPN is connected ({self.connected_profile_name})"
+            self._call_in_ui(self.connect_vpn, m.name, m.kind)
+            forti_dead = lambda: m.kind == "forti" and not (self.current_process and self.current_process.poll() is None)
+            # connect_vpn returns while preflight/initiate still run on workers (is_connecting)
+            return self._wait_for_member(lambda: self.established_profile == m.name,
+                                         lambda: not self.is_connecting and (self.connected_profile_name != m.name or forti_dead()))
+        if m.kind == "ssh":
+            if self.active_ssh_tunnel == m.name:
+                return True, "already connected"
+            if self.ssh_tunnel_active:
+                return False, f"another SSH tunnel is active ({self.active_ssh_tunnel})"
+            started = time.monotonic()
+            self._call_in_ui(self._connect_ssh_tunnel_tray, m.name)
+            # Usable once the forwarded ports accept connections (or ssh survived its first second)
+            listening = lambda: (all(self.check_port_open("127.0.0.1", p) for p in self.ssh_forward_ports)
+                                 if self.ssh_forward_ports else time.monotonic() - started > 1.0)
+            return self._wait_for_member(lambda: self.active_ssh_tunnel == m.name and listening(),
+                                         lambda: not self.ssh_tunnel_active)
+        applied, box = threading.Event(), {}
+        def done(ok):
+            box["ok"] = ok
+            applied.set()
+        self._call_in_ui(self.apply_net_profile, m.name, False, done)
+        if not applied.wait(GROUP_MEMBER_TIMEOUT):
+            return False, f"not applied after {GROUP_MEMBER_TIMEOUT:.0f}s"
+        return (True, "applied") if box["ok"] else (False, "apply failed (see log)")
+
+    def _group_member_down(self, m):
+        """Stops one group member if it is the one currently active (worker thread)."""
+        if m.kind in GROUP_VPN_KINDS:
+            if self.connected_profile_name != m.name:
+                return True, "not connected"
+            self._call_in_ui(self.disconnect_vpn)
+            ok, _ = self._wait_for_member(lambda: self.connected_profile_name is None, lambda: False)
+            return (True, "disconnected") if ok else (False, "still connected")
+        if m.kind == "ssh":
+            if self.active_ssh_tunnel != m.name:
+                return True, "not connected"
+            self._call_in_ui(self.stop_ssh_tunnel, False)
+            return (True, "disconnected") if not self.ssh_tunnel_active else (False, "still running")
+        return True, "left applied (network settings persist)"
+
+    def group_summary(self, group):
+        """One-line state of a group's last run for menus, e.g. 'up in 8.4s' or 'running...'."""
+        if self.group_running == group:
+            return "running..."
+        if group not in self.group_reports:
+            return None
+        action, steps, elapsed = self.group_reports[group]
+        failed = sum(st.ok is False for st in steps)
+        return f"{action} in {elapsed:.1f}s" + (f", {failed} failed" if failed else "")
+
+    def edit_profile_groups(self):
+        """Opens groups.json in the default editor, creating an example the first time."""
+        if not os.path.exists(self.groups_file):
+            vpn = next((("forti", n) for n in self.profile_index.names("forti")), None) or \
+                  next((("ipsec", n) for n in self.profile_index.names("ipsec")), ("forti", "my-vpn"))
+            ssh = next(iter(self.profile_index.names("ssh")), "my-tunnel")
+            example = {"Example": [{"kind": vpn[0], "name": vpn[1]},
+                                   {"kind": "ssh", "name": ssh, "after": [f"{vpn[0]}:{vpn[1]}"]}]}
+            save_json_file(self.groups_file, example)
+        try:
+            if SYSTEM_OS == "Darwin":
+                self.runtime.launch(["open", "-a", "TextEdit", self.groups_file])
+            elif SYSTEM_OS == "Windows":
+                self.runtime.launch(["notepad", self.groups_file])
+            else:
+                self.runtime.launch(["xdg-open", self.groups_file])
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to open {self.groups_file}: {str(e)}")
+
+    def show_scheduler_stats(self):
+        """Shows how often the background scheduler wakes up, each probe's interval and external command timings."""
+        lines = [f"Wakeups in the last minute: {self.scheduler.wakeups_per_minute()}", ""]
+        lines += [f"{name:<20} every {interval:5.1f}s" for name, interval in sorted(self.scheduler.intervals().items())]
+        lines.append(f"VICI events: {'active' if self.vici_monitor.available else 'unavailable (polling)'}")
+        stats = self.runtime.stats()
+        if stats:
+            lines += ["", f"External commands ({len(self.runtime.children)} running):"]
+            lines += [f"{name:<14} {count:4}x  avg {avg * 1000:6.0f} ms  max {mx * 1000:6.0f} ms" + (f"  ({failed} failed)" if failed else "")
+                      for name, (count, failed, avg, mx) in sorted(stats.items(), key=lambda kv: -kv[1][0] * kv[1][2])]
+        messagebox.showinfo("Background Activity", "\n".join(lines))
+
     def show_about_dialog(self):
         about_text = (
             "LivConnect\n"
@@ -1769,12 +6026,12 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
         """Default text editor ile logs klasörünü aç"""
         try:
             if SYSTEM_OS == "Darwin":  # macOS
-                subprocess.Popen(["open", "-e", self.base_dir])
+                self.runtime.launch(["open", "-e", self.base_dir])
             elif SYSTEM_OS == "Windows":
-                subprocess.Popen(["notepad", self.base_dir])
+                self.runtime.launch(["notepad", self.base_dir])
             else:  # Linux
                 # xdg-open klasörü default file manager'da açar
-                subprocess.Popen(["xdg-open", self.base_dir])
+                self.runtime.launch(["xdg-open", self.base_dir])
             self.log_message(f"Opened logs directory: {self.base_dir}", "INFO")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to open logs directory: {str(e)}")
@@ -1789,11 +6046,11 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
                 return
             
             if SYSTEM_OS == "Darwin":  # macOS
-                subprocess.Popen(["open", "-a", "TextEdit", log_file])
+                self.runtime.launch(["open", "-a", "TextEdit", log_file])
             elif SYSTEM_OS == "Windows":
-                subprocess.Popen(["notepad", log_file])
+                self.runtime.launch(["notepad", log_file])
             else:  # Linux
-                subprocess.Popen(["xdg-open", log_file])
+                self.runtime.launch(["xdg-open", log_file])
             self.log_message(f"Opened OpenForti log: {log_file}", "INFO")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to open OpenForti log: {str(e)}")
@@ -1808,11 +6065,11 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
                 return
             
             if SYSTEM_OS == "Darwin":  # macOS
-                subprocess.Popen(["open", "-a", "TextEdit", log_file])
+                self.runtime.launch(["open", "-a", "TextEdit", log_file])
             elif SYSTEM_OS == "Windows":
-                subprocess.Popen(["notepad", log_file])
+                self.runtime.launch(["notepad", log_file])
             else:  # Linux
-                subprocess.Popen(["xdg-open", log_file])
+                self.runtime.launch(["xdg-open", log_file])
             self.log_message(f"Opened IPsec log: {log_file}", "INFO")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to open IPsec log: {str(e)}")
@@ -1827,11 +6084,11 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
                 return
             
             if SYSTEM_OS == "Darwin":  # macOS
-                subprocess.Popen(["open", "-a", "TextEdit", log_file])
+                self.runtime.launch(["open", "-a", "TextEdit", log_file])
             elif SYSTEM_OS == "Windows":
-                subprocess.Popen(["notepad", log_file])
+                self.runtime.launch(["notepad", log_file])
             else:  # Linux
-                subprocess.Popen(["xdg-open", log_file])
+                self.runtime.launch(["xdg-open", log_file])
             self.log_message(f"Opened SSH Tunnel log: {log_file}", "INFO")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to open SSH Tunnel log: {str(e)}")
@@ -1845,11 +6102,18 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
         s.map("TNotebook.Tab", background=[("selected", "white")], foreground=[("selected", COLOR_PRIMARY)])
 
     def check_local_folders(self):
-        for p in [self.base_dir, self.forti_dir, self.ipsec_dir, self.net_dir]:
+        for p in [self.base_dir, self.forti_dir, self.ipsec_dir, self.net_dir, self.ssh_dir]:
             if not os.path.exists(p): os.makedirs(p)
 
     def log_message(self, m, l="INFO"):
         t = datetime.datetime.now().strftime("%H:%M:%S")
+        if threading.current_thread() is not self.ui_thread:
+            # Worker threads queue the line; the Tk thread writes it on its next drain
+            self.runtime.deliver(self._append_log, t, m, l)
+            return
+        self._append_log(t, m, l)
+
+    def _append_log(self, t, m, l):
         try:
             self.log_text.insert(tk.END, f"[{t}] {m}\n", l)
             self.log_text.see(tk.END)
@@ -1873,19 +6137,96 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
             self.editor_sec.delete('1.0', tk.END)
             if p == "ipsec":
                 self.notebook.add(self.tab2_frame, text="  VPN Secrets (.secrets)  ")
+                self.notebook.add(self.tab3_frame, text="  SA Status  ")
                 self.btn_get_cert.pack_forget()
+                self.ipsec_sampler.poke()
             else:
                 self.notebook.hide(self.tab2_frame)
+                self.notebook.hide(self.tab3_frame)
                 self.btn_get_cert.pack(side=tk.LEFT, padx=(0, 10))
         except: pass
 
     def refresh_profile_list(self):
-        self.file_listbox.delete(0, tk.END)
-        d = self.get_current_dir()
-        if os.path.exists(d):
-            ext = ".conf" if self.protocol_var.get() == "ipsec" else ".vpn"
-            for f in sorted(os.listdir(d)):
-                if f.endswith(ext): self.file_listbox.insert(tk.END, f.replace(ext, ""))
+        kind = self.protocol_var.get()
+        names = self.profile_index.names(kind)
+        query = self.profile_filter_var.get().strip()
+        if query:
+            hits = self.profile_search.search(query)
+            names = [n for n in names if (kind, n) in hits]
+        self.file_listbox.set_items(names)
+
+    def profile_path(self, kind, name):
+        path, ext, _companions = self.profile_index.dirs[kind]
+        return os.path.join(path, name + ext)
+
+    def build_profile_search(self):
+        """Indexes Forti/IPsec names right away and their host/conn fields from a background thread."""
+        keys = [(kind, n) for kind in ("forti", "ipsec") for n in self.profile_index.names(kind)]
+        for key in keys:
+            self.profile_search.add(key, key[1])
+        def worker():
+            entries = [(key, profile_search_fields(self.profile_models.get(key[0], self.profile_path(*key)))) for key in keys]
+            self.runtime.deliver(self._add_profile_search_fields, entries)
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _add_profile_search_fields(self, entries):
+        current = {kind: set(self.profile_index.names(kind)) for kind in ("forti", "ipsec")}
+        for (kind, name), fields in entries:
+            if name in current[kind]:
+                self.profile_search.add((kind, name), name, *fields)
+        if self.profile_filter_var.get().strip():
+            self.refresh_profile_list()
+
+    def _update_profile_search(self, change):
+        key = (change.kind, change.name)
+        self.profile_cache.pop(key)
+        if change.action == "remove":
+            self.profile_search.remove(key)
+        else:
+            self.profile_search.add(key, change.name, *profile_search_fields(self.profile_models.get(change.kind, self.profile_path(*key))))
+
+    def sync_profiles(self, kind):
+        """Rescans one profile directory right after LivConnect itself wrote to it."""
+        changes = self.profile_index.rescan(kind)
+        if changes:
+            self.apply_profile_changes(changes, external=False)
+
+    def apply_profile_changes(self, changes, external=True):
+        """Pushes index diffs into the profile list, the combos and the tray without rebuilding them."""
+        kinds = {c.kind for c in changes}
+        shown = self.protocol_var.get()
+        filtering = bool(self.profile_filter_var.get().strip())
+        for c in changes:
+            if c.kind in ("forti", "ipsec"):
+                self._update_profile_search(c)
+        if filtering and shown in kinds:
+            self.refresh_profile_list()   # fields may have moved profiles in or out of the filter
+        for c in changes:
+            if c.kind != shown or c.kind not in ("forti", "ipsec"):
+                continue
+            if filtering and c.action != "modify":
+                continue   # already applied by the refresh above
+            items = self.file_listbox.get(0, tk.END)
+            pos = bisect.bisect_left(items, c.name)
+            present = pos < len(items) and items[pos] == c.name
+            if c.action == "add" and not present:
+                self.file_listbox.insert(pos, c.name)
+            elif c.action == "remove" and present:
+                self.file_listbox.delete(pos)
+            elif c.action == "modify" and present and external and pos in self.file_listbox.curselection():
+                self.log_message(f"'{c.name}' changed on disk; reselect it to reload the editor.", "WARN")
+        if "ipsec" in kinds:
+            self.ipsec_conn_profiles = None
+        if "net" in kinds:
+            self.net_profile_combo['values'] = self.profile_index.names("net")
+        if "ssh" in kinds:
+            self.ssh_profile_combo['values'] = self.profile_index.names("ssh")
+        if kinds & {"forti", "ipsec", "ssh"} and hasattr(self, 'tray_icon') and self.tray_icon.visible:
+            try: self.tray_icon.update_menu()   # profile submenus are generated from the index
+            except: pass
+        if external:
+            marks = {"add": "+", "remove": "-", "modify": "~"}
+            self.log_message("Profiles changed on disk: " + ", ".join(f"{marks[c.action]}{c.kind}/{c.name}" for c in changes))
 
     def load_selected_profile(self, e):
         sel = self.file_listbox.curselection()
@@ -1894,17 +6235,23 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
         d = self.get_current_dir()
         p = self.protocol_var.get()
         ext = ".vpn" if p == "forti" else ".conf"
+
+        # Contents come from the LRU cache; the profile watcher drops entries whose files change
+        contents = self.profile_cache.get((p, name))
+        if contents is None:
+            contents = []
+            for fname in [name + ext] + ([name + ".secrets"] if p == "ipsec" else []):
+                try:
+                    with open(os.path.join(d, fname), 'r') as f: contents.append(f.read())
+                except: contents.append("")
+            self.profile_cache.put((p, name), contents)
         
         self.editor_conf.delete('1.0', tk.END)
-        try:
-            with open(os.path.join(d, name + ext), 'r') as f: self.editor_conf.insert(tk.END, f.read())
-        except: pass
+        self.editor_conf.insert(tk.END, contents[0])
 
         if p == "ipsec":
             self.editor_sec.delete('1.0', tk.END)
-            try:
-                with open(os.path.join(d, name + ".secrets"), 'r') as f: self.editor_sec.insert(tk.END, f.read())
-            except: pass
+            self.editor_sec.insert(tk.END, contents[1])
         self.log_message(f"Loaded: {name}")
 
     def toggle_buttons(self, connected):
@@ -1914,25 +6261,93 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
         self.btn_disconnect.config(state=s2)
 
     def find_ipsec_conn_name(self, fp):
-        if not os.path.exists(fp): return None
-        with open(fp, 'r') as f:
-            for l in f:
-                m = re.search(r'^\s*conn\s+([a-zA-Z0-9_-]+)', l)
-                if m: return m.group(1)
-        return None
+        conns = self.profile_models.get("ipsec", fp).conns
+        return conns[0] if conns else None
 
     def check_process_running(self, n):
         try:
-            subprocess.check_output(["pgrep", "-x", n])
-            return True
+            return process_running(n)
         except: return False
 
-    def check_ipsec_established(self):
+    def check_ipsec_established(self, conn=None):
+        """Answers from the sampler cache instead of running 'ipsec status' on the UI thread."""
         try:
-            r = subprocess.run(["ipsec", "status"], capture_output=True, text=True)
-            return "ESTABLISHED" in r.stdout
+            return self.ipsec_sampler.is_established(conn)
         except: return False
 
+    def get_ipsec_conn_profiles(self):
+        """Maps conn names to LivConnect IPsec profiles (rebuilt only after the profile index reports a change)."""
+        if self.ipsec_conn_profiles is None:
+            mapping = {}
+            for name in self.profile_index.names("ipsec"):
+                conn = self.find_ipsec_conn_name(os.path.join(self.ipsec_dir, name + ".conf"))
+                if conn: mapping[conn] = name
+            self.ipsec_conn_profiles = mapping
+        return self.ipsec_conn_profiles
+
+    def _graph_coords(self, values, width, height, peak):
+        """Maps the newest values (one per pixel step) onto canvas coords, right-aligned."""
+        step = 1.5
+        values = values[-int(width / step):]
+        x0 = width - (len(values) - 1) * step
+        coords = []
+        for n, v in enumerate(values):
+            if math.isnan(v):
+                v = peak  # Failed probe: draw as a spike to the top
+            coords += [x0 + n * step, height - 2 - (height - 4) * min(v / peak, 1.0)]
+        return coords
+
+    def refresh_traffic_graph(self):
+        """Redraws the RX/TX graph and latency sparkline from the sampler's ring buffers."""
+        snap = self.traffic_sampler.snapshot()
+        rx, tx, lat = snap["rx"], snap["tx"], snap["latency"]
+        h = TRAFFIC_GRAPH_HEIGHT
+        if len(rx) < 2:
+            for canvas, item in ((self.traffic_canvas, self.traffic_rx_line), (self.traffic_canvas, self.traffic_tx_line),
+                                 (self.latency_canvas, self.latency_line)):
+                canvas.itemconfig(item, state="hidden")
+            self.traffic_label.config(text="")
+            return
+        peak = max(max(rx), max(tx), 1024.0)
+        self.traffic_canvas.coords(self.traffic_rx_line, *self._graph_coords(rx, TRAFFIC_GRAPH_WIDTH, h, peak))
+        self.traffic_canvas.coords(self.traffic_tx_line, *self._graph_coords(tx, TRAFFIC_GRAPH_WIDTH, h, peak))
+        self.traffic_canvas.itemconfig(self.traffic_rx_line, state="normal")
+        self.traffic_canvas.itemconfig(self.traffic_tx_line, state="normal")
+
+        text = f"↓ {format_rate(rx[-1])}  ↑ {format_rate(tx[-1])}\n{', '.join(snap['interfaces'])}"
+        ok = [v for v in lat if not math.isnan(v)]
+        if len(lat) >= 2 and ok:
+            self.latency_canvas.coords(self.latency_line, *self._graph_coords(lat, LATENCY_GRAPH_WIDTH, h, max(max(ok) * 1.2, 10.0)))
+            self.latency_canvas.itemconfig(self.latency_line, state="normal")
+        else:
+            self.latency_canvas.itemconfig(self.latency_line, state="hidden")
+        if lat:
+            text += "  " + ("timeout" if math.isnan(lat[-1]) else f"{lat[-1]:.0f} ms")
+        self.traffic_label.config(text=text)
+
+    def refresh_ipsec_sa_view(self):
+        """Shows per-conn SA state and throughput from the sampler cache."""
+        try:
+            if self.protocol_var.get() != "ipsec":
+                return
+            records, rates = self.ipsec_sampler.snapshot()
+            profiles = self.get_ipsec_conn_profiles()
+            self.ipsec_sa_tree.delete(*self.ipsec_sa_tree.get_children())
+            # Our profiles first, then any other SAs the daemon reports
+            for name in sorted(records, key=lambda n: (n not in profiles, n)):
+                rec = records[name]
+                kids = rec["children"]
+                rx, tx = rates.get(name, (0.0, 0.0))
+                self.ipsec_sa_tree.insert("", tk.END, values=(
+                    name, profiles.get(name, "-"), rec["ike_state"] or "-",
+                    ", ".join(sorted({c["state"] for c in kids})) or "-",
+                    format_rate(rx), format_rate(tx),
+                    format_bytes(sum(c["bytes_in"] for c in kids)), format_bytes(sum(c["bytes_out"] for c in kids)),
+                    f"{sum(c['packets_in'] for c in kids)}/{sum(c['packets_out'] for c in kids)}",
+                    next((c["rekey"] for c in kids if c["rekey"]), rec["ike_rekey"]) or "-"))
+        except Exception:
+            pass
+
     # -------------------------------------------------------------------------
     # SSH TUNNEL UI SETUP
     # -------------------------------------------------------------------------
@@ -2031,24 +6446,49 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
         list_frame.pack(fill=tk.BOTH, expand=True, pady=5)
         tk.Label(list_frame, text="Active Rules:", bg="white", font=("Segoe UI", 8, "bold")).pack(anchor="w")
         
-        columns = ("local", "remote_host", "remote_port", "action")
+        columns = ("local", "remote_host", "remote_port", "action", "conns", "traffic", "connect")
         self.ssh_forward_tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=4)
         self.ssh_forward_tree.heading("local", text="Local Port")
         self.ssh_forward_tree.heading("remote_host", text="Remote Host")
         self.ssh_forward_tree.heading("remote_port", text="Remote Port")
         self.ssh_forward_tree.heading("action", text="Action")
+        self.ssh_forward_tree.heading("conns", text="Conns")
+        self.ssh_forward_tree.heading("traffic", text="In / Out")
+        self.ssh_forward_tree.heading("connect", text="Connect")
         self.ssh_forward_tree.column("local", width=80)
         self.ssh_forward_tree.column("remote_host", width=150)
         self.ssh_forward_tree.column("remote_port", width=80)
         self.ssh_forward_tree.column("action", width=60)
+        self.ssh_forward_tree.column("conns", width=70)
+        self.ssh_forward_tree.column("traffic", width=130)
+        self.ssh_forward_tree.column("connect", width=70)
         self.ssh_forward_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
         scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.ssh_forward_tree.yview)
         self.ssh_forward_tree.configure(yscroll=scrollbar.set)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
-        # Remove button
-        tk.Button(tunnel_frame, text="Remove Selected Rule", bg="#ffcdd2", command=self.remove_ssh_port_forward, cursor="hand2").pack(pady=5)
+        # Remove button & forward statistics mode
+        tf_btns = tk.Frame(tunnel_frame, bg="white")
+        tf_btns.pack(fill=tk.X, pady=5)
+        tk.Button(tf_btns, text="Remove Selected Rule", bg="#ffcdd2", command=self.remove_ssh_port_forward, cursor="hand2").pack(side=tk.LEFT)
+        self.ssh_stats_mode_var = tk.StringVar(value="off")
+        ttk.Combobox(tf_btns, textvariable=self.ssh_stats_mode_var, values=FORWARD_STATS_MODES, width=8, state="readonly").pack(side=tk.RIGHT, padx=5)
+        tk.Label(tf_btns, text="Forward Stats (sample = /proc, relay = byte counting):", bg="white", fg="gray").pack(side=tk.RIGHT)
+
+        # Dynamic forward (SOCKS5) - one listener instead of many -L rules
+        dyn = tk.Frame(tunnel_frame, bg="white")
+        dyn.pack(fill=tk.X, pady=3)
+        tk.Label(dyn, text="SOCKS5 Port (-D):", bg="white", width=15, anchor="e").pack(side=tk.LEFT, padx=5)
+        self.ssh_dynamic_port_entry = tk.Entry(dyn, width=8, font=("Segoe UI", 10))
+        self.ssh_dynamic_port_entry.pack(side=tk.LEFT, padx=5)
+        self.ssh_pac_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(dyn, text="Serve PAC on port", variable=self.ssh_pac_var, bg="white").pack(side=tk.LEFT, padx=(10, 0))
+        self.ssh_pac_port_entry = tk.Entry(dyn, width=8, font=("Segoe UI", 10))
+        self.ssh_pac_port_entry.pack(side=tk.LEFT, padx=5)
+        tk.Label(dyn, text="Domains/CIDRs:", bg="white").pack(side=tk.LEFT, padx=(10, 0))
+        self.ssh_pac_domains_entry = tk.Entry(dyn, width=30, font=("Segoe UI", 10))
+        self.ssh_pac_domains_entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
         
         # Status & Actions
         status_frame = tk.Frame(parent, bg="white", pady=10)
@@ -2073,6 +6513,10 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
         
         self.ssh_terminal_btn = tk.Button(btn_frame, text="🖥️ OPEN TERMINAL", bg="#2196f3", fg="white", font=("Segoe UI", 11, "bold"), bd=0, padx=20, pady=10, command=self.open_ssh_terminal, state="disabled", cursor="hand2")
         self.ssh_terminal_btn.pack(side=tk.LEFT, padx=5)
+
+        self.ssh_benchmark_btn = tk.Button(btn_frame, text="⚡ BENCHMARK CIPHERS", bg="#eeeeee", fg="#333", font=("Segoe UI", 10), bd=0, padx=15, pady=10, command=self.benchmark_ssh_ciphers, cursor="hand2")
+        self.ssh_benchmark_btn.pack(side=tk.RIGHT, padx=5)
+        self.ssh_profile_options = {}  # Tuned ssh -o options of the loaded profile (not editable in the form)
         
         # Refresh profiles
         self.refresh_ssh_profiles()
@@ -2127,10 +6571,8 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
 
     def refresh_ssh_profiles(self):
         """Refresh SSH profile list"""
-        if not os.path.exists(self.ssh_dir):
-            os.makedirs(self.ssh_dir)
-        files = [f.replace(".json", "") for f in os.listdir(self.ssh_dir) if f.endswith(".json")]
-        self.ssh_profile_combo['values'] = sorted(files)
+        files = self.profile_index.names("ssh")
+        self.ssh_profile_combo['values'] = files
         if files:
             self.ssh_profile_combo.set(files[0])
             self.load_ssh_profile(None)
@@ -2156,7 +6598,7 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
             with open(path, 'w') as f:
                 json.dump(default_profile, f, indent=2)
             
-            self.refresh_ssh_profiles()
+            self.sync_profiles("ssh")
             self.ssh_profile_combo.set(name)
             self.load_ssh_profile(None)
             self.log_message(f"SSH profile created: {name}", "INFO")
@@ -2201,6 +6643,15 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
             
             for rule in profile.get("port_forwards", []):
                 self.ssh_forward_tree.insert("", tk.END, values=rule[:3])
+            self.ssh_stats_mode_var.set(profile.get("forward_stats", "off"))
+            self.ssh_profile_options = dict(profile.get("ssh_options", {}))
+            self.ssh_dynamic_port_entry.delete(0, tk.END)
+            self.ssh_dynamic_port_entry.insert(0, profile.get("dynamic_port", ""))
+            self.ssh_pac_var.set(profile.get("pac_enabled", False))
+            self.ssh_pac_port_entry.delete(0, tk.END)
+            self.ssh_pac_port_entry.insert(0, profile.get("pac_port", ""))
+            self.ssh_pac_domains_entry.delete(0, tk.END)
+            self.ssh_pac_domains_entry.insert(0, ", ".join(profile.get("pac_domains", [])))
             
             self.log_message(f"SSH profile loaded: {profile_name}", "INFO")
         except Exception as e:
@@ -2216,30 +6667,198 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
         
         path = os.path.join(self.ssh_dir, profile_name + ".json")
         
-        # Collect port forwarding rules
+        try:
+            profile = self._collect_ssh_profile_data()
+        except ValueError as e:
+            messagebox.showerror("Validation", str(e))
+            return
+        
+        try:
+            with open(path, 'w') as f:
+                json.dump(profile, f, indent=2)
+            self.sync_profiles("ssh")
+            messagebox.showinfo("Success", f"SSH profile saved: {profile_name}")
+            self.log_message(f"SSH profile saved: {profile_name}", "INFO")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save profile: {str(e)}")
+            self.log_message(f"Error saving SSH profile: {str(e)}", "ERROR")
+
+    def benchmark_ssh_ciphers(self):
+        """Measures throughput for every cipher x compression setting both ends support."""
+        profile_name = self.ssh_profile_combo.get()
+        try:
+            profile = self._collect_ssh_profile_data()
+            if not all([profile["host"], profile["port"], profile["user"]]):
+                raise ValueError("Please fill in SSH host, port, and user")
+            auth_prefix, auth_args = self._ssh_auth_parts(profile)
+        except ValueError as e:
+            messagebox.showerror("Validation", str(e))
+            return
+        ssh_binary = self.get_ssh_binary()
+        ciphers = list_local_ciphers(ssh_binary)
+        if not ciphers:
+            messagebox.showerror("Benchmark", "Could not list local ssh ciphers ('ssh -Q cipher').")
+            return
+        if not messagebox.askyesno("Benchmark", f"Send {SSH_BENCHMARK_MB} MB to {profile['host']} for each of "
+                                                f"{len(ciphers)} ciphers, with and without compression?"):
+            return
+        self.ssh_benchmark_btn.config(state="disabled")
+
+        def run():
+            payload = benchmark_payload(SSH_BENCHMARK_MB << 20)
+            results = []
+            for cipher in ciphers:
+                for compression in ("no", "yes"):
+                    cmd = (auth_prefix + [ssh_binary, "-p", str(profile["port"]), "-T",
+                                          "-o", "StrictHostKeyChecking=no", "-o", "UserKnownHostsFile=/dev/null",
+                                          "-o", "ConnectTimeout=10", "-c", cipher, "-o", f"Compression={compression}"]
+                           + auth_args + [f"{profile['user']}@{profile['host']}", "cat > /dev/null"])
+                    try:
+                        rate = benchmark_ssh_transfer(cmd, payload)
+                    except RuntimeError as e:
+                        self.log_message(f"Benchmark {cipher}: skipped ({e})", "DEBUG")
+                        break  # Remote does not accept this cipher; no need to try compression
+                    results.append((rate, cipher, compression))
+                    self.log_message(f"Benchmark {cipher} compression={compression}: {rate:.1f} MB/s", "INFO")
+            self.runtime.deliver(self._finish_ssh_benchmark, profile_name, results)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _finish_ssh_benchmark(self, profile_name, results):
+        self.ssh_benchmark_btn.config(state="normal")
+        if not results:
+            messagebox.showerror("Benchmark", "No cipher could be measured. Check the SSH logs.")
+            return
+        results.sort(reverse=True)
+        rate, cipher, compression = results[0]
+        table = "\n".join(f"{r:8.1f} MB/s  {c}  (compression {z})" for r, c, z in results[:10])
+        self._write_protocol_log("ssh", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Cipher benchmark {profile_name}:\n{table}")
+        if not messagebox.askyesno("Benchmark Results", f"{table}\n\nSave {cipher} (compression {compression}) to profile '{profile_name}'?"):
+            return
+        self.ssh_profile_options = {"Ciphers": cipher, "Compression": compression}
+        path = os.path.join(self.ssh_dir, profile_name + ".json")
+        if profile_name and os.path.exists(path):
+            saved = load_json_file(path, {})
+            saved["ssh_options"] = self.ssh_profile_options
+            try:
+                save_json_file(path, saved)
+            except OSError as e:
+                self.log_message(f"Could not save tuned options: {e}", "ERROR")
+                return
+        self.log_message(f"SSH profile {profile_name} tuned: {cipher}, compression {compression}", "INFO")
+
+    def _ssh_auth_parts(self, profile):
+        """(prefix, args) for the profile's auth method. Raises ValueError with a user-facing message."""
+        if profile.get("auth_type") == "key":
+            key_file = profile.get("key_file")
+            if not key_file or not os.path.exists(key_file):
+                raise ValueError("Key file not found or invalid")
+            return [], ["-i", key_file, "-o", "PubkeyAuthentication=yes"]
+        if not profile.get("password"):
+            raise ValueError("Password is required")
+        # Try system sshpass first, then relative path for AppImage
+        sshpass_bin = self.get_sshpass_binary()
+        if not sshpass_bin:
+            raise ValueError("sshpass not found - cannot use password authentication")
+        self.log_message(f"Using sshpass from: {sshpass_bin}", "DEBUG")
+        return [sshpass_bin, "-p", profile["password"]], []
+
+    def preflight_ssh_ports(self, profile):
+        """Bind-tests all local ports of the tunnel; offers reassignment and saves it to the profile.
+
+        Returns False when the tunnel should not be started.
+        """
+        listeners = ssh_profile_local_ports(profile)
+        conflicts = find_port_conflicts([p for _, p in listeners])
+        if not conflicts:
+            return True
+        try:
+            port_range = parse_port_range(self.settings.get("forward_port_range", DEFAULT_FORWARD_PORT_RANGE))
+        except ValueError as e:
+            messagebox.showerror("Port Conflict", f"Local port(s) {', '.join(map(str, conflicts))} are in use.\n\n{e}")
+            return False
+        if not messagebox.askyesno("Port Conflict",
+                                   f"Local port(s) {', '.join(map(str, conflicts))} are already in use.\n\n"
+                                   f"Reassign them from {port_range.start}-{port_range.stop - 1} and save to the profile?"):
+            self.log_message(f"SSH tunnel not started: ports in use {conflicts}", "WARN")
+            return False
+        try:
+            new_ports = iter(allocate_free_ports(len(conflicts), port_range, exclude=[p for _, p in listeners]))
+        except OSError as e:
+            messagebox.showerror("Port Conflict", str(e))
+            return False
+
+        # Reassign busy ports and the later copies of duplicates: find_port_conflicts lists a
+        # duplicate from its second occurrence on, so walk the listeners back to front
+        pending, changes = list(conflicts), []
+        slots = [(kind, idx) for idx, (kind, _port) in enumerate(listeners)]
+        for kind, idx in reversed(slots):
+            old = listeners[idx][1]
+            if old not in pending:
+                continue
+            pending.remove(old)
+            new = next(new_ports)
+            if kind == "forward":
+                rule = list(profile["port_forwards"][idx])
+                rule[0] = new
+                profile["port_forwards"][idx] = rule
+            else:
+                profile[kind] = str(new)
+            changes.append(f"{old} → {new}")
+        changes.reverse()
+
+        # Reflect in the form and persist to the profile JSON
+        for item, rule in zip(self.ssh_forward_tree.get_children(), profile["port_forwards"]):
+            values = list(self.ssh_forward_tree.item(item)["values"])
+            values[0] = rule[0]
+            self.ssh_forward_tree.item(item, values=values)
+        for key, entry in (("dynamic_port", self.ssh_dynamic_port_entry), ("pac_port", self.ssh_pac_port_entry)):
+            entry.delete(0, tk.END)
+            entry.insert(0, profile.get(key, ""))
+        profile_name = self.ssh_profile_combo.get()
+        path = os.path.join(self.ssh_dir, profile_name + ".json")
+        if profile_name and os.path.exists(path):
+            saved = load_json_file(path, {})
+            saved.update({k: profile[k] for k in ("port_forwards", "dynamic_port", "pac_port")})
+            try:
+                save_json_file(path, saved)
+            except OSError as e:
+                self.log_message(f"Could not save reassigned ports: {e}", "ERROR")
+        self.log_message(f"Reassigned local ports: {', '.join(changes)}", "WARN")
+        return True
+
+    def _collect_ssh_profile_data(self):
+        """Returns the SSH form in the same layout as the JSON profiles. Raises ValueError on bad input."""
         port_forwards = []
         for item in self.ssh_forward_tree.get_children():
             values = self.ssh_forward_tree.item(item)["values"]
-            port_forwards.append(values)
-        
-        profile = {
+            port_forwards.append(values[:4])
+
+        dynamic_port = self.ssh_dynamic_port_entry.get().strip()
+        pac_port = self.ssh_pac_port_entry.get().strip()
+        for label, value in (("SOCKS5 port", dynamic_port), ("PAC port", pac_port)):
+            if value and not (value.isdigit() and 0 < int(value) < 65536):
+                raise ValueError(f"{label} must be a number between 1 and 65535")
+        try:
+            pac_domains = parse_pac_domains(self.ssh_pac_domains_entry.get())
+        except ValueError as e:
+            raise ValueError(f"Invalid PAC network: {e}")
+
+        return {
             "host": self.ssh_host_entry.get(),
             "port": self.ssh_port_entry.get(),
             "user": self.ssh_user_entry.get(),
             "auth_type": self.ssh_auth_var.get(),
             "password": self.ssh_pass_entry.get(),
             "key_file": self.ssh_key_entry.get(),
-            "port_forwards": port_forwards
+            "port_forwards": port_forwards,
+            "forward_stats": self.ssh_stats_mode_var.get(),
+            "dynamic_port": dynamic_port,
+            "pac_enabled": self.ssh_pac_var.get(),
+            "pac_port": pac_port,
+            "pac_domains": pac_domains,
+            "ssh_options": dict(self.ssh_profile_options)
         }
-        
-        try:
-            with open(path, 'w') as f:
-                json.dump(profile, f, indent=2)
-            messagebox.showinfo("Success", f"SSH profile saved: {profile_name}")
-            self.log_message(f"SSH profile saved: {profile_name}", "INFO")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save profile: {str(e)}")
-            self.log_message(f"Error saving SSH profile: {str(e)}", "ERROR")
 
     def delete_ssh_profile(self):
         """Delete SSH profile"""
@@ -2252,6 +6871,7 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
             path = os.path.join(self.ssh_dir, profile_name + ".json")
             try:
                 os.remove(path)
+                self.sync_profiles("ssh")
                 self.refresh_ssh_profiles()
                 messagebox.showinfo("Success", "SSH profile deleted")
                 self.log_message(f"SSH profile deleted: {profile_name}", "INFO")
@@ -2277,15 +6897,8 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
                 if os.path.exists(bundled_ssh):
                     return bundled_ssh
         
-        # Fall back to system SSH via which command
-        try:
-            result = subprocess.run(['which', 'ssh'], capture_output=True, text=True, timeout=2)
-            if result.returncode == 0:
-                return result.stdout.strip()
-        except:
-            pass
-        
-        return 'ssh'  # Default, will use PATH
+        # Fall back to system SSH from PATH (memoized)
+        return resolve_binary('ssh') or 'ssh'  # Default, will use PATH
 
     def get_sshpass_binary(self):
         """Get path to sshpass binary, preferring bundled copies when frozen"""
@@ -2302,14 +6915,7 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
                 if os.path.exists(path):
                     return os.path.abspath(path)
         
-        try:
-            result = subprocess.run(['which', 'sshpass'], capture_output=True, text=True, timeout=2)
-            if result.returncode == 0:
-                return result.stdout.strip()
-        except Exception as e:
-            self.log_message(f"Unable to locate sshpass via which: {e}", "WARN")
-        
-        return None
+        return resolve_binary('sshpass')
 
     def check_port_open(self, host, port, timeout=0.5):
         """Check if a port is open and accessible - very quick timeout for AppImage"""
@@ -2328,6 +6934,7 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
         if self.ssh_tunnel_active:
             messagebox.showwarning("Status", "SSH tunnel already active")
             return
+        self._cancel_ssh_reconnect()
         
         host = self.ssh_host_entry.get()
         port = self.ssh_port_entry.get()
@@ -2351,74 +6958,77 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
             return
         
         self.log_message(f"Port {port} on {host} is open", "INFO")
+        if self.ssh_profile_combo.get():
+            self.connection_history.record("ssh", self.ssh_profile_combo.get())
         self._continue_ssh_tunnel(host, port, user)
         
     def _continue_ssh_tunnel(self, host, port, user):
         """Start SSH tunnel using OpenSSH subprocess"""
-        
+        try:
+            profile = self._collect_ssh_profile_data()
+        except ValueError as e:
+            messagebox.showerror("Validation", str(e))
+            return
+        profile.update(host=host, port=port, user=user)
+        if not self.preflight_ssh_ports(profile):
+            return
+        self._launch_ssh_tunnel(self.ssh_profile_combo.get(), profile)
+
+    def _launch_ssh_tunnel(self, name, profile, quiet=False):
+        """Spawns ssh for a collected profile dict and remembers it for reconnects.
+
+        quiet=True (reconnect after a roam) only logs failures. Returns True when ssh was started.
+        """
+        host, port, user = profile["host"], profile["port"], profile["user"]
         try:
             # Get SSH binary
             ssh_binary = self.get_ssh_binary()
-            
+
+            # Port forwarding: in relay mode ssh listens on an internal port and the relay owns the user's port
+            stats_mode = profile["forward_stats"]
+            relay_ports = {}
+            if stats_mode == "relay":
+                relay_ports = {int(rule[0]): free_local_port() for rule in profile["port_forwards"]}
+
             # Build SSH command
-            ssh_cmd = [ssh_binary, "-p", str(port), "-N"]
-            
-            # SSH options
-            ssh_cmd.extend(["-o", "StrictHostKeyChecking=no"])
-            ssh_cmd.extend(["-o", "UserKnownHostsFile=/dev/null"])
-            ssh_cmd.extend(["-o", "ServerAliveInterval=60"])
-            ssh_cmd.extend(["-o", "ServerAliveCountMax=3"])
-            ssh_cmd.extend(["-o", "PasswordAuthentication=yes"])
-            
-            # Add port forwarding rules
-            for item in self.ssh_forward_tree.get_children():
-                values = self.ssh_forward_tree.item(item)["values"]
-                local_port = values[0]
-                remote_host = values[1]
-                remote_port = values[2]
-                ssh_cmd.extend(["-L", f"{local_port}:{remote_host}:{remote_port}"])
-            
-            # Add authentication
-            if self.ssh_auth_var.get() == "key":
-                key_file = self.ssh_key_entry.get()
-                if not key_file or not os.path.exists(key_file):
-                    messagebox.showerror("Error", "Key file not found or invalid")
-                    return
-                ssh_cmd.extend(["-i", key_file])
-                ssh_cmd.extend(["-o", "PubkeyAuthentication=yes"])
-                self.log_message("Using SSH key authentication", "INFO")
-            else:
-                # Password auth
-                password = self.ssh_pass_entry.get()
-                if not password:
-                    messagebox.showerror("Validation", "Password is required")
-                    return
-                self.log_message("Using SSH password authentication", "INFO")
+            ssh_cmd = [ssh_binary] + build_ssh_tunnel_args(profile, relay_ports)
             
-            # Start SSH process
-            if self.ssh_auth_var.get() == "password":
-                password = self.ssh_pass_entry.get()
-                # Use sshpass for password authentication
-                # Try system sshpass first, then relative path for AppImage
-                sshpass_bin = self.get_sshpass_binary()
-                if not sshpass_bin:
-                    messagebox.showerror("Error", "sshpass not found - cannot use password authentication")
-                    return
-                self.log_message(f"Using sshpass from: {sshpass_bin}", "DEBUG")
-                final_cmd = [sshpass_bin, "-p", password] + ssh_cmd + [f"{user}@{host}"]
-            else:
-                # Use key authentication
-                final_cmd = ssh_cmd + [f"{user}@{host}"]
+            # Add authentication (sshpass prefix for password, -i for key)
+            try:
+                auth_prefix, auth_args = self._ssh_auth_parts(profile)
+            except ValueError as e:
+                if not quiet:
+                    messagebox.showerror("Validation", str(e))
+                self.log_message(f"SSH tunnel not started: {e}", "ERROR")
+                return False
+            self.log_message(f"Using SSH {profile['auth_type']} authentication", "INFO")
+            if profile.get("ssh_options"):
+                self.log_message(f"Tuned SSH options: {profile['ssh_options']}", "DEBUG")
+            final_cmd = auth_prefix + ssh_cmd + auth_args + [f"{user}@{host}"]
             
-            self.ssh_tunnel_process = subprocess.Popen(
-                final_cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
+            self.ssh_stats_mode = stats_mode
+            self.ssh_forward_ports = [int(rule[0]) for rule in profile["port_forwards"]]
+            if relay_ports:
+                self.ssh_forward_relay = ForwardRelay(relay_ports).start()
+                self.log_message(f"Forward relay listening on {len(relay_ports)} port(s)", "DEBUG")
+            if stats_mode != "off" and self.ssh_forward_ports:
+                self.scheduler.add("ssh-forward-stats", self.sample_forward_stats, 2.0, 10.0, delay=2.0)
+            if profile["dynamic_port"]:
+                self.log_message(f"SOCKS5 proxy on 127.0.0.1:{profile['dynamic_port']}", "INFO")
+                if profile["pac_enabled"]:
+                    pac = build_pac_file(profile["dynamic_port"], profile["pac_domains"])
+                    self.ssh_pac_server = PacServer(pac, profile["pac_port"] or 0).start()
+                    self.log_message(f"PAC file: {self.ssh_pac_server.url}", "INFO")
+
+            # The runtime drains ssh's output (so a chatty ssh never blocks) and reports the exit
+            output = collections.deque(maxlen=200)
+            self.ssh_tunnel_process = self.runtime.spawn_sync(
+                final_cmd, on_line=output.append, merge_stderr=True, name="ssh",
+                on_exit=lambda process: self.runtime.deliver(self.monitor_ssh_tunnel, process, output))
             
             self.ssh_tunnel_active = True
-            self.active_ssh_tunnel = self.ssh_profile_combo.get()
+            self.active_ssh_tunnel = name
+            self.ssh_tunnel_profile = (name, profile)
             
             # Write connection log
             self._write_protocol_log("ssh", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] SSH tunnel connecting: {self.active_ssh_tunnel}")
@@ -2435,28 +7045,35 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
             
             self.log_message(f"SSH tunnel started: {self.active_ssh_tunnel}", "INFO")
             self._write_protocol_log("ssh", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] SSH tunnel connected: {self.active_ssh_tunnel}")
-            
-            # Monitor tunnel in background
-            threading.Thread(target=self.monitor_ssh_tunnel, daemon=True).start()
-        
+            return True
+
         except Exception as e:
             error_msg = f"Failed to start SSH tunnel: {str(e)}"
-            messagebox.showerror("Error", error_msg)
+            if not quiet:
+                messagebox.showerror("Error", error_msg)
             self.log_message(error_msg, "ERROR")
             self._write_protocol_log("ssh", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Error: {str(e)}")
             self.ssh_tunnel_active = False
+            self.stop_ssh_tunnel_helpers()
             if hasattr(self, 'ssh_connect_btn'):
                 self.ssh_connect_btn.config(state="normal")
             if hasattr(self, 'ssh_disconnect_btn'):
                 self.ssh_disconnect_btn.config(state="disabled")
             self.root.update()
-            self.root.update()
+            return False
 
-    def stop_ssh_tunnel(self):
-        """Stop SSH tunnel"""
+    def stop_ssh_tunnel(self, notify=True):
+        """Stop SSH tunnel (notify=False skips the confirmation dialog, e.g. for group teardown)"""
+        if self.ssh_reconnect and not self.ssh_tunnel_active:
+            self._cancel_ssh_reconnect()
+            self.log_message("SSH reconnect cancelled", "INFO")
+            self.active_ssh_tunnel = None
+            self.on_ssh_tunnel_closed(notify=False)
+            return
         if not self.ssh_tunnel_active:
             messagebox.showwarning("Status", "SSH tunnel not active")
             return
+        self._cancel_ssh_reconnect()
         
         try:
             # Log the disconnection
@@ -2473,6 +7090,7 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
             
             self.ssh_tunnel_active = False
             self.active_ssh_tunnel = None
+            self.stop_ssh_tunnel_helpers()
             
             # Update UI
             self.update_ssh_status(False)
@@ -2482,7 +7100,8 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
             self.root.update()
             
             self._write_protocol_log("ssh", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Disconnected successfully")
-            messagebox.showinfo("Success", "SSH tunnel stopped")
+            if notify:
+                messagebox.showinfo("Success", "SSH tunnel stopped")
             self.log_message("SSH tunnel stopped", "INFO")
         
         except Exception as e:
@@ -2502,39 +7121,127 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
             self.ssh_status_canvas.itemconfig(self.ssh_status_circle, fill="#bdbdbd")
             self.ssh_status_label.config(text="Status: Disconnected")
 
-    def monitor_ssh_tunnel(self):
-        """Monitor SSH tunnel process and detect failures"""
-        while self.ssh_tunnel_active:
-            if self.ssh_tunnel_process:
-                poll_result = self.ssh_tunnel_process.poll()
-                
-                # Check if process ended
-                if poll_result is not None:
-                    # Get stdout/stderr for debugging
-                    stdout = ""
-                    stderr = ""
-                    try:
-                        if self.ssh_tunnel_process.stdout:
-                            stdout = self.ssh_tunnel_process.stdout.read()
-                        if self.ssh_tunnel_process.stderr:
-                            stderr = self.ssh_tunnel_process.stderr.read()
-                    except:
-                        pass
-                    
-                    if stdout:
-                        self.log_message(f"SSH stdout: {stdout}", "DEBUG")
-                    if stderr:
-                        self.log_message(f"SSH stderr: {stderr}", "DEBUG")
-                    
-                    self.log_message(f"SSH tunnel closed (exit code: {poll_result})", "INFO")
-                    self.ssh_tunnel_active = False
-                    self.root.after(0, self.on_ssh_tunnel_closed)
-                    break
-            
-            time.sleep(2)
-
-    def on_ssh_tunnel_closed(self):
+    def monitor_ssh_tunnel(self, process, output):
+        """Runtime exit callback (Tk thread): reports an ssh exit the user did not ask for."""
+        # Stopped by the user (or replaced by a new tunnel): nothing to report
+        if not self.ssh_tunnel_active or self.ssh_tunnel_process is not process:
+            return
+        if output:
+            self.log_message("SSH output: " + "\n".join(output), "DEBUG")
+        self.log_message(f"SSH tunnel closed (exit code: {process.returncode})", "INFO")
+        self.ssh_tunnel_active = False
+        # ssh started by a reconnect died before it settled (network still coming up): keep backing off
+        if self.ssh_reconnect and time.monotonic() - self.ssh_reconnect["started"] < SSH_RECONNECT_SETTLE:
+            self.stop_ssh_tunnel_helpers()
+            self.update_ssh_status(False)
+            self._schedule_ssh_reconnect()
+            return
+        self.ssh_reconnect = None
+        self.on_ssh_tunnel_closed()
+
+    def sample_forward_stats(self):
+        """Scheduler job: collects per-forward stats and schedules the tree update."""
+        if self.ssh_forward_relay:
+            stats = self.ssh_forward_relay.snapshot()
+        elif self.ssh_forward_ports and self.ssh_stats_mode == "sample":
+            stats = {p: {"active": n} for p, n in count_port_connections(self.ssh_forward_ports).items()}
+        else:
+            return False
+        changed, self.ssh_forward_stats = stats != self.ssh_forward_stats, stats
+        if changed:
+            self.runtime.deliver(self.refresh_ssh_forward_stats)
+        return changed
+
+    def refresh_ssh_forward_stats(self):
+        """Fills the Conns / In-Out / Connect columns of the forward tree."""
+        for item in self.ssh_forward_tree.get_children():
+            values = list(self.ssh_forward_tree.item(item)["values"])
+            values += [""] * (7 - len(values))
+            try: st = self.ssh_forward_stats.get(int(values[0]))
+            except (TypeError, ValueError): st = None
+            if not st:
+                values[4:7] = ["", "", ""]
+            elif "total" in st:
+                values[4] = f"{st['active']}/{st['total']}" + (f" ({st['failed']} err)" if st["failed"] else "")
+                values[5] = f"{format_bytes(st['bytes_in'])} / {format_bytes(st['bytes_out'])}"
+                values[6] = f"{st['connect_ms']:.0f} ms" if st["connect_ms"] is not None else "-"
+            else:
+                values[4:7] = [str(st["active"]), "-", "-"]
+            self.ssh_forward_tree.item(item, values=values)
+
+    def stop_ssh_tunnel_helpers(self):
+        """Stops the forward relay and PAC server of the tunnel and clears the stat columns."""
+        self.scheduler.remove("ssh-forward-stats")
+        if self.ssh_forward_relay:
+            self.ssh_forward_relay.stop()
+            self.ssh_forward_relay = None
+        if self.ssh_pac_server:
+            self.ssh_pac_server.stop()
+            self.ssh_pac_server = None
+        self.ssh_forward_stats = {}
+        self.runtime.deliver(self.refresh_ssh_forward_stats)
+
+    def reconnect_ssh_tunnel(self, reason):
+        """Quietly restarts the active SSH tunnel from the profile it was started with.
+
+        No dialogs: the gateway may not be reachable yet right after a roam, so attempts are
+        retried with SSH_RECONNECT_BACKOFF and a final failure is only logged.
+        """
+        process = self.ssh_tunnel_process
+        self.log_message(f"Reconnecting SSH tunnel ({reason})...", "WARN")
+        self._write_protocol_log("ssh", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Reconnecting: {self.active_ssh_tunnel} ({reason})")
+        self.ssh_tunnel_active = False  # The monitor thread treats the exit as intentional
+        try:
+            process.terminate()
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        except Exception:
+            pass
+        self.stop_ssh_tunnel_helpers()
+        self.update_ssh_status(False)
+        self._cancel_ssh_reconnect()
+        self.ssh_reconnect = {"attempt": 0, "after_id": None, "started": time.monotonic()}
+        self._schedule_ssh_reconnect()
+
+    def _schedule_ssh_reconnect(self):
+        state = self.ssh_reconnect
+        if state["attempt"] >= len(SSH_RECONNECT_BACKOFF):
+            name = self.ssh_tunnel_profile[0] if self.ssh_tunnel_profile else self.active_ssh_tunnel
+            self.log_message(f"SSH tunnel {name} could not be re-established after {state['attempt']} attempts", "ERROR")
+            self._write_protocol_log("ssh", f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Reconnect gave up: {name}")
+            self.ssh_reconnect = None
+            self.active_ssh_tunnel = None
+            self.on_ssh_tunnel_closed(notify=False)
+            return
+        delay = SSH_RECONNECT_BACKOFF[state["attempt"]]
+        state["attempt"] += 1
+        state["after_id"] = self.root.after(int(delay * 1000), lambda: self._ssh_reconnect_attempt(state))
+
+    def _ssh_reconnect_attempt(self, state):
+        """Probes the SSH port on a worker, then relaunches the stored profile (Tk thread)."""
+        state["after_id"] = None
+        name, profile = self.ssh_tunnel_profile
+        def probed(is_open, error):
+            if self.ssh_reconnect is not state:
+                return  # Cancelled, or the user started another tunnel meanwhile
+            if not is_open:
+                self.log_message(f"SSH reconnect {state['attempt']}/{len(SSH_RECONNECT_BACKOFF)}: "
+                                 f"{profile['host']}:{profile['port']} not reachable yet", "WARN")
+                return self._schedule_ssh_reconnect()
+            state["started"] = time.monotonic()
+            if not self._launch_ssh_tunnel(name, profile, quiet=True):
+                self._schedule_ssh_reconnect()
+        self.run_in_worker(self.check_port_open, profile["host"], profile["port"], then=probed)
+
+    def _cancel_ssh_reconnect(self):
+        if self.ssh_reconnect and self.ssh_reconnect["after_id"]:
+            self.root.after_cancel(self.ssh_reconnect["after_id"])
+        self.ssh_reconnect = None
+
+    def on_ssh_tunnel_closed(self, notify=True):
         """Called when SSH tunnel closes"""
+        self.stop_ssh_tunnel_helpers()
         self.update_ssh_status(False)
         if hasattr(self, 'ssh_connect_btn'):
             self.ssh_connect_btn.config(state="normal")
@@ -2544,7 +7251,8 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
             self.ssh_terminal_btn.config(state="disabled")
         
         self.log_message("SSH tunnel closed", "INFO")
-        messagebox.showinfo("SSH Tunnel", "SSH tunnel connection closed")
+        if notify:
+            messagebox.showinfo("SSH Tunnel", "SSH tunnel connection closed")
 
 
     def open_ssh_terminal(self):
@@ -2598,9 +7306,9 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
                 
                 terminal_found = False
                 for term_name, cmd_builder in terminals:
-                    if shutil.which(term_name):
+                    if resolve_binary(term_name):
                         cmd_list = cmd_builder(ssh_cmd_str)
-                        subprocess.Popen(cmd_list)
+                        self.runtime.launch(cmd_list)
                         self.log_message(f"SSH terminal opened: {user}@{host}:{port}", "INFO")
                         terminal_found = True
                         break
@@ -2614,16 +7322,16 @@ YOUR_USERNAME : EAP "YOUR_PASSWORD"
                 # Properly escape quotes for AppleScript
                 escaped_ssh = ssh_cmd_str.replace('"', '\\"').replace("'", "\\'")
                 script = f'tell application "Terminal" to do script "{escaped_ssh}"'
-                subprocess.Popen(["osascript", "-e", script])
+                self.runtime.launch(["osascript", "-e", script])
                 self.log_message(f"SSH terminal opened: {user}@{host}:{port}", "INFO")
             
             else:
                 # Windows - use PuTTY or cmd
-                if shutil.which("putty"):
+                if resolve_binary("putty"):
                     putty_cmd = ["putty", f"-P {port}", f"{user}@{host}"]
-                    subprocess.Popen(putty_cmd)
+                    self.runtime.launch(putty_cmd)
                 else:
-                    subprocess.Popen(["cmd", "/c", "start", "cmd", "/k", ssh_cmd_str])
+                    self.runtime.launch(["cmd", "/c", "start", "cmd", "/k", ssh_cmd_str])
                 self.log_message(f"SSH terminal opened: {user}@{host}:{port}", "INFO")
         
         except Exception as e:
@@ -2652,6 +7360,10 @@ def simple_input(parent, title, prompt):
 
 if __name__ == "__main__":
     multiprocessing.freeze_support()
+    if "--benchmark" in sys.argv:
+        for label, usec in benchmark_introspection():
+            print(f"{label:<40} {usec:>10.1f} us/call")
+        sys.exit(0)
     root = tk.Tk()
     app = LivConnectApp(root)
     root.mainloop()
@@ -0,0 +1,31 @@
+import pytest
+
+import LivConnect as lc
+
+
+def test_fetch_cert_digest_matches_der_sha256(tls_server):
+    port, digest = tls_server
+    assert lc.fetch_cert_digest("127.0.0.1", port, timeout=5) == digest
+
+
+def test_fetch_cert_digest_raises_oserror_when_refused(closed_port):
+    with pytest.raises(OSError):
+        lc.fetch_cert_digest("127.0.0.1", closed_port, timeout=2)
+
+
+def test_cert_pin_store_persists_and_keeps_first_seen(tmp_path):
+    path = str(tmp_path / "cert_pins.json")
+    store = lc.CertPinStore(path)
+    assert store.get("gw", 443) is None
+
+    store.pin("gw", 443, "a" * 64)
+    first_seen = store.pins["gw:443"]["first_seen"]
+    store.pin("gw", 443, "a" * 64)
+    assert store.pins["gw:443"]["first_seen"] == first_seen
+
+    reloaded = lc.CertPinStore(path)
+    assert reloaded.get("gw", 443) == "a" * 64
+    assert reloaded.get("gw", 8443) is None
+
+    reloaded.pin("gw", 443, "b" * 64)
+    assert lc.CertPinStore(path).get("gw", 443) == "b" * 64
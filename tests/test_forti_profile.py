@@ -0,0 +1,58 @@
+import pytest
+
+import LivConnect as lc
+
+DIGEST = "3f" * 32
+
+
+def forti(tmp_path, text):
+    path = tmp_path / "office.vpn"
+    path.write_text(text)
+    return lc.parse_forti_profile(str(path))
+
+
+def test_forti_profile_fields(tmp_path):
+    model = forti(tmp_path, f"""\
+# office gateway
+host = vpn.example.com
+port = 10443
+username = alice
+password = p#ss   # values may contain '#'
+trusted-cert = {DIGEST}
+trusted-cert = pin-sha256:{"A" * 43}=
+livconnect_auth_type = OTP
+""")
+    assert (model.host, model.port, model.username) == ("vpn.example.com", 10443, "alice")
+    assert model.options["password"] == "p#ss"
+    assert model.trusted_certs == [DIGEST, "pin-sha256:" + "A" * 43 + "="]
+    assert model.auth_type == "otp"
+    assert model.errors == [] and model.warnings == []
+
+
+def test_forti_profile_bad_line_only_warns(tmp_path):
+    model = forti(tmp_path, "host = vpn.example.com\nthis is not an option\n")
+    assert model.errors == []
+    assert any("line 2" in w for w in model.warnings)
+
+
+def test_forti_profile_malformed_trusted_cert_only_warns(tmp_path):
+    model = forti(tmp_path, "host = vpn.example.com\ntrusted-cert = abc123\n")
+    assert model.errors == []
+    assert any("abc123" in w for w in model.warnings)
+
+
+@pytest.mark.parametrize("text, message", [
+    ("port = 443\n", "host is missing"),
+    ("host = VPN_SERVER_IP\n", "placeholder"),
+    ("host = gw\nport = 99999\n", "not a valid port"),
+    ("host = gw\nca-file = /nonexistent/ca.pem\n", "does not exist"),
+])
+def test_forti_profile_launch_blocking_errors(tmp_path, text, message):
+    model = forti(tmp_path, text)
+    assert any(message in e for e in model.errors)
+
+
+def test_forti_profile_unreadable(tmp_path):
+    model = lc.parse_forti_profile(str(tmp_path / "missing.vpn"))
+    assert model.host is None
+    assert model.errors and "cannot read" in model.errors[0]
@@ -0,0 +1,91 @@
+import socket
+import threading
+import time
+
+import pytest
+
+import LivConnect as lc
+
+
+@pytest.fixture
+def echo_after_eof():
+    """Loopback server that reads until the client half-closes, then sends everything back."""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+
+    def serve():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            with conn:
+                data = bytearray()
+                while chunk := conn.recv(65536):
+                    data += chunk
+                conn.sendall(data)
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield listener.getsockname()[1]
+    listener.close()
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def relay_to(port):
+    local = lc.free_local_port()
+    return local, lc.ForwardRelay({local: port}).start()
+
+
+def test_half_closed_client_still_gets_the_response(echo_after_eof):
+    local, relay = relay_to(echo_after_eof)
+    try:
+        payload = b"request " * 40000
+        with socket.create_connection(("127.0.0.1", local), timeout=5) as client:
+            client.sendall(payload)
+            client.shutdown(socket.SHUT_WR)   # nc -N: done sending, still reading
+            received = bytearray()
+            while chunk := client.recv(65536):
+                received += chunk
+        assert bytes(received) == payload
+        assert wait_for(lambda: relay.snapshot()[local]["active"] == 0)
+        stats = relay.snapshot()[local]
+        assert (stats["total"], stats["failed"]) == (1, 0)
+        assert stats["bytes_out"] == stats["bytes_in"] == len(payload)
+        assert stats["connect_ms"] is not None
+    finally:
+        relay.stop()
+
+
+def test_connections_are_counted(echo_after_eof):
+    local, relay = relay_to(echo_after_eof)
+    try:
+        for i in range(3):
+            with socket.create_connection(("127.0.0.1", local), timeout=5) as client:
+                client.sendall(b"x" * (i + 1))
+                client.shutdown(socket.SHUT_WR)
+                assert client.recv(16) == b"x" * (i + 1)
+        assert wait_for(lambda: relay.snapshot()[local]["active"] == 0)
+        stats = relay.snapshot()[local]
+        assert (stats["total"], stats["bytes_out"], stats["bytes_in"]) == (3, 6, 6)
+    finally:
+        relay.stop()
+
+
+def test_unreachable_upstream_counts_as_failed():
+    local, relay = relay_to(lc.free_local_port())
+    try:
+        with socket.create_connection(("127.0.0.1", local), timeout=5) as client:
+            assert client.recv(16) == b""
+        assert wait_for(lambda: relay.snapshot()[local]["failed"] == 1)
+        assert relay.snapshot()[local]["total"] == 1
+    finally:
+        relay.stop()
@@ -0,0 +1,33 @@
+import pytest
+
+import LivConnect as lc
+
+
+def member(kind, name, after=None):
+    return lc.GroupMember(kind, name, after)
+
+
+def stage_names(stages):
+    return [sorted(f"{m.kind}:{m.name}" for m in stage) for stage in stages]
+
+
+def test_group_ssh_waits_for_vpn_by_default():
+    stages = lc.plan_group_stages([member("ssh", "db"), member("forti", "office"), member("net", "lan")])
+    assert stage_names(stages) == [["forti:office", "net:lan"], ["ssh:db"]]
+
+
+def test_group_explicit_after():
+    stages = lc.plan_group_stages([member("net", "lan", ["ssh:db"]), member("ssh", "db", []),
+                                   member("ipsec", "lab")])
+    assert stage_names(stages) == [["ipsec:lab", "ssh:db"], ["net:lan"]]
+
+
+@pytest.mark.parametrize("members, message", [
+    ([member("forti", "a"), member("ipsec", "b")], "one VPN"),
+    ([member("ssh", "a"), member("ssh", "b")], "one VPN"),
+    ([member("net", "a", ["net:missing"])], "not in the group"),
+    ([member("net", "a", ["net:b"]), member("net", "b", ["net:a"])], "cycle"),
+])
+def test_group_plan_errors(members, message):
+    with pytest.raises(ValueError, match=message):
+        lc.plan_group_stages(members)
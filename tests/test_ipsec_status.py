@@ -0,0 +1,49 @@
+import LivConnect as lc
+
+STATUSALL = """\
+Status of IKE charon daemon (strongSwan 5.9.5, Linux 6.1.0, x86_64):
+  uptime: 2 hours, since Jan 01 10:00:00 2025
+Connections:
+      office:  10.0.0.2...1.2.3.4  IKEv2, dpddelay=30s
+      office:   local:  [me] uses pre-shared key authentication
+Security Associations (2 up, 0 connecting):
+      office[3]: ESTABLISHED 5 minutes ago, 10.0.0.2[me]...1.2.3.4[gw]
+      office[3]: IKEv2 SPIs: aa_i* bb_r, pre-shared key reauthentication in 2 hours
+      office[3]: IKE proposal: AES_CBC_256/HMAC_SHA2_256_128/PRF_HMAC_SHA2_256/MODP_2048
+      office[3]: Tasks queued: CHILD_REKEY
+      office[3]: Tasks active: IKE_DPD
+      office{7}:  INSTALLED, TUNNEL, reqid 1, ESP SPIs: c1_i c2_o
+      office{7}:  AES_CBC_256/HMAC_SHA2_256_128, 1200 bytes_i (10 pkts, 3s ago), 3400 bytes_o (12 pkts, 1s ago), rekeying in 40 minutes
+      office{7}:   10.0.0.2/32 === 192.168.0.0/16
+      lab[4]: CONNECTING, 10.0.0.2[%any]...5.6.7.8[%any]
+      lab[5]: ESTABLISHED 1 minute ago, 10.0.0.2[me]...5.6.7.8[gw]
+      lab[6]: DELETING, 10.0.0.2[me]...5.6.7.8[gw]
+"""
+
+
+def test_statusall_parses_ike_and_child_sa():
+    office = lc.parse_ipsec_statusall(STATUSALL)["office"]
+    assert office["ike_id"] == 3
+    assert office["ike_state"] == "ESTABLISHED"
+    assert office["ike_rekey"] == "reauthentication in 2 hours"
+    (child,) = office["children"]
+    assert (child["id"], child["state"], child["mode"]) == (7, "INSTALLED", "TUNNEL")
+    assert (child["bytes_in"], child["bytes_out"]) == (1200, 3400)
+    assert (child["packets_in"], child["packets_out"]) == (10, 12)
+    assert child["rekey"] == "rekeying in 40 minutes"
+    assert (child["local_ts"], child["remote_ts"]) == ("10.0.0.2/32", "192.168.0.0/16")
+
+
+def test_statusall_task_lines_are_not_ike_states():
+    office = lc.parse_ipsec_statusall(STATUSALL)["office"]
+    assert office["ike_state"] == "ESTABLISHED"
+    assert "Tasks" not in office["ike_info"]
+
+
+def test_statusall_established_sa_wins_over_others():
+    lab = lc.parse_ipsec_statusall(STATUSALL)["lab"]
+    assert (lab["ike_id"], lab["ike_state"]) == (5, "ESTABLISHED")
+
+
+def test_statusall_ignores_lines_before_security_associations():
+    assert lc.parse_ipsec_statusall(STATUSALL.split("Security Associations")[0]) == {}
@@ -0,0 +1,23 @@
+import pytest
+
+import LivConnect as lc
+
+
+def test_fuzzy_score_requires_subsequence():
+    assert lc.fuzzy_score("ofc", "office") is not None
+    assert lc.fuzzy_score("cfo", "office") is None
+    assert lc.fuzzy_score("officex", "office") is None
+
+
+def test_fuzzy_score_prefers_consecutive_and_word_starts():
+    assert lc.fuzzy_score("off", "office vpn") > lc.fuzzy_score("ofe", "office vpn")
+    assert lc.fuzzy_score("ov", "office vpn") > lc.fuzzy_score("oc", "office vpn")
+
+
+def test_fuzzy_score_picks_the_later_word_start():
+    # "v" should match the start of "vpn", not the inner v of "dev"
+    assert lc.fuzzy_score("v", "dev vpn") == pytest.approx(lc.fuzzy_score("v", "x vpn") - 0.2 * 2)
+
+
+def test_fuzzy_score_penalises_late_first_match():
+    assert lc.fuzzy_score("db", "db tunnel") > lc.fuzzy_score("db", "prod db")
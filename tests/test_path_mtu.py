@@ -0,0 +1,47 @@
+import shutil
+
+import pytest
+
+import LivConnect as lc
+
+
+def path_with_mtu(mtu):
+    """Fake probe for a path that drops DF packets above mtu; records every size tried."""
+    sizes = []
+
+    def probe(host, size):
+        sizes.append(size)
+        return size <= mtu
+    return probe, sizes
+
+
+@pytest.mark.parametrize("mtu", [576, 1280, 1412, 1499])
+def test_discover_path_mtu_finds_the_limit(mtu):
+    probe, sizes = path_with_mtu(mtu)
+    assert lc.discover_path_mtu("gw", probe=probe) == mtu
+    assert len(sizes) <= 2 + 10   # floor + ceiling, then a binary search over 576..1500
+
+
+def test_discover_path_mtu_unobstructed_path_stops_at_high():
+    probe, sizes = path_with_mtu(9000)
+    assert lc.discover_path_mtu("gw", high=1500, probe=probe) == 1500
+    assert sizes == [lc.MTU_PROBE_FLOOR, 1500]
+
+
+def test_discover_path_mtu_none_when_floor_fails():
+    probe, sizes = path_with_mtu(0)
+    assert lc.discover_path_mtu("gw", probe=probe) is None
+    assert sizes == [lc.MTU_PROBE_FLOOR]
+
+
+def test_discover_path_mtu_over_loopback():
+    if not shutil.which("ping") or not lc.ping_df("127.0.0.1", lc.MTU_PROBE_FLOOR):
+        pytest.skip("no usable ping for DF probes")
+    # Loopback's MTU is far above 1500, so the search ends at the ceiling
+    assert lc.discover_path_mtu("127.0.0.1", high=1500) == 1500
+
+
+def test_build_mtu_script_only_sets_the_mtu():
+    script = lc.build_mtu_script("ppp0", 1400)
+    assert "1400" in script and "ppp0" in script
+    assert "iptables" not in script
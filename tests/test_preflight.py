@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+import LivConnect as lc
+
+
+def test_check_tls_gateway_trusted_digest_is_ok(tls_server):
+    port, digest = tls_server
+    status, _detail = lc.check_tls_gateway("127.0.0.1", port, [digest.upper()], timeout=5)
+    assert status == "ok"
+
+
+def test_check_tls_gateway_untrusted_self_signed_fails(tls_server):
+    port, _digest = tls_server
+    status, detail = lc.check_tls_gateway("127.0.0.1", port, ["0" * 64], timeout=5)
+    assert status == "fail"
+    assert "trusted-cert" in detail
+
+
+def test_check_tls_gateway_changed_pin_warns(tls_server):
+    port, _digest = tls_server
+    status, detail = lc.check_tls_gateway("127.0.0.1", port, pinned="f" * 64, timeout=5)
+    assert status == "warn"
+    assert "changed" in detail
+
+
+def test_check_tls_gateway_unreachable_only_warns(closed_port):
+    status, _detail = lc.check_tls_gateway("127.0.0.1", closed_port, ["0" * 64], timeout=1)
+    assert status == "warn"
+
+
+@pytest.fixture
+def ipsec_tree(tmp_path):
+    """A profile directory, a symlink to it and an empty ipsec.conf to fill in."""
+    profiles = tmp_path / "livconnect" / "ipsec"
+    profiles.mkdir(parents=True)
+    link = tmp_path / "profiles-link"
+    link.symlink_to(profiles)
+    return str(profiles), str(link), tmp_path / "ipsec.conf"
+
+
+@pytest.mark.parametrize("line", [
+    "include {dir}/*.conf",
+    "include   {dir}/*.conf   ",
+    "include {dir}//*.conf",
+    "include {dir}/*.conf  # LivConnect",
+    "include '{dir}/*.conf'",
+    "include {link}/*.conf",
+    "include {dir}/*",
+    "include {root}/*/ipsec/*.conf",
+])
+def test_check_ipsec_include_accepts_equivalent_includes(ipsec_tree, line):
+    profiles, link, conf = ipsec_tree
+    root = os.path.dirname(os.path.dirname(profiles))
+    conf.write_text("config setup\n" + line.format(dir=profiles, link=link, root=root) + "\n")
+    status, _detail = lc.check_ipsec_include(profiles, str(conf))
+    assert status == "ok"
+
+
+def test_check_ipsec_include_via_symlinked_profile_dir(ipsec_tree):
+    profiles, link, conf = ipsec_tree
+    conf.write_text(f"include {profiles}/*.conf\n")
+    assert lc.check_ipsec_include(link, str(conf))[0] == "ok"
+
+
+@pytest.mark.parametrize("line", [
+    "",
+    "# include {dir}/*.conf",
+    "include {dir}/*.secrets",
+    "include /etc/ipsec.d/*.conf",
+])
+def test_check_ipsec_include_missing_include_fails(ipsec_tree, line):
+    profiles, _link, conf = ipsec_tree
+    conf.write_text("config setup\n" + line.format(dir=profiles) + "\n")
+    assert lc.check_ipsec_include(profiles, str(conf))[0] == "fail"
+
+
+def test_check_ipsec_include_unreadable_conf_only_warns(tmp_path):
+    assert lc.check_ipsec_include(str(tmp_path), str(tmp_path / "missing.conf"))[0] == "warn"
@@ -0,0 +1,133 @@
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import LivConnect as lc
+
+
+def py(code):
+    return [sys.executable, "-c", code]
+
+
+@pytest.fixture
+def runtime():
+    rt = lc.ProcessRuntime(max_concurrency=2).start()
+    yield rt
+    rt.stop()
+
+
+def test_run_captures_output_and_records_stats(runtime):
+    res = runtime.run_sync(py("import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)"), name="probe")
+    assert (res.returncode, res.stdout.strip(), res.stderr.strip(), res.timed_out) == (3, "out", "err", False)
+    with pytest.raises(subprocess.CalledProcessError):
+        res.check_returncode()
+    count, failed, _avg, _mx = runtime.stats()["probe"]
+    assert (count, failed) == (1, 1)
+
+
+def test_run_passes_input(runtime):
+    res = runtime.run_sync(py("import sys; print(sys.stdin.read().upper())"), input="hello")
+    assert res.check_returncode().stdout.strip() == "HELLO"
+
+
+def test_run_timeout_kills_the_child(runtime):
+    started = time.monotonic()
+    res = runtime.run_sync(py("import time; print('started', flush=True); time.sleep(30)"), timeout=0.5)
+    assert res.timed_out
+    assert time.monotonic() - started < 5
+    with pytest.raises(subprocess.TimeoutExpired):
+        res.check_returncode()
+
+
+def test_run_missing_binary_raises_oserror(runtime):
+    with pytest.raises(OSError):
+        runtime.run_sync(["/nonexistent/livconnect-test-binary"])
+
+
+def test_cancelling_run_kills_the_child(runtime, tmp_path):
+    marker = tmp_path / "pid"
+    future = runtime.submit(runtime.run(py(f"import os, time; open({str(marker)!r}, 'w').write(str(os.getpid())); time.sleep(30)")))
+    deadline = time.monotonic() + 5
+    while not (marker.exists() and marker.read_text()) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    pid = int(marker.read_text())
+    future.cancel()
+    deadline = time.monotonic() + 5
+    while lc.pid_alive(pid) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert not lc.pid_alive(pid)
+
+
+def test_concurrency_is_bounded(runtime):
+    started = time.monotonic()
+    futures = [runtime.submit(runtime.run(py("import time; time.sleep(0.4)"))) for _ in range(4)]
+    for f in futures:
+        f.result(timeout=10)
+    # max_concurrency=2: four 0.4 s commands need at least two rounds
+    assert time.monotonic() - started >= 0.8
+
+
+def test_spawn_streams_lines_and_reports_exit(runtime):
+    lines, exited = [], threading.Event()
+    handle = runtime.spawn_sync(py("for i in range(3): print('line', i, flush=True)\nraise SystemExit(2)"),
+                                on_line=lines.append, on_exit=lambda h: exited.set())
+    assert handle.wait(timeout=10) == 2
+    assert exited.wait(5)
+    assert lines == ["line 0", "line 1", "line 2"]
+    assert handle.poll() == 2
+    assert handle not in runtime.children
+
+
+def test_spawn_write_to_stdin(runtime):
+    lines = []
+    handle = runtime.spawn_sync(py("import sys; print('got', sys.stdin.readline().strip(), flush=True)"),
+                                on_line=lines.append, stdin=True)
+    handle.write("123456\n")
+    assert handle.wait(timeout=10) == 0
+    assert lines == ["got 123456"]
+
+
+def test_terminate_and_kill(runtime):
+    handle = runtime.spawn_sync(py("import time; time.sleep(30)"))
+    handle.terminate()
+    assert handle.wait(timeout=10) != 0
+
+    stubborn = runtime.spawn_sync(py("import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); "
+                                     "print('ready', flush=True); time.sleep(30)"), on_line=lambda l: None)
+    time.sleep(0.3)
+    stubborn.kill()
+    assert stubborn.wait(timeout=10) != 0
+
+
+def test_cancel_escalates_after_grace(runtime):
+    ready = threading.Event()
+    handle = runtime.spawn_sync(py("import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); "
+                                   "print('ready', flush=True); time.sleep(30)"), on_line=lambda l: ready.set())
+    assert ready.wait(10)
+    started = time.monotonic()
+    assert runtime.submit(handle.cancel(grace=0.3)).result(timeout=10) != 0
+    assert time.monotonic() - started < 5
+
+
+def test_wait_returns_when_supervision_is_cancelled(runtime):
+    handle = runtime.spawn_sync(py("import time; time.sleep(30)"))
+
+    def cancel_all():
+        for task in asyncio.all_tasks(runtime.loop):
+            task.cancel()
+    runtime.loop.call_soon_threadsafe(cancel_all)
+    assert handle.wait(timeout=5) is None   # released, not hung
+    handle.kill()
+
+
+def test_deliver_queues_until_drained(runtime):
+    calls = []
+    runtime.deliver(calls.append, 1)
+    runtime.deliver(calls.append, 2)
+    assert calls == []
+    runtime.drain()
+    assert calls == [1, 2]
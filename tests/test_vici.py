@@ -0,0 +1,175 @@
+import os
+import socket
+import struct
+import tempfile
+import threading
+
+import pytest
+
+import LivConnect as lc
+
+
+def test_vici_message_round_trip():
+    msg = {"child": "office", "timeout": "30000",
+           "office": {"local_addrs": ["10.0.0.2", "fd00::2"], "children": {"net": {"mode": "TUNNEL"}}}}
+    assert lc.vici_decode_message(lc.vici_encode_message(msg)) == msg
+
+
+def test_vici_encode_layout():
+    encoded = lc.vici_encode_message({"a": "bc", "l": ["x"]})
+    assert encoded == (bytes([lc.VICI_KEY_VALUE, 1]) + b"a" + struct.pack("!H", 2) + b"bc"
+                       + bytes([lc.VICI_LIST_START, 1]) + b"l"
+                       + bytes([lc.VICI_LIST_ITEM]) + struct.pack("!H", 1) + b"x"
+                       + bytes([lc.VICI_LIST_END]))
+
+
+def test_vici_packet_round_trip():
+    packet = lc.vici_encode_packet(lc.VICI_CMD_REQUEST, "initiate", {"child": "office"})
+    (length,) = struct.unpack("!I", packet[:4])
+    assert length == len(packet) - 4
+    assert lc.vici_decode_packet(packet[4:]) == (lc.VICI_CMD_REQUEST, "initiate", {"child": "office"})
+
+
+@pytest.mark.parametrize("data", [
+    bytes([lc.VICI_KEY_VALUE, 5]) + b"ab",          # name runs past the end
+    bytes([lc.VICI_KEY_VALUE, 1]) + b"a\x00",       # truncated value length
+    bytes([lc.VICI_SECTION_END]),                   # section end without start
+    bytes([99]),                                    # unknown element type
+])
+def test_vici_decode_rejects_malformed(data):
+    with pytest.raises(lc.ViciError):
+        lc.vici_decode_message(data)
+
+
+class FakeVici:
+    """Unix-socket server speaking enough VICI to answer commands and push events."""
+
+    def __init__(self):
+        self.dir = tempfile.mkdtemp(prefix="vici")   # short path: AF_UNIX names are limited
+        self.path = os.path.join(self.dir, "charon.vici")
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.path)
+        self.server.listen()
+        self.registered = []
+        self.requests = []
+        self.ready = threading.Event()     # set once a client holds all monitor events
+        self.conns = []
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def close(self):
+        self.server.close()
+        for conn in self.conns:
+            conn.close()
+        os.unlink(self.path)
+        os.rmdir(self.dir)
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            self.conns.append(conn)
+            threading.Thread(target=self._client, args=(conn,), daemon=True).start()
+
+    @staticmethod
+    def _recv_exact(conn, n):
+        buf = b""
+        while len(buf) < n:
+            chunk = conn.recv(n - len(buf))
+            if not chunk:
+                raise EOFError
+            buf += chunk
+        return buf
+
+    def _client(self, conn):
+        events = set()
+        try:
+            while True:
+                (length,) = struct.unpack("!I", self._recv_exact(conn, 4))
+                ptype, name, msg = lc.vici_decode_packet(self._recv_exact(conn, length))
+                if ptype == lc.VICI_EVENT_REGISTER:
+                    events.add(name)
+                    self.registered.append(name)
+                    conn.sendall(lc.vici_encode_packet(lc.VICI_EVENT_CONFIRM))
+                    if events >= set(lc.ViciEventMonitor.EVENTS):
+                        conn.sendall(lc.vici_encode_packet(lc.VICI_EVENT, "ike-updown", {"up": "yes"}))
+                        self.ready.set()
+                elif ptype == lc.VICI_EVENT_UNREGISTER:
+                    events.discard(name)
+                    conn.sendall(lc.vici_encode_packet(lc.VICI_EVENT_CONFIRM))
+                elif ptype == lc.VICI_CMD_REQUEST:
+                    self.requests.append((name, msg))
+                    conn.sendall(self._answer(name, msg, events))
+        except (EOFError, OSError):
+            conn.close()
+
+    @staticmethod
+    def _answer(name, msg, events):
+        if name == "initiate":
+            out = b""
+            if "control-log" in events:
+                for line in ("initiating IKE_SA", "CHILD_SA established"):
+                    out += lc.vici_encode_packet(lc.VICI_EVENT, "control-log", {"msg": line})
+            return out + lc.vici_encode_packet(lc.VICI_CMD_RESPONSE, msg={"success": "yes"})
+        if name == "terminate":
+            return lc.vici_encode_packet(lc.VICI_CMD_RESPONSE, msg={"success": "no", "errmsg": "no such SA"})
+        return lc.vici_encode_packet(lc.VICI_CMD_UNKNOWN)
+
+
+@pytest.fixture
+def vici_server():
+    server = FakeVici()
+    yield server
+    server.close()
+
+
+def test_vici_client_command_round_trip(vici_server):
+    with lc.ViciClient(vici_server.path) as client:
+        assert client.command("initiate", {"child": "office"}) == {"success": "yes"}
+    assert vici_server.requests == [("initiate", {"child": "office"})]
+
+
+def test_vici_client_streams_events_before_the_response(vici_server):
+    log = []
+    with lc.ViciClient(vici_server.path) as client:
+        res = client.command("initiate", {"child": "office"}, stream_event="control-log",
+                             on_event=lambda name, msg: log.append((name, msg["msg"])))
+    assert res["success"] == "yes"
+    assert log == [("control-log", "initiating IKE_SA"), ("control-log", "CHILD_SA established")]
+    assert vici_server.registered == ["control-log"]
+
+
+def test_vici_client_command_failure_raises(vici_server):
+    with lc.ViciClient(vici_server.path) as client:
+        with pytest.raises(lc.ViciError, match="no such SA"):
+            client.command("terminate", {"ike": "office"})
+        with pytest.raises(lc.ViciError, match="Unknown VICI command"):
+            client.request("bogus")
+
+
+def test_vici_event_monitor_delivers_events_and_stops(vici_server):
+    got = threading.Event()
+    seen = []
+
+    def on_event(name, msg):
+        seen.append((name, msg))
+        got.set()
+    monitor = lc.ViciEventMonitor(on_event, path=vici_server.path, retry_interval=30).start()
+    assert vici_server.ready.wait(5)
+    assert got.wait(5)
+    assert seen[0] == ("ike-updown", {"up": "yes"})
+    assert monitor.available
+    # The reader is blocked in recv() with no timeout; stop() must wake it
+    monitor.stop()
+    monitor._thread.join(5)
+    assert not monitor._thread.is_alive()
+    assert not monitor.available
+
+
+def test_vici_event_monitor_idle_without_socket(tmp_path):
+    monitor = lc.ViciEventMonitor(lambda *a: None, path=str(tmp_path / "missing"), retry_interval=30).start()
+    monitor.stop()
+    monitor._thread.join(5)
+    assert not monitor._thread.is_alive()
+    assert not monitor.available and monitor.last_error